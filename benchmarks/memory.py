@@ -0,0 +1,109 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measure the memory taken by each client and contact of the data store.
+
+    python benchmarks/memory.py --records 1000000
+
+Records are built from form data the way client.add and client.contact_add
+build them, as compact records or, for comparison, as the MultiDict copies
+they used to store.  Index entries are included.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from werkzeug.datastructures import ImmutableMultiDict
+
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.adapters.records import Record
+
+
+def fresh(text):
+    # Parsed requests hold new strings, keys included
+    return ''.join(list(text))
+
+
+def client_form(i):
+    return ImmutableMultiDict([
+        (fresh('first'), fresh('John')),
+        (fresh('last'), fresh('Smith')),
+        (fresh('email'), fresh('john.smith.{}@invalid.com'.format(i))),
+        (fresh('login'), fresh('login-{}'.format(i))),
+        (fresh('uber_pass'), fresh('secret')),
+        (fresh('company'), fresh('Company {}'.format(i))),
+    ])
+
+
+def contact_form(i):
+    return ImmutableMultiDict([
+        (fresh('client_id'), fresh(str(100000 + i))),
+        (fresh('real_name'), fresh('Jane Smith')),
+        (fresh('description'), fresh('Billing contact')),
+        (fresh('phone'), fresh('555-0100')),
+        (fresh('email'), fresh('jane.smith.{}@invalid.com'.format(i))),
+        (fresh('login'), fresh('contact-{}'.format(i))),
+        (fresh('password'), fresh('secret')),
+    ])
+
+
+def as_multidict(form, key, record_id):
+    record = form.copy()
+    record[key] = record_id
+    return record
+
+
+def as_record(form, key, record_id):
+    record = form.to_dict()
+    record[key] = record_id
+    return Record(record)
+
+
+def measure(records, representation):
+    data_store = DataStore(event_log_size=0)
+    gc.collect()
+    tracemalloc.start()
+
+    start = tracemalloc.get_traced_memory()[0]
+    for i in range(records):
+        data_store.clients.append(representation(client_form(i), 'clientid', str(100000 + i)))
+    after_clients = tracemalloc.get_traced_memory()[0]
+
+    for i in range(records):
+        data_store.contacts.append(representation(contact_form(i), 'contact_id', str(i)))
+    after_contacts = tracemalloc.get_traced_memory()[0]
+
+    tracemalloc.stop()
+    return (after_clients - start) / records, (after_contacts - after_clients) / records
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=1000000)
+    parser.add_argument('--representation', choices=('record', 'multidict', 'both'), default='both')
+    args = parser.parse_args()
+
+    representations = [('record', as_record), ('multidict', as_multidict)]
+    for name, representation in representations:
+        if args.representation not in (name, 'both'):
+            continue
+        start = time.perf_counter()
+        per_client, per_contact = measure(args.records, representation)
+        print("{:<10} {:>8.0f} bytes/client {:>8.0f} bytes/contact ({:.1f}s)".format(
+            name, per_client, per_contact, time.perf_counter() - start
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the calls/sec of read-heavy methods with and without the response cache.
+
+Each method is polled with the same parameters, as pollers do, then again
+sending back the ETag of the last response.  Calls are made in process, so
+the (etag) rows show the cost of serving a 304, not the transfer it saves.
+
+    python benchmarks/response_cache.py --plans 10000 --calls 500
+"""
+import argparse
+import json
+import time
+
+from fake_ubersmith.main import create_app
+
+
+def seed(app, plans):
+    with app.test_client() as client:
+        client_id = client.post('/api/2.0/', data={
+            'method': 'client.add', 'first': 'John', 'last': 'Smith', 'uber_login': 'john'
+        }).get_json()['data']
+        client.post('/__bulk/service_plans', data='\n'.join(
+            json.dumps({'plan_id': str(i), 'code': str(i % 10), 'label': 'Plan {}'.format(i)}) for i in range(plans)
+        ))
+        client.post('/__bulk/acl_resources', data='\n'.join(
+            json.dumps({'resource_id': str(i), 'name': 'resource-{}'.format(i), 'parent_id': str(i // 10)})
+            for i in range(1, plans)
+        ))
+    return {
+        'client.get': {'client_id': client_id},
+        'uber.service_plan_list': {},
+        'uber.acl_resource_list': {},
+    }
+
+
+def run(app, polls, calls):
+    timings = {}
+    with app.test_client() as client:
+        for method, params in polls.items():
+            data = dict(params, method=method)
+            start = time.perf_counter()
+            for _ in range(calls):
+                resp = client.post('/api/2.0/', data=data)
+            timings[method] = time.perf_counter() - start
+
+            headers = {'If-None-Match': resp.headers.get('ETag', '')}
+            start = time.perf_counter()
+            for _ in range(calls):
+                client.post('/api/2.0/', data=data, headers=headers)
+            timings[method + ' (etag)'] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--plans', type=int, default=10000)
+    parser.add_argument('--calls', type=int, default=500)
+    args = parser.parse_args()
+
+    results = {}
+    for name, app in (('uncached', create_app()), ('cached', create_app(with_response_cache=True))):
+        results[name] = run(app, seed(app, args.plans), args.calls)
+
+    print("{:<32} {:>12} {:>12}".format("calls/sec", "uncached", "cached"))
+    for method in results['uncached']:
+        print("{:<32} {:>12.0f} {:>12.0f}".format(
+            method, args.calls / results['uncached'][method], args.calls / results['cached'][method]
+        ))
+
+
+if __name__ == '__main__':
+    main()
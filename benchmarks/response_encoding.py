@@ -0,0 +1,96 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the response encoders on large list-style payloads.
+
+    python benchmarks/response_encoding.py --records 10000
+"""
+import argparse
+import json
+import timeit
+from unittest import mock
+
+from fake_ubersmith.api.utils import response
+
+
+def phpize_then_dumps(payload):
+    def phpize(data):
+        if isinstance(data, dict):
+            if len(data) == 0:
+                return []
+            return {k: phpize(v) for k, v in data.items()}
+        elif isinstance(data, list):
+            return [phpize(v) for v in data]
+        return data
+
+    return json.dumps(phpize(payload))
+
+
+def contact_list(records):
+    return {
+        str(i): {
+            "contact_id": str(i),
+            "client_id": "100",
+            "real_name": "John Smith",
+            "email": "john.smith@invalid.com",
+            "login": "login-{}".format(i),
+            "permissions": {},
+        }
+        for i in range(records)
+    }
+
+
+def acl_resource_list(records):
+    return {
+        str(i): {
+            "resource_id": str(i),
+            "name": "resource-{}".format(i),
+            "parent_id": "0",
+            "lft": "0",
+            "rgt": "0",
+            "active": "1",
+            "label": "",
+            "actions": {"1": "Create", "2": "View", "3": "Update", "4": "Delete"},
+            "children": {},
+        }
+        for i in range(records)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    backends = [('json', None)]
+    if response.orjson is not None:
+        backends.append(('orjson', response.orjson))
+
+    for name, data in (('contact_list', contact_list(args.records)),
+                       ('acl_resource_list', acl_resource_list(args.records))):
+        payload = {"status": True, "error_code": None, "error_message": "", "data": data}
+
+        seconds = timeit.timeit(lambda: phpize_then_dumps(payload), number=args.repeat)
+        print("{:<18} {:<20} {:>8.2f} ms".format(name, 'phpize + json.dumps', seconds / args.repeat * 1000))
+
+        for backend_name, backend in backends:
+            with mock.patch.object(response, 'orjson', backend):
+                seconds = timeit.timeit(lambda: response.encode(payload), number=args.repeat)
+            print("{:<18} {:<20} {:>8.2f} ms".format(
+                name, 'encode ({})'.format(backend_name), seconds / args.repeat * 1000
+            ))
+
+
+if __name__ == '__main__':
+    main()
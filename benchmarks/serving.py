@@ -0,0 +1,87 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare requests/sec of the serving modes of fake-ubersmith.
+
+    python benchmarks/serving.py --requests 5000 --concurrency 16
+"""
+import argparse
+import http.client
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+HOST = '127.0.0.1'
+PORT = 9131
+
+
+def wait_until_ready(timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection(HOST, PORT, timeout=1)
+            connection.request('GET', '/status')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("fake-ubersmith did not start")
+
+
+def hammer(requests_count, concurrency):
+    body = urlencode({'method': 'client.get', 'client_id': '1'})
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    per_worker = requests_count // concurrency
+
+    def worker():
+        connection = http.client.HTTPConnection(HOST, PORT)
+        for _ in range(per_worker):
+            connection.request('POST', '/api/2.0/', body, headers)
+            connection.getresponse().read()
+        connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return per_worker * concurrency / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--servers', nargs='+', default=['werkzeug', 'waitress', 'asgi'])
+    args = parser.parse_args()
+
+    for server in args.servers:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'fake_ubersmith.main', '--server', server,
+             '--threads', str(args.concurrency)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_until_ready()
+            rate = hammer(args.requests, args.concurrency)
+            print("{:<10} {:>10.0f} req/s".format(server, rate))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare seeding the data store through the API to loading a snapshot.
+
+    python benchmarks/snapshot.py --clients 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from fake_ubersmith.api.adapters import snapshot
+from fake_ubersmith.main import create_app
+
+
+def seed(client, clients):
+    for i in range(clients):
+        client_id = client.post('/api/2.0/', data={
+            'method': 'client.add', 'first': 'John', 'last': str(i),
+            'uber_login': 'client-{}'.format(i), 'uber_pass': 'secret', 'email': 'john@invalid.com'
+        }).get_json()['data']
+        client.post('/api/2.0/', data={
+            'method': 'client.contact_add', 'client_id': client_id,
+            'login': 'contact-{}'.format(i), 'password': 'secret'
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=20000)
+    args = parser.parse_args()
+
+    app = create_app()
+    data_store = app.extensions['ubersmith_base'].data_store
+
+    start = time.perf_counter()
+    with app.test_client() as client:
+        seed(client, args.clients)
+    seeding = time.perf_counter() - start
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'benchmark.snapshot')
+    try:
+        start = time.perf_counter()
+        snapshot.save(data_store, path)
+        saving = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        snapshot.load(create_app().extensions['ubersmith_base'].data_store, path)
+        loading = time.perf_counter() - start
+    finally:
+        os.remove(path)
+        os.rmdir(directory)
+
+    print("records           {:>10}".format(sum(data_store.collection_sizes().values())))
+    print("seeding (API)     {:>10.1f} ms".format(seeding * 1000))
+    print("snapshot save     {:>10.1f} ms  {} bytes".format(saving * 1000, size))
+    print("snapshot load     {:>10.1f} ms  ({:.0f}x faster than seeding)".format(loading * 1000, seeding / loading))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measure how long fake-ubersmith takes to be ready from process start.
+
+Readiness is the first answered GET /status; the first call then shows the
+cost of importing the method module serving it.
+
+    python benchmarks/startup.py --runs 10 --modules client,uber
+"""
+import argparse
+import http.client
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode
+
+HOST = '127.0.0.1'
+PORT = 9131
+
+
+def request(method, path, body=None):
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+    connection = http.client.HTTPConnection(HOST, PORT, timeout=1)
+    try:
+        connection.request(method, path, body, headers)
+        return connection.getresponse().read()
+    finally:
+        connection.close()
+
+
+def wait_until_ready(timeout=10):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            return request('GET', '/status')
+        except OSError:
+            time.sleep(0.001)
+    raise RuntimeError("fake-ubersmith did not start")
+
+
+def measure(server, modules, method):
+    command = [sys.executable, '-m', 'fake_ubersmith.main', '--server', server]
+    if modules:
+        command += ['--modules', modules]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_ready()
+        ready = time.perf_counter() - start
+
+        start = time.perf_counter()
+        request('POST', '/api/2.0/', urlencode({'method': method, 'client_id': '1'}))
+        first_call = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+    return ready, first_call
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--server', choices=('werkzeug', 'waitress', 'asgi'), default='werkzeug')
+    parser.add_argument('--modules', help="method modules to serve, all of them by default")
+    parser.add_argument('--method', default='client.get', help="method of the first call")
+    args = parser.parse_args()
+
+    readiness, first_calls = [], []
+    for _ in range(args.runs):
+        ready, first_call = measure(args.server, args.modules, args.method)
+        readiness.append(ready)
+        first_calls.append(first_call)
+
+    print("ready in   {:>8.1f} ms (median of {} runs, min {:.1f} ms)".format(
+        statistics.median(readiness) * 1000, args.runs, min(readiness) * 1000
+    ))
+    print("first call {:>8.1f} ms (median, {})".format(statistics.median(first_calls) * 1000, args.method))
+
+
+if __name__ == '__main__':
+    main()
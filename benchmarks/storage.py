@@ -0,0 +1,78 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compare the calls/sec of the memory and sqlite storages.
+
+Clients are added, then looked up by id and by login, through the API.
+
+    python benchmarks/storage.py --clients 5000
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from fake_ubersmith.main import create_app
+
+
+def run(app, clients):
+    timings = {}
+    client_ids = []
+    with app.test_client() as client:
+        start = time.perf_counter()
+        for i in range(clients):
+            client_ids.append(client.post('/api/2.0/', data={
+                'method': 'client.add', 'first': 'John', 'uber_login': 'client-{}'.format(i), 'uber_pass': 'secret'
+            }).get_json()['data'])
+        timings['client.add'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for client_id in client_ids:
+            client.post('/api/2.0/', data={'method': 'client.get', 'client_id': client_id})
+        timings['client.get'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(clients):
+            client.post('/api/2.0/', data={
+                'method': 'uber.check_login', 'login': 'client-{}'.format(i), 'pass': 'secret'
+            })
+        timings['uber.check_login'] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        results = {
+            'memory': run(create_app(), args.clients),
+            'sqlite': run(
+                create_app(storage='sqlite', sqlite_path=os.path.join(directory, 'benchmark.sqlite')), args.clients
+            ),
+        }
+    finally:
+        shutil.rmtree(directory)
+
+    print("{:<18} {:>12} {:>12}".format("calls/sec", "memory", "sqlite"))
+    for method in results['memory']:
+        print("{:<18} {:>12.0f} {:>12.0f}".format(
+            method, args.clients / results['memory'][method], args.clients / results['sqlite'][method]
+        ))
+
+
+if __name__ == '__main__':
+    main()
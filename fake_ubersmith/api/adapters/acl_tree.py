@@ -0,0 +1,190 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+from collections import defaultdict, deque
+
+
+class AclTreeError(ValueError):
+    pass
+
+
+class AclTree(dict):
+    """Root ACL resources by id, each holding its children the same way.
+
+    Resources are indexed by id and by name and numbered as a nested set,
+    like real Ubersmith does, as long as they are added with ``add()`` or
+    ``load()``.  A resource added at the end of the tree only shifts the
+    ``rgt`` of its ancestors; any other add leaves the whole tree to be
+    renumbered once, on its next read through ``numbered()``.
+    """
+
+    def __init__(self, resources=()):
+        super().__init__(resources)
+        self._by_id = {}
+        self._by_name = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+        for resource in walk(self):
+            self._index(resource)
+        self._stale = bool(self)
+
+    def get_resource(self, resource_id):
+        return self._by_id.get(resource_id)
+
+    def find(self, name):
+        """Returns the first resource named ``name`` in depth-first order."""
+        resources = self._by_name.get(name)
+        if not resources:
+            return None
+        if len(resources) == 1:
+            return resources[0]
+        self.numbered()
+        return min(resources, key=lambda resource: int(resource["lft"]))
+
+    def add(self, resource):
+        resource_id = resource["resource_id"]
+        if resource_id in self._by_id:
+            raise AclTreeError("Resource id {} already exists".format(resource_id))
+        ancestors = self._ancestors(resource["parent_id"], resource_id)
+
+        self._number(resource, ancestors)
+        siblings = ancestors[0]["children"] if ancestors else self
+        siblings[resource_id] = resource
+        for added in walk({resource_id: resource}):
+            self._index(added)
+        self._cache.clear()
+
+    def load(self, resources):
+        """Adds many resources, in any order, or none if one can't be added."""
+        loaded = {}
+        for resource in resources:
+            resource_id = resource["resource_id"]
+            if resource_id in self._by_id or resource_id in loaded:
+                raise AclTreeError("Resource id {} already exists".format(resource_id))
+            loaded[resource_id] = resource
+
+        children = defaultdict(list)
+        attachable = deque()
+        for resource in resources:
+            parent_id = resource["parent_id"]
+            if parent_id == "0" or parent_id in self._by_id:
+                attachable.append(resource)
+            elif parent_id in loaded:
+                children[parent_id].append(resource)
+            else:
+                raise AclTreeError("Parent resource {} of resource {} not found".format(
+                    parent_id, resource["resource_id"]
+                ))
+
+        ordered = []
+        while attachable:
+            resource = attachable.popleft()
+            ordered.append(resource)
+            attachable.extend(children.get(resource["resource_id"], ()))
+        if len(ordered) < len(resources):
+            raise AclTreeError("Resources {} are their own ancestors".format(
+                ", ".join(sorted(set(loaded) - {resource["resource_id"] for resource in ordered}))
+            ))
+
+        for resource in ordered:
+            self.add(resource)
+
+    def numbered(self):
+        """Returns the tree once its ``lft`` and ``rgt`` are up to date."""
+        if self._stale:
+            with self._lock:
+                if self._stale:
+                    self._renumber()
+        return self
+
+    def cached(self, key, build):
+        """Returns what ``build()`` returned for ``key`` since the tree last changed."""
+        value = self._cache.get(key)
+        if value is None:
+            with self._lock:
+                value = self._cache.get(key)
+                if value is None:
+                    value = self._cache[key] = build()
+        return value
+
+    def _ancestors(self, parent_id, resource_id):
+        ancestors = []
+        while parent_id != "0":
+            parent = self._by_id.get(parent_id)
+            if parent is None:
+                raise AclTreeError("Parent resource {} of resource {} not found".format(parent_id, resource_id))
+            ancestors.append(parent)
+            parent_id = parent["parent_id"]
+        return ancestors
+
+    def _number(self, resource, ancestors):
+        if not self._stale and not resource["children"]:
+            # Along the last branch of the tree, rgt decreases by one per level
+            end = 2 * len(self._by_id)
+            if not ancestors:
+                lft = end + 1
+            elif int(ancestors[0]["rgt"]) == end - len(ancestors) + 1:
+                lft = int(ancestors[0]["rgt"])
+            else:
+                lft = None
+
+            if lft is not None:
+                for ancestor in ancestors:
+                    ancestor["rgt"] = str(int(ancestor["rgt"]) + 2)
+                resource["lft"], resource["rgt"] = str(lft), str(lft + 1)
+                return
+
+        self._stale = True
+
+    def _renumber(self):
+        position = 0
+        stack = [(resource, False) for resource in reversed(list(self.values()))]
+        while stack:
+            resource, visited = stack.pop()
+            position += 1
+            if visited:
+                resource["rgt"] = str(position)
+            else:
+                resource["lft"] = str(position)
+                stack.append((resource, True))
+                stack.extend((child, False) for child in reversed(list(resource["children"].values())))
+        self._stale = False
+
+    def _index(self, resource):
+        self._by_id[resource["resource_id"]] = resource
+        self._by_name.setdefault(resource["name"], []).append(resource)
+
+
+def walk(resources):
+    """Yields the resources of a tree in depth-first order."""
+    stack = list(reversed(list(resources.values())))
+    while stack:
+        resource = stack.pop()
+        yield resource
+        stack.extend(reversed(list(resource["children"].values())))
+
+
+def highest_id(resources):
+    """Returns the highest numeric resource id given to the resources, 0 when there is none."""
+    return max(
+        (_numeric_id(resource["resource_id"]) for resource in resources if resource.get("resource_id") is not None),
+        default=0
+    )
+
+
+def _numeric_id(resource_id):
+    try:
+        return int(resource_id)
+    except ValueError:
+        return 0
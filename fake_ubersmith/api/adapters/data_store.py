@@ -12,10 +12,203 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from collections import defaultdict
+from contextlib import contextmanager, ExitStack
 
+from fake_ubersmith.api.adapters.acl_tree import AclTree, highest_id
+from fake_ubersmith.api.adapters.event_log import DEFAULT_CAPACITY, EventLog
+from fake_ubersmith.api.adapters.ids import id_allocator
+from fake_ubersmith.api.adapters.records import Record
+from fake_ubersmith.api.adapters.storage import RECORD_COLLECTIONS, Storage
+from fake_ubersmith.api.utils.concurrency import AtomicCounter, ReadWriteLock
 
-class DataStore:
-    def __init__(self):
+
+class IndexedList(list):
+    """A list of records that keeps a hash index per looked up field.
+
+    Every mutation going through the list keeps the indexes in sync; records
+    mutated in place must be changed within ``updating()``.  An index maps a
+    key to its record, or to a list of its records when several share it.
+    """
+
+    def __init__(self, iterable=(), indexes=None):
+        super().__init__()
+        self._key_getters = indexes or {}
+        self._indexes = {name: {} for name in self._key_getters}
+        self.load(iterable)
+
+    def lookup(self, index, value):
+        records = self._indexes[index].get(value)
+        if type(records) is list:
+            return records[0]
+        return records
+
+    def lookup_all(self, index, value):
+        records = self._indexes[index].get(value)
+        if type(records) is list:
+            return list(records)
+        return [] if records is None else [records]
+
+    def load(self, records):
+        """Appends many records, indexing them once they are all in."""
+        start = len(self)
+        super().extend(records)
+        records = self[start:]
+        for name, key_getter in self._key_getters.items():
+            index = self._indexes[name]
+            for record in records:
+                try:
+                    key = key_getter(record)
+                except (KeyError, TypeError):
+                    continue
+                bucket = index.get(key)
+                if bucket is None:
+                    index[key] = record
+                elif type(bucket) is list:
+                    bucket.append(record)
+                else:
+                    index[key] = [bucket, record]
+
+    @contextmanager
+    def updating(self, record):
+        self._unindex(record)
+        try:
+            yield record
+        finally:
+            self._index(record)
+
+    def append(self, record):
+        super().append(record)
+        self._index(record)
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def insert(self, position, record):
+        super().insert(position, record)
+        self._index(record)
+
+    def remove(self, record):
+        super().remove(record)
+        self._unindex(record)
+
+    def pop(self, *args):
+        record = super().pop(*args)
+        self._unindex(record)
+        return record
+
+    def clear(self):
+        super().clear()
+        self._reindex()
+
+    def __setitem__(self, position, value):
+        super().__setitem__(position, value)
+        self._reindex()
+
+    def __delitem__(self, position):
+        super().__delitem__(position)
+        self._reindex()
+
+    def __iadd__(self, records):
+        self.extend(records)
+        return self
+
+    def _index(self, record):
+        for name, key_getter in self._key_getters.items():
+            try:
+                key = key_getter(record)
+            except (KeyError, TypeError):
+                continue
+            index = self._indexes[name]
+            bucket = index.get(key)
+            if bucket is None:
+                index[key] = record
+            elif type(bucket) is list:
+                bucket.append(record)
+            else:
+                index[key] = [bucket, record]
+
+    def _unindex(self, record):
+        for name, key_getter in self._key_getters.items():
+            try:
+                key = key_getter(record)
+            except (KeyError, TypeError):
+                continue
+            index = self._indexes[name]
+            records = index.get(key)
+            if records is record:
+                del index[key]
+            elif type(records) is list:
+                for i, indexed in enumerate(records):
+                    if indexed is record:
+                        del records[i]
+                        break
+                if len(records) == 1:
+                    index[key] = records[0]
+
+    def _reindex(self):
+        self._indexes = {name: {} for name in self._key_getters}
+        for record in self:
+            self._index(record)
+
+
+class _Collection:
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return instance.__dict__[self.name]
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.name] = self.factory(value)
+
+
+class _IndexedCollection(_Collection):
+    """An IndexedList attribute, made of ``record_type`` records when given."""
+
+    def __init__(self, name, record_type=None, **indexes):
+        def factory(records):
+            return IndexedList(records if record_type is None else map(record_type, records), indexes)
+
+        super().__init__(name, factory)
+        self.record_type = record_type
+        self.indexes = indexes
+
+
+class DataStore(Storage):
+    """The in-memory storage, shared by the threads of a process."""
+
+    clients = _IndexedCollection('clients', record_type=Record.of, **RECORD_COLLECTIONS['clients'])
+    contacts = _IndexedCollection('contacts', record_type=Record.of, **RECORD_COLLECTIONS['contacts'])
+    credit_cards = _IndexedCollection('credit_cards', **RECORD_COLLECTIONS['credit_cards'])
+    coupons = _IndexedCollection('coupons', **RECORD_COLLECTIONS['coupons'])
+    service_plans = _IndexedCollection('service_plans', **RECORD_COLLECTIONS['service_plans'])
+    acl_resources = _Collection('acl_resources', AclTree)
+
+    def __init__(self, event_log_size=DEFAULT_CAPACITY, event_log_spill_dir=None, ids=None):
+        self._ids = ids or id_allocator()
+        self._event_log_size = event_log_size
+        self._event_log_spill_dir = event_log_spill_dir
+        self._reset()
+        self._locks = {name: ReadWriteLock() for name in vars(self) if not name.startswith('_')}
+        self._versions = dict.fromkeys(self._locks, 0)
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        # Assigning a collection, as tests setting fixtures do, is a write
+        versions = self.__dict__.get('_versions')
+        if versions is not None and name in versions:
+            versions[name] += 1
+
+    @property
+    def ids(self):
+        return self._ids
+
+    def _reset(self):
+        self._ids.reset()
         self.credit_cards = []
         self.countries = {}
         self.clients = []
@@ -26,12 +219,163 @@ class DataStore:
         self.order_cancel = {}
         self.service_plans = []
         self.service_plans_list = None
-        self.event_log = []
+        if getattr(self, 'event_log', None) is not None:
+            self.event_log.close()
+        self.event_log = EventLog(self._event_log_size, spill_dir=self._event_log_spill_dir)
         self.roles = {}
         self.acl_resources = {}
-        self.acl_resources_inc_id = 0
+        self.acl_resources_counter = AtomicCounter()
         self.user_mapping = defaultdict(lambda: defaultdict(set))
         self.metadatas = {}
 
+    @property
+    def collections(self):
+        return tuple(self._locks)
+
+    def export_state(self):
+        """Returns the collections as builtin types, sharing their records.
+
+        The caller must hold the locks of all the collections.
+        """
+        state = {}
+        for name in self._locks:
+            value = getattr(self, name)
+            if isinstance(value, IndexedList):
+                value = list(value)
+            elif isinstance(value, AclTree):
+                value = dict(value.numbered())
+            elif isinstance(value, EventLog):
+                value, _ = value.read(value.first_cursor, limit=value.next_cursor)
+            elif isinstance(value, AtomicCounter):
+                value = value.value
+            elif name == "user_mapping":
+                value = {user_id: dict(mapping) for user_id, mapping in value.items()}
+            state[name] = value
+        state["ids"] = self._ids.export_state()
+        return state
+
+    def import_state(self, state):
+        """Replaces the collections by the content of ``export_state()``.
+
+        The caller must hold the write locks of all the collections.
+        """
+        self._reset()
+        self._ids.import_state(state.get("ids", {}))
+        for name, value in state.items():
+            if name not in self._locks:
+                continue
+            if name == "event_log":
+                self.event_log.extend(value)
+                continue
+            elif name == "acl_resources_counter":
+                value = AtomicCounter(value)
+            elif name == "user_mapping":
+                value = defaultdict(lambda: defaultdict(set), {
+                    user_id: defaultdict(set, mapping) for user_id, mapping in value.items()
+                })
+            setattr(self, name, value)
+
+    def lookup(self, collection, index, value):
+        return getattr(self, collection).lookup(index, value)
+
+    def lookup_all(self, collection, index, value):
+        return getattr(self, collection).lookup_all(index, value)
+
+    def records(self, collection):
+        return list(getattr(self, collection))
+
+    def insert(self, collection, record):
+        getattr(self, collection).append(self._record(collection, record))
+
+    def load(self, collection, records):
+        getattr(self, collection).load([self._record(collection, record) for record in records])
+
+    def update(self, collection, record, changes):
+        with getattr(self, collection).updating(record):
+            for key, value in changes.items():
+                record[key] = value
+
+    def get_item(self, mapping, key, default=None):
+        return (getattr(self, mapping) or {}).get(key, default)
+
+    def set_item(self, mapping, key, value):
+        self.update_items(mapping, [(key, value)])
+
+    def items(self, mapping):
+        return getattr(self, mapping)
+
+    def update_items(self, mapping, items):
+        if getattr(self, mapping) is None:
+            setattr(self, mapping, {})
+        getattr(self, mapping).update(items)
+
+    def append_event(self, event):
+        self.event_log.append(event)
+
+    def read_events(self, cursor, limit):
+        events, next_cursor = self.event_log.read(cursor, limit=limit)
+        return events, next_cursor, self.event_log.first_cursor
+
+    def acl_tree(self):
+        return self.acl_resources.numbered()
+
+    def add_acl_resource(self, resource):
+        if resource.get("resource_id") is None:
+            resource["resource_id"] = str(self.acl_resources_counter.increment())
+        self.acl_resources.add(resource)
+        return resource["resource_id"]
+
+    def load_acl_resources(self, resources):
+        # Ids are only allocated past the ones given in the batch
+        self.acl_resources_counter.advance_to(highest_id(resources))
+        for resource in resources:
+            if resource.get("resource_id") is None:
+                resource["resource_id"] = str(self.acl_resources_counter.increment())
+        self.acl_resources.load(resources)
+
+    def _record(self, collection, record):
+        record_type = type(self).__dict__[collection].record_type
+        return record if record_type is None else record_type(record)
+
+    def collection_sizes(self):
+        return {
+            name: len(getattr(self, name))
+            for name in self._locks
+            if hasattr(getattr(self, name), '__len__')
+        }
+
+    @contextmanager
+    def reading(self, *collections):
+        with self._acquire(collections, ReadWriteLock.reading):
+            yield
+
+    @contextmanager
+    def writing(self, *collections):
+        with self._acquire(collections, ReadWriteLock.writing):
+            try:
+                yield
+            finally:
+                # Still locked, for no reader to see the changes under the
+                # previous versions
+                for name in set(collections):
+                    self._versions[name] += 1
+
+    def versions(self, *collections):
+        return tuple(self._versions[name] for name in collections)
+
+    @contextmanager
+    def _acquire(self, collections, mode):
+        # Locks are always taken in the same order so that handlers locking
+        # several collections can't deadlock each other.
+        with ExitStack() as stack:
+            for name in sorted(set(collections)):
+                stack.enter_context(mode(self._locks[name]))
+            yield
+
     def flush(self):
-        self.__init__()
+        with self.writing(*self._locks):
+            self._reset()
+
+    def close(self):
+        """Removes the segment file of the event log, on exit."""
+        self.event_log.close()
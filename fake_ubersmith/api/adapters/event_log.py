@@ -0,0 +1,189 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import bisect
+import json
+import os
+import re
+import struct
+import tempfile
+import zlib
+from collections import deque
+from itertools import islice
+
+DEFAULT_CAPACITY = 100000
+BLOCK_SIZE = 1024
+
+_BLOCK_HEADER = struct.Struct('>I')
+# Segments are named after the process writing them, for the ones of the
+# processes that are gone to be told apart in a shared spill directory
+_SEGMENT_PREFIX = 'event-log-{}-'
+_SEGMENT_NAME = re.compile(r'event-log-(\d+)-[^-]*\.seg\Z')
+
+
+class EventLog:
+    """Events kept in a bounded ring buffer, the oldest ones spilled to disk.
+
+    Every event gets a sequence number, its cursor.  When the buffer is
+    full the oldest event is dropped, or, with a ``spill_dir``, appended to
+    a segment file of zlib compressed blocks of ``block_size`` events that
+    ``read()`` pages through like the buffer.  Segments left in
+    ``spill_dir`` by processes that were killed are removed.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, spill_dir=None, block_size=BLOCK_SIZE):
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self.block_size = block_size
+
+        self.path = None
+        self._ring = deque()
+        self._pending = []
+        self._blocks = []
+        self._block_cursors = []
+        self._first_cursor = 0
+        self._spilled = 0
+        self._segment = None
+
+        if spill_dir and os.path.isdir(spill_dir):
+            remove_stale_segments(spill_dir)
+
+    def __len__(self):
+        return len(self._ring)
+
+    def __iter__(self):
+        return iter(self._ring)
+
+    def __getitem__(self, position):
+        return self._ring[position]
+
+    @property
+    def first_cursor(self):
+        """Cursor of the oldest event that can still be read."""
+        return 0 if self.spill_dir else self._first_cursor
+
+    @property
+    def next_cursor(self):
+        """Cursor the next event appended will get."""
+        return self._first_cursor + len(self._ring)
+
+    def append(self, event):
+        self._ring.append(event)
+        if len(self._ring) > self.capacity:
+            self._evict(self._ring.popleft())
+
+    def extend(self, events):
+        for event in events:
+            self.append(event)
+
+    def read(self, cursor=0, limit=100):
+        """Returns up to ``limit`` events from ``cursor`` on and the cursor following them."""
+        cursor = max(cursor, self.first_cursor)
+        events = []
+
+        if cursor < self._spilled:
+            block = bisect.bisect_right(self._block_cursors, cursor) - 1
+            with open(self.path, 'rb') as segment:
+                while block < len(self._blocks) and len(events) < limit:
+                    block_cursor, offset, length = self._blocks[block]
+                    segment.seek(offset)
+                    lines = zlib.decompress(segment.read(length)).split(b'\n')
+                    skipped = max(cursor - block_cursor, 0)
+                    events.extend(_decode(line) for line in lines[skipped:skipped + limit - len(events)])
+                    block += 1
+
+        pending_cursor = self._spilled
+        if len(events) < limit and cursor + len(events) < pending_cursor + len(self._pending):
+            start = cursor + len(events) - pending_cursor
+            events.extend(self._pending[start:start + limit - len(events)])
+
+        if len(events) < limit and cursor + len(events) < self.next_cursor:
+            start = cursor + len(events) - self._first_cursor
+            events.extend(islice(self._ring, start, start + limit - len(events)))
+
+        return events, cursor + len(events)
+
+    def close(self):
+        """Releases and removes the segment file."""
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if self.path is not None:
+            os.remove(self.path)
+            self.path = None
+
+    def _evict(self, event):
+        self._first_cursor += 1
+        if not self.spill_dir:
+            return
+
+        self._pending.append(event)
+        if len(self._pending) >= self.block_size:
+            self._write_block()
+
+    def _write_block(self):
+        if self._segment is None:
+            fd, self.path = tempfile.mkstemp(
+                prefix=_SEGMENT_PREFIX.format(os.getpid()), suffix='.seg', dir=self.spill_dir
+            )
+            self._segment = os.fdopen(fd, 'ab')
+
+        block = zlib.compress(b'\n'.join(json.dumps(event).encode('utf-8') for event in self._pending))
+        offset = self._segment.tell()
+        self._segment.write(_BLOCK_HEADER.pack(len(block)))
+        self._segment.write(block)
+        self._segment.flush()
+
+        self._blocks.append((self._spilled, offset + _BLOCK_HEADER.size, len(block)))
+        self._block_cursors.append(self._spilled)
+        self._spilled += len(self._pending)
+        self._pending = []
+
+
+def remove_stale_segments(spill_dir):
+    """Removes the segment files of the processes that are no longer running."""
+    for name in os.listdir(spill_dir):
+        match = _SEGMENT_NAME.match(name)
+        if match is not None and not _is_running(int(match.group(1))):
+            try:
+                os.remove(os.path.join(spill_dir, name))
+            except FileNotFoundError:
+                pass
+
+
+def _is_running(pid):
+    if os.name != 'posix':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_segment(path):
+    """Yields every event of a segment file, in the order they were spilled."""
+    with open(path, 'rb') as segment:
+        while True:
+            header = segment.read(_BLOCK_HEADER.size)
+            if len(header) < _BLOCK_HEADER.size:
+                return
+            length, = _BLOCK_HEADER.unpack(header)
+            for line in zlib.decompress(segment.read(length)).split(b'\n'):
+                yield _decode(line)
+
+
+def _decode(line):
+    return json.loads(line.decode('utf-8'))
@@ -0,0 +1,152 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import math
+import random
+import threading
+import zlib
+
+from fake_ubersmith.api.utils.concurrency import AtomicCounter
+
+STRATEGIES = ('random', 'sequential', 'sharded')
+
+
+class IdAllocator:
+    """Hands out ids that are unique within each kind of record.
+
+    The n-th id of a kind is ``id_for(kind, n)``, which strategies must keep
+    distinct for distinct n.  Ids taken by records loaded as is are given to
+    ``reserve()`` and skipped.
+    """
+
+    def __init__(self):
+        self._counters = {}
+        self._reserved = {}
+        self._lock = threading.Lock()
+
+    def next_id(self, kind):
+        counter, reserved = self._state(kind)
+        while True:
+            record_id = self.id_for(kind, counter.increment() - 1)
+            if record_id not in reserved:
+                return record_id
+
+    def reserve(self, kind, record_id):
+        try:
+            record_id = int(record_id)
+        except (TypeError, ValueError):
+            return
+        self._state(kind)[1].add(record_id)
+
+    def id_for(self, kind, n):
+        raise NotImplementedError()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._reserved = {}
+
+    def export_state(self):
+        with self._lock:
+            return {
+                kind: {"allocated": counter.value, "reserved": set(self._reserved[kind])}
+                for kind, counter in self._counters.items()
+            }
+
+    def import_state(self, state):
+        with self._lock:
+            self._counters = {kind: AtomicCounter(value["allocated"]) for kind, value in state.items()}
+            self._reserved = {kind: set(value["reserved"]) for kind, value in state.items()}
+
+    def _state(self, kind):
+        counter = self._counters.get(kind)
+        if counter is None:
+            with self._lock:
+                counter = self._counters.get(kind)
+                if counter is None:
+                    self._reserved[kind] = set()
+                    counter = self._counters[kind] = AtomicCounter()
+        return counter, self._reserved[kind]
+
+
+class SequentialIds(IdAllocator):
+    """1, 2, 3...  Threads sharing a data store share its sequences."""
+
+    def __init__(self, start=1):
+        super().__init__()
+        self.start = start
+
+    def id_for(self, kind, n):
+        return self.start + n
+
+
+class ShardedIds(IdAllocator):
+    """Every ``shards``-th id, so that each shard never hands out the ids of another.
+
+    Processes seeding the same system each take a shard index out of the
+    same number of shards.
+    """
+
+    def __init__(self, shard, shards, start=1):
+        super().__init__()
+        if not 0 <= shard < shards:
+            raise ValueError("shard must be between 0 and {}".format(shards - 1))
+        self.shard = shard
+        self.shards = shards
+        self.start = start
+
+    def id_for(self, kind, n):
+        return self.start + self.shard + n * self.shards
+
+
+class SeededIds(IdAllocator):
+    """Ids that look random, and are the same from one run to another for a seed.
+
+    The first ``high - low + 1`` ids are a permutation of ``low..high``,
+    ``low + (a * n + b) % size`` with ``a`` coprime to the size, and the
+    following ones count up from ``high``.
+    """
+
+    def __init__(self, seed=None, low=100000, high=999999):
+        super().__init__()
+        self.seed = seed
+        self.low = low
+        self.size = high - low + 1
+
+        rng = random.Random(seed)
+        self._multiplier = rng.randrange(1, self.size)
+        while math.gcd(self._multiplier, self.size) != 1:
+            self._multiplier = rng.randrange(1, self.size)
+        self._offset = rng.randrange(self.size)
+
+    def id_for(self, kind, n):
+        if n >= self.size:
+            return self.low + n
+        offset = self._offset + zlib.crc32(kind.encode('utf-8'))
+        return self.low + (self._multiplier * n + offset) % self.size
+
+
+def id_allocator(strategy='random', seed=None, shard=None):
+    """Returns a new allocator for a strategy of ``STRATEGIES``.
+
+    ``shard`` is an ``(index, count)`` tuple for the sharded strategy.
+    """
+    if strategy == 'random':
+        return SeededIds(seed)
+    if strategy == 'sequential':
+        return SequentialIds()
+    if strategy == 'sharded':
+        if shard is None:
+            raise ValueError("the sharded strategy requires a shard")
+        return ShardedIds(*shard)
+    raise ValueError("strategy must be one of {}".format(", ".join(STRATEGIES)))
@@ -0,0 +1,398 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""An append-only journal of the mutations of a store, replayed on restart.
+
+The journal is a directory of numbered segments, each mutation being
+appended to the last one as a pickle prefixed by its length and CRC.
+Appends are written to the file at once, so they survive the process
+crashing; a background thread fsyncs them in batches every
+``fsync_interval`` seconds, so a machine crash loses at most that much.
+
+Once the last segment grows past ``compact_size`` bytes, the thread
+compacts the journal: it starts a new segment and writes the store to a
+snapshot that replaces all the segments before it, which keeps replay
+time bounded.
+"""
+import gc
+import logging
+import os
+import re
+import struct
+import threading
+import zlib
+
+from fake_ubersmith.api.adapters import snapshot
+from fake_ubersmith.api.adapters.ids import IdAllocator
+from fake_ubersmith.api.adapters.storage import RECORD_COLLECTIONS, Storage
+from fake_ubersmith.api.utils.concurrency import ReadWriteLock
+
+DEFAULT_FSYNC_INTERVAL = 0.05
+DEFAULT_COMPACT_SIZE = 64 * 1024 * 1024
+
+_FRAME_HEADER = struct.Struct('>II')
+_SEGMENT = re.compile(r'^journal-(\d+)\.log$')
+_SNAPSHOT = re.compile(r'^snapshot-(\d+)$')
+
+# Store methods an entry can replay, named by its first element
+_REPLAYED = frozenset([
+    'insert', 'load', 'update_items', 'append_event', 'load_acl_resources', 'flush', 'import_state'
+])
+
+logger = logging.getLogger(__name__)
+
+
+class JournalError(ValueError):
+    pass
+
+
+class Journal:
+    """The journal kept in ``directory``, created when missing."""
+
+    def __init__(self, directory, fsync_interval=DEFAULT_FSYNC_INTERVAL, compact_size=DEFAULT_COMPACT_SIZE):
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.compact_size = compact_size
+        os.makedirs(directory, exist_ok=True)
+
+        # Mutations share the rotation lock from their change to their
+        # append, so that a compaction never splits them.
+        self._rotation = ReadWriteLock()
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._compaction_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._store = None
+        self._segment = None
+        self._generation = 0
+        self._size = 0
+        self._dirty = False
+        self._thread = None
+
+    def restore(self, store, replay):
+        """Restores ``store`` from the journal, handing each entry to ``replay``.
+
+        Starts the journaling of new entries in a new segment, and returns
+        whether anything was restored.
+        """
+        segments = self._generations(_SEGMENT)
+        covered = max(self._generations(_SNAPSHOT), default=0)
+        restored = False
+
+        if covered:
+            snapshot.load(store, self._path('snapshot-{:08d}', covered))
+            restored = True
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for generation in sorted(segments):
+                if generation > covered:
+                    for entry in _entries(self._path('journal-{:08d}.log', generation)):
+                        replay(entry)
+                        restored = True
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        self._store = store
+        self._remove_covered(covered)
+        self._start_segment(max(segments + [covered]) + 1)
+        self._thread = threading.Thread(target=self._run, name='journal', daemon=True)
+        self._thread.start()
+        return restored
+
+    def mutating(self):
+        """Holds back compaction while a mutation is made and appended."""
+        return self._rotation.reading()
+
+    def append(self, entry):
+        data = snapshot.pickle_value(entry)
+        frame = _FRAME_HEADER.pack(len(data), zlib.crc32(data)) + data
+        with self._write_lock:
+            self._segment.write(frame)
+            self._segment.flush()
+            self._size += len(frame)
+            self._dirty = True
+
+    def sync(self):
+        """Fsyncs the entries appended since the last sync, all at once."""
+        with self._sync_lock:
+            with self._write_lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+            os.fsync(self._segment.fileno())
+
+    def compact(self):
+        """Replaces the segments by a snapshot of the store."""
+        store = self._store
+        with self._compaction_lock:
+            with store.reading(*store.collections):
+                with self._rotation.writing():
+                    covered = self._generation
+                    self._start_segment(covered + 1)
+
+                path = self._path('snapshot-{:08d}', covered)
+                with open(path + '.tmp', 'wb') as f:
+                    snapshot.write_state(store.export_state(), f)
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+            self._sync_directory()
+            self._remove_covered(covered)
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        if self._segment is not None:
+            with self._sync_lock:
+                self._segment.flush()
+                os.fsync(self._segment.fileno())
+                self._segment.close()
+
+    def _run(self):
+        while not self._closed.wait(self.fsync_interval):
+            try:
+                self.sync()
+                if self._size >= self.compact_size:
+                    self.compact()
+            except OSError:
+                logger.exception("Could not write the journal in %s", self.directory)
+
+    def _start_segment(self, generation):
+        segment = open(self._path('journal-{:08d}.log', generation), 'ab')
+        self._sync_directory()
+        with self._sync_lock:
+            with self._write_lock:
+                previous, self._segment = self._segment, segment
+                self._generation = generation
+                self._size = 0
+                self._dirty = False
+            if previous is not None:
+                os.fsync(previous.fileno())
+                previous.close()
+
+    def _remove_covered(self, covered):
+        for name in os.listdir(self.directory):
+            segment, saved = _SEGMENT.match(name), _SNAPSHOT.match(name)
+            if (segment and int(segment.group(1)) <= covered) or (saved and int(saved.group(1)) < covered) \
+                    or name.endswith('.tmp'):
+                os.remove(os.path.join(self.directory, name))
+
+    def _generations(self, pattern):
+        return [int(match.group(1)) for match in map(pattern.match, os.listdir(self.directory)) if match]
+
+    def _path(self, name, generation):
+        return os.path.join(self.directory, name.format(generation))
+
+    def _sync_directory(self):
+        # New and renamed files only survive a crash once their directory is synced
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class JournaledStore(Storage):
+    """A store whose mutations are appended to ``journal``.
+
+    ``restore()`` must be called first, to replay the journal.
+    """
+
+    def __init__(self, store, journal):
+        self.store = store
+        self.journal = journal
+        self.restored = False
+        self._ids = _JournaledIds(store.ids, journal)
+
+    def restore(self):
+        self.restored = self.journal.restore(self.store, self._replay)
+        return self.restored
+
+    def close(self):
+        self.journal.close()
+        self.store.close()
+
+    @property
+    def ids(self):
+        return self._ids
+
+    @property
+    def collections(self):
+        return self.store.collections
+
+    def reading(self, *collections):
+        return self.store.reading(*collections)
+
+    def writing(self, *collections):
+        return self.store.writing(*collections)
+
+    def versions(self, *collections):
+        return self.store.versions(*collections)
+
+    def lookup(self, collection, index, value):
+        return self.store.lookup(collection, index, value)
+
+    def lookup_all(self, collection, index, value):
+        return self.store.lookup_all(collection, index, value)
+
+    def records(self, collection):
+        return self.store.records(collection)
+
+    def insert(self, collection, record):
+        with self.journal.mutating():
+            self.store.insert(collection, record)
+            self.journal.append(("insert", collection, record))
+
+    def load(self, collection, records):
+        with self.journal.mutating():
+            self.store.load(collection, records)
+            self.journal.append(("load", collection, records))
+
+    def update(self, collection, record, changes):
+        # Records are found again on replay by their first index
+        index, key_getter = next(iter(RECORD_COLLECTIONS[collection].items()))
+        key = key_getter(record)
+        with self.journal.mutating():
+            self.store.update(collection, record, changes)
+            self.journal.append(("update", collection, index, key, changes))
+
+    def get_item(self, mapping, key, default=None):
+        return self.store.get_item(mapping, key, default)
+
+    def set_item(self, mapping, key, value):
+        with self.journal.mutating():
+            self.store.set_item(mapping, key, value)
+            self.journal.append(("update_items", mapping, [(key, value)]))
+
+    def items(self, mapping):
+        return self.store.items(mapping)
+
+    def update_items(self, mapping, items):
+        items = list(items)
+        with self.journal.mutating():
+            self.store.update_items(mapping, items)
+            self.journal.append(("update_items", mapping, items))
+
+    def append_event(self, event):
+        with self.journal.mutating():
+            self.store.append_event(event)
+            self.journal.append(("append_event", event))
+
+    def read_events(self, cursor, limit):
+        return self.store.read_events(cursor, limit)
+
+    def acl_tree(self):
+        return self.store.acl_tree()
+
+    def add_acl_resource(self, resource):
+        with self.journal.mutating():
+            resource_id = self.store.add_acl_resource(resource)
+            self.journal.append(("load_acl_resources", [dict(resource, children={})]))
+        return resource_id
+
+    def load_acl_resources(self, resources):
+        with self.journal.mutating():
+            self.store.load_acl_resources(resources)
+            # Loaded resources hold their children by now, which are journaled on their own
+            self.journal.append(("load_acl_resources", [dict(resource, children={}) for resource in resources]))
+
+    def collection_sizes(self):
+        return self.store.collection_sizes()
+
+    def export_state(self):
+        return self.store.export_state()
+
+    def import_state(self, state):
+        with self.journal.mutating():
+            self.store.import_state(state)
+            self.journal.append(("import_state", state))
+
+    def flush(self):
+        # The collections are locked before the journal, in the order a
+        # compaction locks them, and emptied by importing an empty state.
+        with self.store.writing(*self.store.collections):
+            with self.journal.mutating():
+                self.store.import_state({})
+                self.journal.append(("flush",))
+
+    def _replay(self, entry):
+        operation, args = entry[0], entry[1:]
+        if operation == "update":
+            collection, index, key, changes = args
+            record = self.store.lookup(collection, index, key)
+            if record is not None:
+                self.store.update(collection, record, changes)
+        elif operation == "reserve":
+            self.store.ids.reserve(*args)
+        elif operation in _REPLAYED:
+            getattr(self.store, operation)(*args)
+        else:
+            raise JournalError("Unknown journal entry {}".format(operation))
+
+
+class _JournaledIds(IdAllocator):
+    """The ids of ``ids``, allocated ones being journaled as reserved."""
+
+    def __init__(self, ids, journal):
+        super().__init__()
+        self.ids = ids
+        self.journal = journal
+
+    def next_id(self, kind):
+        with self.journal.mutating():
+            record_id = self.ids.next_id(kind)
+            self.journal.append(("reserve", kind, record_id))
+        return record_id
+
+    def reserve(self, kind, record_id):
+        with self.journal.mutating():
+            self.ids.reserve(kind, record_id)
+            self.journal.append(("reserve", kind, record_id))
+
+    def id_for(self, kind, n):
+        return self.ids.id_for(kind, n)
+
+    def reset(self):
+        self.ids.reset()
+
+    def export_state(self):
+        return self.ids.export_state()
+
+    def import_state(self, state):
+        self.ids.import_state(state)
+
+
+def _entries(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    position = 0
+    while position + _FRAME_HEADER.size <= len(data):
+        length, crc = _FRAME_HEADER.unpack_from(data, position)
+        start, end = position + _FRAME_HEADER.size, position + _FRAME_HEADER.size + length
+        payload = data[start:end]
+        if zlib.crc32(payload) != crc:
+            if end >= len(data):
+                # The last entry was cut short by a crash while appending it
+                return
+            raise JournalError("Corrupted journal entry at {} of {}".format(position, path))
+        try:
+            yield snapshot.unpickle_value(payload)
+        except snapshot.SnapshotError as e:
+            raise JournalError("Corrupted journal entry at {} of {}: {}".format(position, path, e))
+        position = end
@@ -0,0 +1,111 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from collections.abc import Mapping, MutableMapping
+
+from werkzeug.datastructures import MultiDict
+
+
+class _Shape:
+    """The keys of records, shared by every record having them in that order."""
+
+    __slots__ = ('keys', 'positions', '_with')
+
+    def __init__(self, keys):
+        self.keys = keys
+        self.positions = {key: position for position, key in enumerate(keys)}
+        self._with = {}
+
+    def with_key(self, key):
+        shape = self._with.get(key)
+        if shape is None:
+            shape = self._with[key] = shape_of(self.keys + (key,))
+        return shape
+
+
+_SHAPES = {}
+
+
+def shape_of(keys):
+    shape = _SHAPES.get(keys)
+    if shape is None:
+        shape = _SHAPES.setdefault(keys, _Shape(keys))
+    return shape
+
+
+class Record(MutableMapping):
+    """A compact dict of strings, for the many records of the same fields.
+
+    Instead of its own hash table a record only holds its values and the
+    shape of its keys, which records of the same fields share.  It compares
+    equal to a dict of the same items and is serialized through
+    ``to_dict()``.
+    """
+
+    __slots__ = ('_shape', '_values')
+
+    def __init__(self, items=()):
+        if isinstance(items, MultiDict):
+            items = items.to_dict()
+        elif not isinstance(items, Mapping):
+            items = dict(items)
+        self._shape = shape_of(tuple(items))
+        self._values = list(items.values())
+
+    @classmethod
+    def of(cls, items):
+        return items if isinstance(items, cls) else cls(items)
+
+    def __getitem__(self, key):
+        return self._values[self._shape.positions[key]]
+
+    def __setitem__(self, key, value):
+        position = self._shape.positions.get(key)
+        if position is None:
+            self._shape = self._shape.with_key(key)
+            self._values.append(value)
+        else:
+            self._values[position] = value
+
+    def __delitem__(self, key):
+        position = self._shape.positions[key]
+        self._shape = shape_of(self._shape.keys[:position] + self._shape.keys[position + 1:])
+        del self._values[position]
+
+    def __contains__(self, key):
+        return key in self._shape.positions
+
+    def __iter__(self):
+        return iter(self._shape.keys)
+
+    def __len__(self):
+        return len(self._values)
+
+    def get(self, key, default=None):
+        position = self._shape.positions.get(key)
+        return default if position is None else self._values[position]
+
+    def to_dict(self):
+        return dict(zip(self._shape.keys, self._values))
+
+    def copy(self):
+        return self.to_dict()
+
+    def __repr__(self):
+        return 'Record({!r})'.format(self.to_dict())
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(state)
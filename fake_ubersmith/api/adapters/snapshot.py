@@ -0,0 +1,163 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Binary snapshots of a whole DataStore.
+
+A snapshot is a short header followed by the state of the store pickled
+with protocol 4.  Only builtin types and the canned errors of the order
+methods are ever unpickled, so loading a snapshot received over HTTP
+can't run arbitrary code.
+"""
+import copyreg
+import gc
+import io
+import mmap
+import os
+import pickle
+
+from werkzeug.datastructures import ImmutableMultiDict, MultiDict
+
+from fake_ubersmith.api.adapters.records import Record
+
+MAGIC = b'FAKEUBERSMITH-SNAPSHOT'
+VERSION = 1
+
+_PROTOCOL = 4
+_HEADER = MAGIC + bytes([VERSION])
+
+_ALLOWED_GLOBALS = {
+    ('builtins', 'dict'),
+    ('builtins', 'set'),
+    ('builtins', 'frozenset'),
+    # Canned responses of the order methods, e.g. data_store.order
+    ('fake_ubersmith.api.ubersmith', 'FakeUbersmithError'),
+}
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def save(data_store, path):
+    """Writes a snapshot of the store, replacing the file atomically."""
+    temporary_path = '{}.tmp'.format(path)
+    with open(temporary_path, 'wb') as f:
+        write(data_store, f)
+    os.replace(temporary_path, path)
+
+
+def load(data_store, path):
+    """Replaces the content of the store by a snapshot file."""
+    with open(path, 'rb') as f:
+        try:
+            # Mapping the file lets the unpickler read it straight from the
+            # page cache instead of copying it in memory first.
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            read(data_store, f)
+            return
+
+        try:
+            read(data_store, buffer)
+        finally:
+            buffer.close()
+
+
+def dumps(data_store):
+    f = io.BytesIO()
+    write(data_store, f)
+    return f.getvalue()
+
+
+def loads(data_store, data):
+    read(data_store, io.BytesIO(data))
+
+
+def write(data_store, f):
+    with data_store.reading(*data_store.collections):
+        write_state(data_store.export_state(), f)
+
+
+def write_state(state, f):
+    """Writes the ``export_state()`` of a store, which the caller keeps unchanged."""
+    f.write(_HEADER)
+    _pickler(f).dump(state)
+
+
+def read(data_store, f):
+    header = f.read(len(_HEADER))
+    if header[:len(MAGIC)] != MAGIC:
+        raise SnapshotError("Not a fake-ubersmith snapshot")
+    if header[len(MAGIC):] != bytes([VERSION]):
+        raise SnapshotError("Unsupported snapshot version")
+
+    # Only new, referenced containers are created while loading: collecting
+    # them would only slow the load down.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        try:
+            state = _Unpickler(f).load()
+        except (pickle.UnpicklingError, EOFError, ValueError, TypeError) as e:
+            raise SnapshotError("Corrupted snapshot: {}".format(e))
+        if not isinstance(state, dict):
+            raise SnapshotError("Corrupted snapshot: unexpected content")
+
+        with data_store.writing(*data_store.collections):
+            data_store.import_state(state)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def pickle_value(value):
+    """Pickles a value the way the state of a snapshot is."""
+    f = io.BytesIO()
+    _pickler(f).dump(value)
+    return f.getvalue()
+
+
+def unpickle_value(data):
+    """Unpickles a value of ``pickle_value()``, only ever creating the types of a snapshot."""
+    try:
+        return _Unpickler(io.BytesIO(data)).load()
+    except (pickle.UnpicklingError, EOFError, ValueError, TypeError) as e:
+        raise SnapshotError("Corrupted value: {}".format(e))
+
+
+def _pickler(f):
+    pickler = pickle.Pickler(f, protocol=_PROTOCOL)
+    pickler.dispatch_table = _DISPATCH_TABLE
+    return pickler
+
+
+def _reduce_multidict(multidict):
+    # Handlers only ever read the first value of a key
+    return dict, (multidict.to_dict(),)
+
+
+def _reduce_record(record):
+    return dict, (record.to_dict(),)
+
+
+_DISPATCH_TABLE = copyreg.dispatch_table.copy()
+_DISPATCH_TABLE[Record] = _reduce_record
+_DISPATCH_TABLE[MultiDict] = _reduce_multidict
+_DISPATCH_TABLE[ImmutableMultiDict] = _reduce_multidict
+
+
+class _Unpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) in _ALLOWED_GLOBALS:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError("Forbidden global {}.{}".format(module, name))
@@ -0,0 +1,460 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Storage in a SQLite database, shared by the processes opening it.
+
+The database runs in WAL mode: readers see the last committed state while
+a writer works.  ``writing()`` is a ``BEGIN IMMEDIATE`` transaction, which
+serializes writers across processes, and ``reading()`` a deferred one, so
+a handler reads a consistent state.  Records and values are pickled like
+snapshots, so that only builtin types are unpickled from a shared database
+file; each indexed field of a record collection is also a column with its
+own index.  Upserts are an insert then an update, which SQLite releases
+older than 3.24 support too.
+"""
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from fake_ubersmith.api.adapters.acl_tree import AclTree, highest_id, walk
+from fake_ubersmith.api.adapters.snapshot import pickle_value, unpickle_value
+from fake_ubersmith.api.adapters.ids import IdAllocator, id_allocator
+from fake_ubersmith.api.adapters.storage import MAPPINGS, RECORD_COLLECTIONS, Storage
+
+# Mappings that are None, rather than empty, until they are first set
+_OPTIONAL_MAPPINGS = ('service_plans_list',)
+
+
+def _record_statements(collection, indexes):
+    columns = ", ".join(indexes)
+    return {
+        'insert': "INSERT INTO {} (record, {}) VALUES (?, {})".format(
+            collection, columns, ", ".join("?" * len(indexes))
+        ),
+        'update': "UPDATE {} SET record = ?, {} WHERE position = ?".format(
+            collection, ", ".join("{} = ?".format(index) for index in indexes)
+        ),
+        'lookup': {
+            index: "SELECT position, record FROM {} WHERE {} = ? ORDER BY position".format(collection, index)
+            for index in indexes
+        },
+        'records': "SELECT record FROM {} ORDER BY position".format(collection),
+        'count': "SELECT count(*) FROM {}".format(collection),
+    }
+
+
+_STATEMENTS = {
+    collection: _record_statements(collection, indexes) for collection, indexes in RECORD_COLLECTIONS.items()
+}
+
+_SCHEMA = [
+    statement
+    for collection, indexes in RECORD_COLLECTIONS.items()
+    for statement in [
+        "CREATE TABLE IF NOT EXISTS {} (position INTEGER PRIMARY KEY, record BLOB NOT NULL, {})".format(
+            collection, ", ".join(indexes)
+        )
+    ] + [
+        "CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1}, position)".format(collection, index)
+        for index in indexes
+    ]
+] + [
+    "CREATE TABLE IF NOT EXISTS items ("
+    " mapping TEXT NOT NULL, key NOT NULL, value BLOB NOT NULL, UNIQUE (mapping, key))",
+    "CREATE TABLE IF NOT EXISTS mappings (mapping TEXT PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS events (position INTEGER PRIMARY KEY, event BLOB NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS acl_resources ("
+    " position INTEGER PRIMARY KEY, resource_id UNIQUE NOT NULL, name, resource BLOB NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS acl_resources_name ON acl_resources (name, position)",
+    "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS reserved_ids (kind TEXT NOT NULL, id INTEGER NOT NULL, PRIMARY KEY (kind, id))",
+]
+
+_CLEARED_TABLES = tuple(RECORD_COLLECTIONS) + ('items', 'mappings', 'events', 'acl_resources', 'reserved_ids')
+
+
+class SqliteStore(Storage):
+    """Storage in the SQLite database at ``path``, created when missing.
+
+    Each thread gets its own connection.  The ids are allocated in the
+    database following the strategy of ``ids``, so that processes sharing
+    the database never hand out the same one.
+    """
+
+    def __init__(self, path, ids=None, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._ids = _SqliteIds(self, ids or id_allocator())
+        self._acl_tree = (None, None)
+
+        connection = self._connection
+        connection.execute("PRAGMA journal_mode=WAL")
+        with self.writing():
+            for statement in _SCHEMA:
+                connection.execute(statement)
+
+    @property
+    def ids(self):
+        return self._ids
+
+    @property
+    def collections(self):
+        return tuple(RECORD_COLLECTIONS) + MAPPINGS + ('event_log', 'acl_resources', 'acl_resources_counter')
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Statements are kept compiled in the statement cache of the
+            # connection, the same SQL being reused with new parameters.
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False,
+                cached_statements=256
+            )
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.depth = 0
+        return connection
+
+    def reading(self, *collections):
+        return self._transaction("DEFERRED")
+
+    @contextmanager
+    def writing(self, *collections):
+        with self._transaction("IMMEDIATE"):
+            yield
+            # Committed along with the changes, for every process to see them
+            names = [("version:" + name,) for name in set(collections or self.collections)]
+            self._connection.executemany("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", names)
+            self._connection.executemany("UPDATE counters SET value = value + 1 WHERE name = ?", names)
+
+    def versions(self, *collections):
+        names = ["version:" + name for name in collections]
+        values = dict(self._connection.execute(
+            "SELECT name, value FROM counters WHERE name IN ({})".format(", ".join("?" * len(names))), names
+        ))
+        return tuple(values.get(name, 0) for name in names)
+
+    @contextmanager
+    def _transaction(self, mode):
+        connection = self._connection
+        if self._local.depth:
+            # Nested in a transaction of this thread, which it is part of
+            self._local.depth += 1
+            try:
+                yield
+            finally:
+                self._local.depth -= 1
+            return
+
+        connection.execute("BEGIN {}".format(mode))
+        self._local.depth = 1
+        try:
+            yield
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        else:
+            connection.execute("COMMIT")
+        finally:
+            self._local.depth = 0
+
+    def close(self):
+        """Closes the connection of the calling thread."""
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    def lookup(self, collection, index, value):
+        row = self._connection.execute(_STATEMENTS[collection]['lookup'][index], (value,)).fetchone()
+        return None if row is None else _loads(row[1])
+
+    def lookup_all(self, collection, index, value):
+        rows = self._connection.execute(_STATEMENTS[collection]['lookup'][index], (value,))
+        return [_loads(record) for _, record in rows]
+
+    def records(self, collection):
+        return [_loads(record) for record, in self._connection.execute(_STATEMENTS[collection]['records'])]
+
+    def insert(self, collection, record):
+        self.load(collection, [record])
+
+    def load(self, collection, records):
+        indexes = RECORD_COLLECTIONS[collection].values()
+        self._connection.executemany(
+            _STATEMENTS[collection]['insert'],
+            ((_dumps(dict(record)),) + _index_values(record, indexes) for record in records)
+        )
+
+    def update(self, collection, record, changes):
+        statements = _STATEMENTS[collection]
+        indexes = RECORD_COLLECTIONS[collection]
+        key, key_getter = next(iter(indexes.items()))
+
+        with self.writing(collection):
+            row = self._connection.execute(statements['lookup'][key], (key_getter(record),)).fetchone()
+            if row is None:
+                raise KeyError(key_getter(record))
+            position, stored = row[0], _loads(row[1])
+            stored.update(changes)
+            self._connection.execute(
+                statements['update'],
+                (_dumps(stored),) + _index_values(stored, indexes.values()) + (position,)
+            )
+
+    def get_item(self, mapping, key, default=None):
+        row = self._connection.execute(
+            "SELECT value FROM items WHERE mapping = ? AND key = ?", (mapping, key)
+        ).fetchone()
+        return default if row is None else _loads(row[0])
+
+    def set_item(self, mapping, key, value):
+        self.update_items(mapping, [(key, value)])
+
+    def items(self, mapping):
+        rows = self._connection.execute(
+            "SELECT key, value FROM items WHERE mapping = ? ORDER BY rowid", (mapping,)
+        ).fetchall()
+        if not rows and mapping in _OPTIONAL_MAPPINGS and not self._is_set(mapping):
+            return None
+        return {key: _loads(value) for key, value in rows}
+
+    def update_items(self, mapping, items):
+        connection = self._connection
+        with self.writing(mapping):
+            connection.execute("INSERT OR IGNORE INTO mappings (mapping) VALUES (?)", (mapping,))
+            items = [(_dumps(value), mapping, key) for key, value in items]
+            # Inserted first, then all set, for the last value of a key to win
+            # and the keys to keep the order they were first inserted in
+            connection.executemany("INSERT OR IGNORE INTO items (value, mapping, key) VALUES (?, ?, ?)", items)
+            connection.executemany("UPDATE items SET value = ? WHERE mapping = ? AND key = ?", items)
+
+    def _is_set(self, mapping):
+        return self._connection.execute("SELECT 1 FROM mappings WHERE mapping = ?", (mapping,)).fetchone() is not None
+
+    def append_event(self, event):
+        self._append_events([event])
+
+    def _append_events(self, events):
+        connection = self._connection
+        with self.writing("event_log"):
+            position, = connection.execute("SELECT coalesce(max(position) + 1, 0) FROM events").fetchone()
+            connection.executemany(
+                "INSERT INTO events (position, event) VALUES (?, ?)",
+                ((position + i, _dumps(event)) for i, event in enumerate(events))
+            )
+
+    def read_events(self, cursor, limit):
+        # Events are all kept on disk, so none is ever dropped
+        cursor = max(cursor, 0)
+        events = [
+            _loads(event) for event, in self._connection.execute(
+                "SELECT event FROM events WHERE position >= ? ORDER BY position LIMIT ?", (cursor, limit)
+            )
+        ]
+        return events, cursor + len(events), 0
+
+    def acl_tree(self):
+        version = self._counter("acl_version")
+        cached_version, tree = self._acl_tree
+        if cached_version != version:
+            tree = AclTree()
+            tree.load(self._stored_acl_resources())
+            tree = tree.numbered()
+            self._acl_tree = version, tree
+        return tree
+
+    def add_acl_resource(self, resource):
+        with self.writing("acl_resources"):
+            if resource.get("resource_id") is None:
+                resource["resource_id"] = str(self._increment("acl_resources"))
+            self._insert_acl_resources([resource])
+        return resource["resource_id"]
+
+    def load_acl_resources(self, resources):
+        with self.writing("acl_resources"):
+            # Ids are only allocated past the ones given in the batch
+            self._advance("acl_resources", highest_id(resources))
+            for resource in resources:
+                if resource.get("resource_id") is None:
+                    resource["resource_id"] = str(self._increment("acl_resources"))
+            # Loading them along the stored ones raises if they don't fit in the tree
+            AclTree().load(self._stored_acl_resources() + [dict(resource, children={}) for resource in resources])
+            self._insert_acl_resources(resources)
+
+    def _stored_acl_resources(self):
+        return [
+            _loads(resource)
+            for resource, in self._connection.execute("SELECT resource FROM acl_resources ORDER BY position")
+        ]
+
+    def _insert_acl_resources(self, resources):
+        self._connection.executemany(
+            "INSERT INTO acl_resources (resource_id, name, resource) VALUES (?, ?, ?)",
+            ((r["resource_id"], r["name"], _dumps(dict(r, children={}))) for r in resources)
+        )
+        self._increment("acl_version")
+
+    def _counter(self, name):
+        row = self._connection.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def _increment(self, name):
+        connection = self._connection
+        with self._transaction("IMMEDIATE"):
+            connection.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", (name,))
+            connection.execute("UPDATE counters SET value = value + 1 WHERE name = ?", (name,))
+            return self._counter(name)
+
+    def _advance(self, name, value):
+        connection = self._connection
+        with self._transaction("IMMEDIATE"):
+            connection.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", (name,))
+            connection.execute("UPDATE counters SET value = max(value, ?) WHERE name = ?", (value, name))
+
+    def collection_sizes(self):
+        connection = self._connection
+        with self.reading():
+            sizes = {
+                collection: connection.execute(statements['count']).fetchone()[0]
+                for collection, statements in _STATEMENTS.items()
+            }
+            sizes.update(connection.execute(
+                "SELECT mapping, count(key) FROM mappings LEFT JOIN items USING (mapping) GROUP BY mapping"
+            ))
+            sizes.update({
+                mapping: 0 for mapping in MAPPINGS if mapping not in sizes and mapping not in _OPTIONAL_MAPPINGS
+            })
+            sizes["event_log"] = connection.execute("SELECT count(*) FROM events").fetchone()[0]
+            sizes["acl_resources"] = len(self.acl_tree())
+        return sizes
+
+    def export_state(self):
+        with self.reading():
+            state = {collection: self.records(collection) for collection in RECORD_COLLECTIONS}
+            state.update((mapping, self.items(mapping)) for mapping in MAPPINGS)
+            state["event_log"] = [
+                _loads(event) for event, in self._connection.execute("SELECT event FROM events ORDER BY position")
+            ]
+            state["acl_resources"] = dict(self.acl_tree())
+            state["acl_resources_counter"] = self._counter("acl_resources")
+            state["ids"] = self._ids.export_state()
+        return state
+
+    def import_state(self, state):
+        with self.writing():
+            self._clear()
+            self._ids.import_state(state.get("ids", {}))
+            for collection in RECORD_COLLECTIONS:
+                self.load(collection, state.get(collection, ()))
+            for mapping in MAPPINGS:
+                if state.get(mapping) is not None:
+                    self.update_items(mapping, state[mapping].items())
+            self._append_events(state.get("event_log", ()))
+            resources = [dict(resource, children={}) for resource in walk(state.get("acl_resources", {}))]
+            if resources:
+                self._insert_acl_resources(resources)
+            self._advance("acl_resources", state.get("acl_resources_counter", 0))
+
+    def flush(self):
+        with self.writing():
+            self._clear()
+
+    def _clear(self):
+        connection = self._connection
+        for table in _CLEARED_TABLES:
+            connection.execute("DELETE FROM {}".format(table))
+        # The versions only ever grow, for no process to keep serving what
+        # it cached before the flush.
+        connection.execute("DELETE FROM counters WHERE name != 'acl_version' AND name NOT LIKE 'version:%'")
+        self._increment("acl_version")
+
+
+class _SqliteIds(IdAllocator):
+    """The ids of ``strategy``, their sequences and reservations kept in the database."""
+
+    def __init__(self, store, strategy):
+        super().__init__()
+        self.store = store
+        self.strategy = strategy
+
+    def next_id(self, kind):
+        connection = self.store._connection
+        with self.store.writing("ids"):
+            while True:
+                record_id = self.strategy.id_for(kind, self.store._increment("ids:" + kind) - 1)
+                if connection.execute(
+                    "SELECT 1 FROM reserved_ids WHERE kind = ? AND id = ?", (kind, record_id)
+                ).fetchone() is None:
+                    return record_id
+
+    def reserve(self, kind, record_id):
+        try:
+            record_id = int(record_id)
+        except (TypeError, ValueError):
+            return
+        self.store._connection.execute(
+            "INSERT OR IGNORE INTO reserved_ids (kind, id) VALUES (?, ?)", (kind, record_id)
+        )
+
+    def id_for(self, kind, n):
+        return self.strategy.id_for(kind, n)
+
+    def reset(self):
+        with self.store.writing("ids"):
+            self.store._connection.execute("DELETE FROM counters WHERE name LIKE 'ids:%'")
+            self.store._connection.execute("DELETE FROM reserved_ids")
+
+    def export_state(self):
+        connection = self.store._connection
+        with self.store.reading("ids"):
+            state = {
+                name[len("ids:"):]: {"allocated": value, "reserved": set()}
+                for name, value in connection.execute("SELECT name, value FROM counters WHERE name LIKE 'ids:%'")
+            }
+            for kind, record_id in connection.execute("SELECT kind, id FROM reserved_ids"):
+                state.setdefault(kind, {"allocated": 0, "reserved": set()})["reserved"].add(record_id)
+        return state
+
+    def import_state(self, state):
+        connection = self.store._connection
+        with self.store.writing("ids"):
+            self.reset()
+            connection.executemany(
+                "INSERT INTO counters (name, value) VALUES (?, ?)",
+                (("ids:" + kind, value["allocated"]) for kind, value in state.items())
+            )
+            connection.executemany(
+                "INSERT INTO reserved_ids (kind, id) VALUES (?, ?)",
+                ((kind, record_id) for kind, value in state.items() for record_id in value["reserved"])
+            )
+
+
+def _dumps(value):
+    return pickle_value(value)
+
+
+def _loads(value):
+    return unpickle_value(value)
+
+
+def _index_values(record, key_getters):
+    values = []
+    for key_getter in key_getters:
+        try:
+            values.append(key_getter(record))
+        except (KeyError, TypeError):
+            values.append(None)
+    return tuple(values)
@@ -0,0 +1,155 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""The storage interface the method modules work through.
+
+Records live in record collections, looked up through their indexes, and
+other values in mappings, read and written by key.  Calls must be made
+within ``reading()`` or ``writing()`` of the collections they touch, which
+lock them in memory and make them a transaction in a database.  Records
+returned must not be modified in place: copy them, or use ``update()``.
+"""
+from abc import ABCMeta, abstractmethod
+from operator import itemgetter
+
+RECORD_COLLECTIONS = {
+    # collection: {index: key getter}, the first index being the record key
+    'clients': {
+        'clientid': itemgetter('clientid'),
+        'login': itemgetter('login'),
+    },
+    'contacts': {
+        'contact_id': itemgetter('contact_id'),
+        'client_id': itemgetter('client_id'),
+        'login': itemgetter('login'),
+    },
+    'credit_cards': {
+        'billing_info_id': itemgetter('billing_info_id'),
+        'clientid': itemgetter('clientid'),
+    },
+    'coupons': {
+        'coupon_code': lambda coupon: coupon['coupon']['coupon_code'],
+    },
+    'service_plans': {
+        'plan_id': itemgetter('plan_id'),
+    },
+}
+
+MAPPINGS = (
+    'countries', 'metadatas', 'order', 'order_submit', 'order_cancel', 'roles', 'service_plans_list', 'user_mapping'
+)
+
+
+class Storage(metaclass=ABCMeta):
+    @property
+    @abstractmethod
+    def ids(self):
+        """The IdAllocator handing out the ids of new records."""
+
+    @property
+    @abstractmethod
+    def collections(self):
+        """Names of all the collections, for ``reading()`` or ``writing()`` them all."""
+
+    @abstractmethod
+    def reading(self, *collections):
+        """Context manager reading the collections consistently."""
+
+    @abstractmethod
+    def writing(self, *collections):
+        """Context manager changing the collections, alone."""
+
+    @abstractmethod
+    def versions(self, *collections):
+        """Returns the version of each collection, which grows every time it is written.
+
+        A version is bumped before the changes of ``writing()`` can be read,
+        so that anything derived from a collection can be kept for as long
+        as its version stays the same.
+        """
+
+    @abstractmethod
+    def lookup(self, collection, index, value):
+        """Returns the first record whose ``index`` is ``value``, or None."""
+
+    @abstractmethod
+    def lookup_all(self, collection, index, value):
+        """Returns the records whose ``index`` is ``value``, in insertion order."""
+
+    @abstractmethod
+    def records(self, collection):
+        """Returns all the records of a collection, in insertion order."""
+
+    @abstractmethod
+    def insert(self, collection, record):
+        pass
+
+    @abstractmethod
+    def load(self, collection, records):
+        """Inserts many records at once."""
+
+    @abstractmethod
+    def update(self, collection, record, changes):
+        """Sets the ``changes`` fields of a record ``lookup()`` returned."""
+
+    @abstractmethod
+    def get_item(self, mapping, key, default=None):
+        pass
+
+    @abstractmethod
+    def set_item(self, mapping, key, value):
+        pass
+
+    @abstractmethod
+    def items(self, mapping):
+        """Returns the content of a mapping as a dict, None for a service_plans_list never set."""
+
+    @abstractmethod
+    def update_items(self, mapping, items):
+        """Sets many ``(key, value)`` items, creating the mapping when it was never set."""
+
+    @abstractmethod
+    def append_event(self, event):
+        pass
+
+    @abstractmethod
+    def read_events(self, cursor, limit):
+        """Returns up to ``limit`` events from ``cursor``, the next cursor and the first one."""
+
+    @abstractmethod
+    def acl_tree(self):
+        """Returns the numbered AclTree of the ACL resources, not to be modified."""
+
+    @abstractmethod
+    def add_acl_resource(self, resource):
+        """Adds a resource, giving it the next resource id when it has none, and returns its id."""
+
+    @abstractmethod
+    def load_acl_resources(self, resources):
+        """Adds flat resources, raising AclTreeError without adding any when they don't make a tree."""
+
+    @abstractmethod
+    def collection_sizes(self):
+        pass
+
+    @abstractmethod
+    def export_state(self):
+        """Returns the collections as builtin types, to be given to ``import_state()``."""
+
+    @abstractmethod
+    def import_state(self, state):
+        pass
+
+    @abstractmethod
+    def flush(self):
+        pass
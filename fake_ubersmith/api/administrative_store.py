@@ -0,0 +1,62 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from flask import make_response, request
+
+from fake_ubersmith.api import namespaces
+from fake_ubersmith.api.base import Base
+from fake_ubersmith.api.utils.response import response
+
+
+class AdministrativeStore(Base):
+    def __init__(self, data_store, namespaces=None):
+        super().__init__(data_store)
+        self.namespaces = namespaces
+
+    def hook_to(self, server):
+        self.app = server
+        prefixes = [''] if self.namespaces is None else ['', namespaces.URL_PREFIX]
+        for prefix in prefixes:
+            self.app.add_url_rule(prefix + '/__snapshot', view_func=self.snapshot_save, methods=['GET'])
+            self.app.add_url_rule(prefix + '/__snapshot', view_func=self.snapshot_load, methods=['PUT'])
+
+    def snapshot_save(self, namespace=None):
+        try:
+            data_store = namespaces.requested_data_store(self.namespaces, self.data_store, namespace)
+        except namespaces.InvalidNamespace as e:
+            return response(error_code=1, message=str(e))
+
+        # Only imported here, pickle weighing on the startup
+        from fake_ubersmith.api.adapters import snapshot
+
+        data = snapshot.dumps(data_store)
+        self.logger.info("Snapshot of %s bytes taken", len(data))
+        return make_response((data, 200, {
+            'Content-Type': 'application/octet-stream',
+            'Content-Disposition': 'attachment; filename=fake-ubersmith.snapshot'
+        }))
+
+    def snapshot_load(self, namespace=None):
+        from fake_ubersmith.api.adapters import snapshot
+
+        try:
+            data_store = namespaces.requested_data_store(self.namespaces, self.data_store, namespace)
+            snapshot.loads(data_store, request.get_data())
+        except namespaces.InvalidNamespace as e:
+            return response(error_code=1, message=str(e))
+        except snapshot.SnapshotError as e:
+            self.logger.error("Snapshot could not be loaded: %s", e)
+            return response(error_code=1, message=str(e))
+
+        self.logger.info("Snapshot loaded")
+        return response(data=data_store.collection_sizes())
@@ -0,0 +1,244 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""ASGI front-end of the fake.
+
+Ubersmith calls, ``/api/2.0/`` and ``/api/2.0/batch``, are parsed and
+their injected delays awaited on the event loop, so that delayed calls only
+hold a connection.  Handlers may block, on the locks of the store, a
+database or a journal write, so they run in worker threads, as do every
+other route, administrative ones included, and the requests these two
+leave aside, handed to the Flask application.
+"""
+import asyncio
+import io
+import json
+import sys
+import time
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+
+from fake_ubersmith.api import namespaces
+from fake_ubersmith.api.capture import form_params
+from fake_ubersmith.api.response_cache import not_modified
+from fake_ubersmith.api.ubersmith import batch_response
+from fake_ubersmith.api.utils.response import response
+
+_FORM_CONTENT_TYPE = 'application/x-www-form-urlencoded'
+_NAMESPACE_HEADER = namespaces.HEADER.lower().encode('latin-1')
+_NAMESPACE_PREFIX = namespaces.URL_PREFIX.split('<', 1)[0]
+
+_INTERNAL_SERVER_ERROR = (
+    500, [(b'content-type', b'text/plain; charset=utf-8')], b'Internal Server Error'
+)
+
+
+class AsgiApp:
+    def __init__(self, app, ubersmith_base):
+        self.app = app
+        self.ubersmith_base = ubersmith_base
+        self.routes = {
+            '/api/2.0/': self._route_method,
+            '/api/2.0/batch': self._route_batch,
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await _lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = await _read_body(receive)
+
+        namespace, path = _split_namespace(scope)
+        result = None
+        route = self.routes.get(path) if scope['method'] == 'POST' else None
+        if route is not None:
+            with self.app.app_context():
+                try:
+                    api = self.ubersmith_base
+                    if namespace:
+                        # Creating a namespace may open its store and replay its journal
+                        api = await self._blocking(api.api_for, namespace)
+                    result = await route(api, namespace, scope, body)
+                except namespaces.InvalidNamespace as e:
+                    result = _from_response(response(error_code=1, message=str(e)))
+                except HTTPException as e:
+                    result = _from_response(e.get_response())
+                except Exception:
+                    self.app.logger.exception("Exception on %s [%s]", scope['path'], scope['method'])
+                    result = _INTERNAL_SERVER_ERROR
+
+        if result is None:
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(None, self._call_wsgi_app, scope, body)
+
+        status, headers, payload = result
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def _route_method(self, api, namespace, scope, body):
+        if _content_type(scope) != _FORM_CONTENT_TYPE:
+            return None
+
+        data = MultiDict(parse_qsl(body.decode('utf-8'), keep_blank_values=True))
+        method = data.pop("method")
+        capture = self.ubersmith_base.capture
+        params = None if capture is None else form_params(data)
+
+        with api.serving():
+            start = time.perf_counter()
+            resp = None
+            try:
+                await _sleep(api.delay_for(method))
+                resp = await self._blocking(api.dispatch, method, data, start)
+                return _from_response(not_modified(resp, _header(scope, b'if-none-match')))
+            finally:
+                if capture is not None:
+                    capture.record_call(namespace, method, params, start, resp)
+
+    async def _route_batch(self, api, namespace, scope, body):
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            payload = None
+
+        calls, stop_on_error = api.parse_batch(payload)
+        if calls is None:
+            return None
+
+        results = []
+        with api.serving():
+            batch_start = time.perf_counter()
+            for call in calls:
+                start = time.perf_counter()
+                await _sleep(api.batch_call_delay(call))
+                resp = await self._blocking(api.batch_call, call, start)
+                results.append(resp.get_data())
+                if stop_on_error and getattr(resp, 'ubersmith_error_code', None):
+                    break
+
+        resp = batch_response(results)
+        if self.ubersmith_base.capture is not None:
+            self.ubersmith_base.capture.record_batch(namespace, calls, stop_on_error, batch_start, resp)
+        return _from_response(resp)
+
+    async def _blocking(self, function, *args):
+        """Calls ``function(*args)`` in a worker thread, within the application context."""
+        def call():
+            with self.app.app_context():
+                return function(*args)
+
+        return await asyncio.get_event_loop().run_in_executor(None, call)
+
+    def _call_wsgi_app(self, scope, body):
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(' ', 1)[0]), headers]
+
+        chunks = self.app.wsgi_app(_environ(scope, body), start_response)
+        try:
+            payload = b''.join(chunks)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+        status, headers = started
+        return status, [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers], payload
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def _sleep(seconds):
+    if seconds > 0:
+        await asyncio.sleep(seconds)
+
+
+def _split_namespace(scope):
+    path = scope['path']
+    if path.startswith(_NAMESPACE_PREFIX):
+        namespace, _, rest = path[len(_NAMESPACE_PREFIX):].partition('/')
+        return namespace, '/' + rest
+    for name, value in scope['headers']:
+        if name == _NAMESPACE_HEADER:
+            return value.decode('latin-1'), path
+    return None, path
+
+
+def _content_type(scope):
+    content_type = _header(scope, b'content-type')
+    return None if content_type is None else content_type.split(';', 1)[0].strip().lower()
+
+
+def _header(scope, header):
+    for name, value in scope['headers']:
+        if name == header:
+            return value.decode('latin-1')
+    return None
+
+
+def _from_response(resp):
+    headers = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in resp.headers.items()]
+    return resp.status_code, headers, resp.get_data()
+
+
+def _environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        'PATH_INFO': scope['path'],
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = environ[name] + ',' + value if name in environ and name.startswith('HTTP_') else value
+    return environ
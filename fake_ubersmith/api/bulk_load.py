@@ -0,0 +1,198 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from flask import request
+
+from fake_ubersmith.api import namespaces
+from fake_ubersmith.api.adapters.acl_tree import AclTreeError
+from fake_ubersmith.api.base import Base
+from fake_ubersmith.api.utils.response import response
+from fake_ubersmith.api.utils.streaming import StreamFormatError, iter_records
+
+_DEFAULT_ACL_ACTIONS = {"1": "Create", "2": "View", "3": "Update", "4": "Delete"}
+
+
+class BulkLoadError(ValueError):
+    pass
+
+
+class BulkLoad(Base):
+    """Seeds the data store from NDJSON or JSON array request bodies.
+
+        curl --data-binary @clients.ndjson http://localhost:9131/__bulk/clients
+
+    Records are parsed as the body streams in and only given their ids and
+    inserted, under a single write lock, once the whole body is valid; a
+    malformed body loads nothing and allocates no id.
+    """
+
+    def __init__(self, data_store, namespaces=None):
+        super().__init__(data_store)
+        self.namespaces = namespaces
+
+        self.loaders = {
+            'clients': self._load_clients,
+            'contacts': self._load_contacts,
+            'credit_cards': self._load_credit_cards,
+            'coupons': self._load_coupons,
+            'service_plans': self._load_service_plans,
+            'roles': self._load_roles,
+            'acl_resources': self._load_acl_resources,
+        }
+
+    def hook_to(self, server):
+        self.app = server
+        self.app.add_url_rule('/__bulk/<collection>', view_func=self.bulk_load, methods=['POST'])
+        if self.namespaces is not None:
+            self.app.add_url_rule(
+                namespaces.URL_PREFIX + '/__bulk/<collection>', view_func=self.bulk_load, methods=['POST']
+            )
+
+    def bulk_load(self, collection, namespace=None):
+        try:
+            data_store = namespaces.requested_data_store(self.namespaces, self.data_store, namespace)
+        except namespaces.InvalidNamespace as e:
+            return response(error_code=1, message=str(e))
+
+        if collection not in self.loaders:
+            return response(error_code=1, message=self._unknown_collection(collection))
+
+        try:
+            count = self.load(collection, request.stream, data_store=data_store)
+        except (StreamFormatError, BulkLoadError) as e:
+            self.logger.error("Bulk load of %s failed: %s", collection, e)
+            return response(error_code=1, message=str(e))
+
+        self.logger.info("Bulk loaded %s %s", count, collection)
+        return response(data={"loaded": count})
+
+    def load(self, collection, stream, data_store=None):
+        """Loads the NDJSON or JSON array records read from a binary stream.
+
+        Returns how many records were loaded, raising BulkLoadError or
+        StreamFormatError, without loading anything, when they are invalid.
+        """
+        loader = self.loaders.get(collection)
+        if loader is None:
+            raise BulkLoadError(self._unknown_collection(collection))
+        return loader(data_store or self.data_store, iter_records(stream))
+
+    def _unknown_collection(self, collection):
+        return "Unknown collection '{}', supported collections are: {}".format(
+            collection, ", ".join(sorted(self.loaders))
+        )
+
+    def _load_clients(self, data_store, records):
+        clients = [_client(record) for record in _objects(records)]
+        with data_store.writing("clients"):
+            data_store.load("clients", _with_ids(clients, "clientid", data_store.ids, "clients"))
+        return len(clients)
+
+    def _load_contacts(self, data_store, records):
+        contacts = list(_objects(records))
+        with data_store.writing("contacts"):
+            data_store.load("contacts", _with_ids(contacts, "contact_id", data_store.ids, "contacts"))
+        return len(contacts)
+
+    def _load_credit_cards(self, data_store, records):
+        credit_cards = list(_objects(records))
+        with data_store.writing("credit_cards"):
+            data_store.load("credit_cards", _with_ids(credit_cards, "billing_info_id", data_store.ids, "credit_cards"))
+        return len(credit_cards)
+
+    def _load_coupons(self, data_store, records):
+        coupons = [_coupon(record) for record in _objects(records)]
+        with data_store.writing("coupons"):
+            data_store.load("coupons", coupons)
+        return len(coupons)
+
+    def _load_service_plans(self, data_store, records):
+        service_plans = list(_objects(records))
+        with data_store.writing("service_plans", "service_plans_list"):
+            data_store.load("service_plans", _with_ids(service_plans, "plan_id", data_store.ids, "service_plans"))
+            data_store.update_items("service_plans_list", [(plan["plan_id"], plan) for plan in service_plans])
+        return len(service_plans)
+
+    def _load_roles(self, data_store, records):
+        roles = list(_objects(records))
+        with data_store.writing("roles"):
+            roles = {role["role_id"]: role for role in _with_ids(roles, "role_id", data_store.ids, "roles")}
+            data_store.update_items("roles", roles.items())
+        return len(roles)
+
+    def _load_acl_resources(self, data_store, records):
+        resources = [_acl_resource(record) for record in _objects(records)]
+
+        with data_store.writing("acl_resources"):
+            try:
+                data_store.load_acl_resources(resources)
+            except AclTreeError as e:
+                raise BulkLoadError(str(e))
+
+        return len(resources)
+
+
+def _objects(records):
+    for position, record in enumerate(records, start=1):
+        if not isinstance(record, dict):
+            raise BulkLoadError("Record {} is not a JSON object".format(position))
+        yield record
+
+
+def _with_ids(records, key, ids, kind):
+    """Reserves the ids given to the records, then allocates the missing ones.
+
+    Reserving them all first keeps the allocated ids from taking one given
+    further in the body.
+    """
+    for record in records:
+        if record.get(key) is not None:
+            record[key] = str(record[key])
+            ids.reserve(kind, record[key])
+    for record in records:
+        if record.get(key) is None:
+            record[key] = str(ids.next_id(kind))
+    return records
+
+
+def _client(record):
+    if record.get("uber_login"):
+        record["login"] = record.pop("uber_login")
+    record.setdefault("contact_id", "0")
+    return record
+
+
+def _coupon(record):
+    if not isinstance(record.get("coupon"), dict):
+        record = {"coupon": record}
+    if record["coupon"].get("coupon_code") is None:
+        raise BulkLoadError("Coupon without a coupon_code")
+    record["coupon"]["coupon_code"] = str(record["coupon"]["coupon_code"])
+    return record
+
+
+def _acl_resource(record):
+    if not record.get("name"):
+        raise BulkLoadError("ACL resource without a name")
+    resource_id = record.get("resource_id")
+    return {
+        "resource_id": None if resource_id is None else str(resource_id),
+        "name": record["name"],
+        "parent_id": str(record.get("parent_id") or "0"),
+        "lft": str(record.get("lft", "0")),
+        "rgt": str(record.get("rgt", "0")),
+        "active": str(record.get("active", "1")),
+        "label": record.get("label", ""),
+        "actions": record.get("actions") or dict(_DEFAULT_ACL_ACTIONS),
+        "children": {}
+    }
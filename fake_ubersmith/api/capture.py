@@ -0,0 +1,74 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Capture of the calls served, for fake-ubersmith-replay to re-issue them.
+
+Each call is a line of JSON: its arrival ``t`` in seconds since the capture
+started, its ``namespace``, either its ``method`` and ``params`` or the
+``batch`` it was, then its ``duration`` in seconds, HTTP ``status`` and
+``response``.  Request threads only queue the calls; a background thread
+encodes and writes them.
+"""
+import json
+import queue
+import threading
+import time
+
+
+class TrafficCapture:
+    """Streams the calls served to the file at ``path``, which it truncates."""
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.perf_counter()
+        self._file = open(path, 'w', encoding='utf-8')
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._write, name='capture', daemon=True)
+        self._thread.start()
+
+    def record_call(self, namespace, method, params, start, resp):
+        self._queue.put((start, time.perf_counter(), namespace, "method", method, params, resp))
+
+    def record_batch(self, namespace, calls, stop_on_error, start, resp):
+        batch = {"calls": calls, "stop_on_error": stop_on_error}
+        self._queue.put((start, time.perf_counter(), namespace, "batch", batch, None, resp))
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _write(self):
+        while True:
+            call = self._queue.get()
+            if call is None:
+                break
+            self._file.write(self._encode(*call))
+            if self._queue.empty():
+                self._file.flush()
+        self._file.close()
+
+    def _encode(self, start, end, namespace, kind, value, params, resp):
+        line = {"t": round(start - self.started, 6), "namespace": namespace, kind: value}
+        if params is not None:
+            line["params"] = params
+        line["duration"] = round(end - start, 6)
+        line["status"] = 500 if resp is None else resp.status_code
+        # Responses are already encoded as single line JSON, spliced in as is
+        body = resp.get_data(as_text=True) if resp is not None and resp.is_json else "null"
+        return '{}, "response": {}}}\n'.format(json.dumps(line)[:-1], body)
+
+
+def form_params(data):
+    """Returns the parameters of a form, with lists for the repeated ones."""
+    return {key: values[0] if len(values) == 1 else values for key, values in data.lists()}
@@ -0,0 +1,253 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Per-method latency and error injection.
+
+Faults are set with hidden methods, their target being a method name or
+``*`` for every method without faults of its own:
+
+    hidden.set_latency       target_method, distribution and its parameters,
+                             in milliseconds:
+                               fixed      ms
+                               uniform    min_ms, max_ms
+                               normal     mean_ms, stddev_ms
+                               histogram  buckets, as upper_bound_ms:weight
+                                          pairs, e.g. "10:90,100:9,1000:1"
+                             and optionally slowdown_ms added per request in
+                             flight beyond slowdown_after (default 1)
+    hidden.set_error_rate    target_method, rate (0 to 1), code, message
+    hidden.clear_faults      target_method, or every fault when omitted
+    hidden.list_faults
+
+Delays are slept in the thread serving the call.  When that thread comes
+from a fixed pool, e.g. the waitress one, delayed calls hold the others
+back once they take all of it, which is warned about.
+"""
+import bisect
+import random
+import threading
+from itertools import accumulate
+
+from fake_ubersmith.api.base import Base
+from fake_ubersmith.api.ubersmith import FakeUbersmithError
+from fake_ubersmith.api.utils.response import response
+
+ANY_METHOD = '*'
+
+
+class Faults(Base):
+    def __init__(self, rng=None, worker_threads=None):
+        super().__init__()
+
+        self.rng = rng or random.Random()
+        self.worker_threads = worker_threads
+        self.latencies = {}
+        self.errors = {}
+        self.entity = None
+        self._lock = threading.Lock()
+
+    def hook_to(self, entity):
+        self.entity = entity
+        entity.register_delay_hook(self.delay_for)
+        entity.register_error_hook(self.error_for)
+
+        entity.register_endpoints(
+            ubersmith_method='hidden.set_latency',
+            function=self.set_latency
+        )
+        entity.register_endpoints(
+            ubersmith_method='hidden.set_error_rate',
+            function=self.set_error_rate
+        )
+        entity.register_endpoints(
+            ubersmith_method='hidden.clear_faults',
+            function=self.clear_faults
+        )
+        entity.register_endpoints(
+            ubersmith_method='hidden.list_faults',
+            function=self.list_faults
+        )
+
+    def set_latency(self, form_data):
+        target_method = form_data.get('target_method', ANY_METHOD)
+        try:
+            latency = Latency.from_form(form_data)
+        except (KeyError, ValueError) as e:
+            return response(error_code=1, message="Invalid latency: {}".format(_describe(e)))
+
+        self.logger.info("Injecting %s latency in %s", latency.distribution, target_method)
+        if self.worker_threads is not None:
+            self.logger.warning(
+                "Each call delayed in %s holds one of the %s worker threads, other calls waiting once they are "
+                "all delayed; use --server asgi for delays that never hold the other calls back",
+                target_method, self.worker_threads
+            )
+        with self._lock:
+            self.latencies[target_method] = latency
+        return response(data=latency.to_dict())
+
+    def set_error_rate(self, form_data):
+        target_method = form_data.get('target_method', ANY_METHOD)
+        try:
+            rate = float(form_data.get('rate', 1))
+            code = int(form_data.get('code', 1))
+        except ValueError as e:
+            return response(error_code=1, message="Invalid error rate: {}".format(_describe(e)))
+        if not 0 <= rate <= 1:
+            return response(error_code=1, message="Invalid error rate: rate must be between 0 and 1")
+
+        error = ErrorRate(rate, code, form_data.get('message', "Injected error"))
+        self.logger.info("Injecting error %s in %s of the calls to %s", code, rate, target_method)
+        with self._lock:
+            self.errors[target_method] = error
+        return response(data=error.to_dict())
+
+    def clear_faults(self, form_data):
+        target_method = form_data.get('target_method')
+        with self._lock:
+            if target_method is None:
+                self.latencies.clear()
+                self.errors.clear()
+            else:
+                self.latencies.pop(target_method, None)
+                self.errors.pop(target_method, None)
+        return response(data="Faults cleared")
+
+    def list_faults(self, form_data):
+        with self._lock:
+            return response(data={
+                "latencies": {method: latency.to_dict() for method, latency in self.latencies.items()},
+                "errors": {method: error.to_dict() for method, error in self.errors.items()},
+            })
+
+    def delay_for(self, method):
+        latency = _rule_for(self.latencies, method)
+        if latency is None:
+            return 0
+        in_flight = self.entity.in_flight.value if self.entity is not None else 1
+        return latency.sample(self.rng, in_flight)
+
+    def error_for(self, method):
+        error = _rule_for(self.errors, method)
+        if error is None or self.rng.random() >= error.rate:
+            return None
+        return FakeUbersmithError(code=error.code, message=error.message)
+
+
+class Latency:
+    DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'histogram')
+
+    def __init__(self, distribution, parameters, slowdown_ms=0.0, slowdown_after=1):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError("distribution must be one of {}".format(", ".join(self.DISTRIBUTIONS)))
+        self.distribution = distribution
+        self.parameters = parameters
+        self.slowdown_ms = slowdown_ms
+        self.slowdown_after = slowdown_after
+
+        if distribution == 'histogram':
+            bounds, weights = zip(*parameters['buckets'])
+            self._lower_bounds = (0.0,) + bounds[:-1]
+            self._upper_bounds = bounds
+            self._cumulative_weights = list(accumulate(weights))
+
+    @classmethod
+    def from_form(cls, form_data):
+        distribution = form_data.get('distribution', 'fixed')
+        if distribution == 'fixed':
+            parameters = {'ms': _milliseconds(form_data, 'ms')}
+        elif distribution == 'uniform':
+            parameters = {'min_ms': _milliseconds(form_data, 'min_ms'), 'max_ms': _milliseconds(form_data, 'max_ms')}
+            if parameters['min_ms'] > parameters['max_ms']:
+                raise ValueError("min_ms is greater than max_ms")
+        elif distribution == 'normal':
+            parameters = {
+                'mean_ms': _milliseconds(form_data, 'mean_ms'), 'stddev_ms': _milliseconds(form_data, 'stddev_ms')
+            }
+        elif distribution == 'histogram':
+            parameters = {'buckets': _buckets(form_data['buckets'])}
+        else:
+            parameters = {}
+
+        return cls(
+            distribution, parameters,
+            slowdown_ms=_milliseconds(form_data, 'slowdown_ms', default=0),
+            slowdown_after=int(form_data.get('slowdown_after', 1))
+        )
+
+    def sample(self, rng, in_flight=1):
+        """Returns a delay in seconds for a call made with ``in_flight`` requests being served."""
+        p = self.parameters
+        if self.distribution == 'fixed':
+            ms = p['ms']
+        elif self.distribution == 'uniform':
+            ms = rng.uniform(p['min_ms'], p['max_ms'])
+        elif self.distribution == 'normal':
+            ms = rng.normalvariate(p['mean_ms'], p['stddev_ms'])
+        else:
+            bucket = bisect.bisect(self._cumulative_weights, rng.random() * self._cumulative_weights[-1])
+            bucket = min(bucket, len(self._upper_bounds) - 1)
+            ms = rng.uniform(self._lower_bounds[bucket], self._upper_bounds[bucket])
+
+        ms += self.slowdown_ms * max(in_flight - self.slowdown_after, 0)
+        return max(ms, 0) / 1000.0
+
+    def to_dict(self):
+        return dict(
+            self.parameters, distribution=self.distribution,
+            slowdown_ms=self.slowdown_ms, slowdown_after=self.slowdown_after
+        )
+
+
+class ErrorRate:
+    def __init__(self, rate, code, message):
+        self.rate = rate
+        self.code = code
+        self.message = message
+
+    def to_dict(self):
+        return {"rate": self.rate, "code": self.code, "message": self.message}
+
+
+def _rule_for(rules, method):
+    if method.startswith('hidden.'):
+        return None
+    rule = rules.get(method)
+    return rules.get(ANY_METHOD) if rule is None else rule
+
+
+def _milliseconds(form_data, key, default=None):
+    if key not in form_data and default is not None:
+        return float(default)
+    value = float(form_data[key])
+    if value < 0:
+        raise ValueError("{} must not be negative".format(key))
+    return value
+
+
+def _buckets(buckets):
+    parsed = []
+    for bucket in buckets.split(','):
+        upper_bound, _, weight = bucket.partition(':')
+        parsed.append((float(upper_bound), float(weight or 1)))
+    parsed.sort()
+    if not parsed or parsed[0][0] < 0 or any(weight < 0 for _, weight in parsed) \
+            or sum(weight for _, weight in parsed) <= 0:
+        raise ValueError("buckets must be upper_bound_ms:weight pairs with positive weights")
+    return parsed
+
+
+def _describe(error):
+    if isinstance(error, KeyError):
+        return "missing parameter {}".format(error)
+    return str(error)
@@ -12,10 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
+
 from fake_ubersmith.api.base import Base
 from fake_ubersmith.api.ubersmith import FakeUbersmithError
+from fake_ubersmith.api.utils.logs import Payload
+from fake_ubersmith.api.utils.paging import Page, PagingError
 from fake_ubersmith.api.utils.response import response
-from fake_ubersmith.api.utils.utils import a_random_id
 
 
 class Client(Base):
@@ -44,7 +47,8 @@ class Client(Base):
         )
         entity.register_endpoints(
             ubersmith_method='client.get',
-            function=self.client_get
+            function=self.client_get,
+            reads=("clients",)
         )
         entity.register_endpoints(
             ubersmith_method='client.add',
@@ -60,7 +64,8 @@ class Client(Base):
         )
         entity.register_endpoints(
             ubersmith_method='client.contact_get',
-            function=self.contact_get
+            function=self.contact_get,
+            reads=("clients", "contacts")
         )
         entity.register_endpoints(
             ubersmith_method='client.contact_list',
@@ -85,9 +90,9 @@ class Client(Base):
         )
 
     def client_add(self, form_data):
-        client_id = str(a_random_id())
+        client_id = str(self.data_store.ids.next_id("clients"))
 
-        client_data = form_data.copy()
+        client_data = form_data.to_dict()
         client_data["clientid"] = client_id
         client_data["contact_id"] = str(0)
 
@@ -95,30 +100,34 @@ class Client(Base):
             client_data["login"] = client_data.get("uber_login")
             del client_data["uber_login"]
 
-        self.logger.info("Adding client data: {}".format(client_data))
-
-        self.data_store.clients.append(client_data)
-        self.contact_add(
-            dict(
-                client_id=client_id,
-                description="Primary Contact",
-                login="so_much_invalid_username",
-                password="so_much_invalid_password"
+        self.logger.info("Adding client data: %s", Payload(client_data))
+
+        with self.data_store.writing("clients", "contacts"):
+            self.data_store.insert("clients", client_data)
+            self._add_contact(
+                dict(
+                    client_id=client_id,
+                    description="Primary Contact",
+                    login="so_much_invalid_username",
+                    password="so_much_invalid_password"
+                )
             )
-        )
 
         return response(data=client_id)
 
     def client_update(self, form_data):
         client_id = form_data.get("client_id")
 
-        client = next(iter(filter(lambda e: e["clientid"] == client_id, self.data_store.clients)))
-        self.logger.info("Updating client {} with {}".format(client["clientid"], form_data))
+        with self.data_store.writing("clients"):
+            client = self.data_store.lookup("clients", "clientid", client_id)
+            self.logger.info("Updating client %s with %s", client["clientid"], Payload(form_data))
 
-        self._update_if_present(client, "first", form_data, "first")
-        self._update_if_present(client, "last", form_data, "last")
-        self._update_if_present(client, "email", form_data, "email")
-        self._update_if_present(client, "login", form_data, "uber_login")
+            changes = {}
+            self._update_if_present(changes, "first", form_data, "first")
+            self._update_if_present(changes, "last", form_data, "last")
+            self._update_if_present(changes, "email", form_data, "email")
+            self._update_if_present(changes, "login", form_data, "uber_login")
+            self.data_store.update("clients", client, changes)
 
         client_metadata = {k: v for k, v in form_data.items() if k.startswith('meta_')}
         if len(client_metadata) >= 1:
@@ -128,7 +137,8 @@ class Client(Base):
 
     def client_get(self, form_data):
         client_id = form_data.get("client_id") or form_data.get("user_login")
-        client = self._client_get(client_id)
+        with self.data_store.reading("clients"):
+            client = self._client_get(client_id)
         if client is not None:
             client.pop("contact_id")
             if "uber_pass" in client:
@@ -136,32 +146,35 @@ class Client(Base):
             if form_data.get("acls") == "1":
                 client["acls"] = []
 
-            self.logger.info("client data being returned {}".format(client))
+            self.logger.info("client data being returned %s", Payload(client))
             return response(data=client)
         else:
-            self.logger.info("Can't find client ID - {}".format(client_id))
+            self.logger.info("Can't find client ID - %s", client_id)
             return response(
                 error_code=1,
                 message="Client ID '{}' not found.".format(client_id)
             )
 
     def _client_get(self, client_id):
-        client = next((
-            _format_client_get(client.copy()) for client in self.data_store.clients if client["clientid"] == client_id
-        ), None)
+        client = self.data_store.lookup("clients", "clientid", client_id)
 
-        return client
+        return _format_client_get(client.copy()) if client is not None else None
 
     def contact_add(self, form_data):
-        contact_id = str(a_random_id())
+        with self.data_store.writing("contacts"):
+            contact_id = self._add_contact(form_data.to_dict())
+
+        return response(data=contact_id)
+
+    def _add_contact(self, contact_data):
+        contact_id = str(self.data_store.ids.next_id("contacts"))
 
-        contact_data = form_data.copy()
         contact_data["contact_id"] = contact_id
-        self.data_store.contacts.append(contact_data)
+        self.data_store.insert("contacts", contact_data)
 
-        self.logger.info("Contact info added: {}".format(contact_data))
+        self.logger.info("Contact info added: %s", Payload(contact_data))
 
-        return response(data=contact_id)
+        return contact_id
 
     def contact_get(self, form_data):
         if "user_login" in form_data:
@@ -179,10 +192,15 @@ class Client(Base):
         return response(error_code=1, message="No contact ID specified")
 
     def contact_list(self, form_data):
+        try:
+            page = Page.from_form(form_data)
+        except PagingError as e:
+            return response(error_code=1, message=str(e))
+
         if "client_id" in form_data:
             self.logger.info("Retrieving contact list by client_id")
             return self._get_all_contacts_response(
-                "client_id", 'client_id', form_data['client_id']
+                "client_id", 'client_id', form_data['client_id'], page
             )
 
         self.logger.error("No valid client_id specified")
@@ -191,26 +209,29 @@ class Client(Base):
     def contact_update(self, form_data):
         contact_id = form_data.get("contact_id")
 
-        contact = self._get_contact_from_id(contact_id)
-        self.logger.info("Updating contact {} with {}".format(contact["contact_id"], form_data))
+        with self.data_store.writing("contacts"):
+            contact = self._get_contact_from_id(contact_id)
+            self.logger.info("Updating contact %s with %s", contact["contact_id"], Payload(form_data))
 
-        self._update_if_present(contact, "real_name", form_data, "real_name")
-        self._update_if_present(contact, "description", form_data, "description")
-        self._update_if_present(contact, "phone", form_data, "phone")
-        self._update_if_present(contact, "email", form_data, "email")
-        self._update_if_present(contact, "login", form_data, "login")
-        self._update_if_present(contact, "password", form_data, "password")
+            changes = {}
+            self._update_if_present(changes, "real_name", form_data, "real_name")
+            self._update_if_present(changes, "description", form_data, "description")
+            self._update_if_present(changes, "phone", form_data, "phone")
+            self._update_if_present(changes, "email", form_data, "email")
+            self._update_if_present(changes, "login", form_data, "login")
+            self._update_if_present(changes, "password", form_data, "password")
+            self.data_store.update("contacts", contact, changes)
 
         return response(data=True)
 
     def contact_permission_list(self, form_data):
         contact_id = form_data.get("contact_id")
         resource_name = form_data.get("resource_name")
-        contact = self._get_contact_from_id(contact_id)
+        self.logger.info("Gathering permission list for contact_id : %s", contact_id)
 
-        self.logger.info("Gathering permission list for contact_id : {}".format(contact_id))
-
-        return response(data=contact.get(resource_name, default_permissions))
+        with self.data_store.reading("contacts"):
+            contact = self._get_contact_from_id(contact_id)
+            return response(data=contact.get(resource_name, default_permissions))
 
     def contact_permission_set(self, form_data):
         contact_id = form_data.get("contact_id")
@@ -220,27 +241,30 @@ class Client(Base):
 
         effective = dict(read=0, create=0, update=0, delete=0)
 
-        contact = self._get_contact_from_id(contact_id)
-
-        if not contact.get(resource_name):
-            contact[resource_name] = {
-                "123": {
-                    "resource_id": "123",
-                    "name": resource_name,
-                    "parent_id": "",
-                    "lft": "",
-                    "rgt": "",
-                    "active": "1",
-                    "label": "Manage Contacts",
-                    "actions": ["2", "1", "3", "4"],
-                    "action": [],
-                    "effective": effective
+        with self.data_store.writing("contacts"):
+            contact = self._get_contact_from_id(contact_id)
+            permissions = copy.deepcopy(contact.get(resource_name))
+
+            if not permissions:
+                permissions = {
+                    "123": {
+                        "resource_id": "123",
+                        "name": resource_name,
+                        "parent_id": "",
+                        "lft": "",
+                        "rgt": "",
+                        "active": "1",
+                        "label": "Manage Contacts",
+                        "actions": ["2", "1", "3", "4"],
+                        "action": [],
+                        "effective": effective
+                    }
                 }
-            }
-        else:
-            effective.update(contact[resource_name]['123'].get('effective'))
+            else:
+                effective.update(permissions['123'].get('effective'))
 
-        contact[resource_name]['123']['effective'][action] = 1 if type == "allow" else False
+            permissions['123']['effective'][action] = 1 if type == "allow" else False
+            self.data_store.update("contacts", contact, {resource_name: permissions})
 
         return response(data='')
 
@@ -263,27 +287,28 @@ class Client(Base):
     def client_cc_info(self, form_data):
         # returns no error if providing parameters, only an empty list
         if "billing_info_id" in form_data:
-            return response(
-                data={
-                    cc["billing_info_id"]: cc
-                    for cc in self.data_store.credit_cards
-                    if cc["billing_info_id"] == form_data["billing_info_id"]
-                }
-            )
+            lookup_key, matcher_value = "billing_info_id", form_data["billing_info_id"]
         elif "client_id" in form_data:
-            return response(
-                data={
-                    cc["billing_info_id"]: cc
-                    for cc in self.data_store.credit_cards
-                    if cc["clientid"] == form_data["client_id"]
-                }
-            )
+            lookup_key, matcher_value = "clientid", form_data["client_id"]
         else:
             return response(
                 error_code=1,
                 message="request failed: client_id parameter not supplied"
             )
 
+        try:
+            page = Page.from_form(form_data)
+        except PagingError as e:
+            return response(error_code=1, message=str(e))
+
+        with self.data_store.reading("credit_cards"):
+            return response(
+                data=page.apply(
+                    (cc["billing_info_id"], cc)
+                    for cc in self.data_store.lookup_all("credit_cards", lookup_key, matcher_value)
+                )
+            )
+
     def client_cc_delete(self, form_data):
         if isinstance(self.credit_card_delete_response, FakeUbersmithError):
             return response(
@@ -296,40 +321,37 @@ class Client(Base):
         client_id = form_data.get("client_id")
         metadata_name = form_data.get("variable")
 
-        self.logger.info("Gathering metadata {} for client: {}".format(metadata_name, client_id))
-
-        client_metadata = self.data_store.metadatas.get(client_id)
-        if client_metadata is None:
-            return response(data="0")
+        self.logger.info("Gathering metadata %s for client: %s", metadata_name, client_id)
 
-        metadata = client_metadata.get(metadata_name)
+        with self.data_store.reading("metadatas"):
+            metadata = self.data_store.get_item("metadatas", client_id, {}).get(metadata_name)
         if metadata is None:
             return response(data="0")
 
         return response(data=metadata)
 
     def _get_contact_from_id(self, contact_id):
-        return next(iter(filter(lambda e: e["contact_id"] == contact_id, self.data_store.contacts)))
+        return self.data_store.lookup("contacts", "contact_id", contact_id)
 
-    def _get_all_contacts_response(self, lookup_key, matcher_key, matcher_value):
-        contacts = {
-            contact['contact_id']: contact
-            for contact in self.data_store.contacts
-            if contact[lookup_key] == matcher_value
-        }
+    def _get_all_contacts_response(self, lookup_key, matcher_key, matcher_value, page):
+        with self.data_store.reading("contacts"):
+            contacts = self.data_store.lookup_all("contacts", lookup_key, matcher_value)
+            if not contacts:
+                return response(error_code=1, message="Invalid {} specified.".format(matcher_key))
 
-        return response(data=contacts) if contacts else response(
-            error_code=1, message="Invalid {} specified.".format(matcher_key)
-        )
+            return response(data=page.apply((contact['contact_id'], contact) for contact in contacts))
 
     def _get_contact_response(self, lookup_key, matcher_key, matcher_value):
-        contact = next((contact for contact in self.data_store.contacts if contact[lookup_key] == matcher_value), None)
-        if contact:
-            client = self._client_get(contact["client_id"])
+        with self.data_store.reading("clients", "contacts"):
+            contact = self.data_store.lookup("contacts", lookup_key, matcher_value)
+            if contact:
+                client = self._client_get(contact["client_id"])
+                contact = _format_contact_get(contact, client)
 
-            self.logger.info("Getting contact info: {} for client {}".format(contact, client))
+        if contact:
+            self.logger.info("Getting contact info: %s for client %s", Payload(contact), Payload(client))
 
-            return response(data=_format_contact_get(contact, client))
+            return response(data=contact)
         else:
             return response(
                 error_code=1, message="Invalid {} specified.".format(matcher_key)
@@ -341,16 +363,17 @@ class Client(Base):
         except KeyError:
             return
 
-        self.logger.debug("Setting {} to {}".format(target_key, value))
+        self.logger.debug("Setting %s to %s", target_key, Payload(value))
         target[target_key] = value
 
     def _update_client_metadata(self, client_id, client_metadata):
-        if client_id not in self.data_store.metadatas:
-            self.data_store.metadatas[client_id] = {}
+        with self.data_store.writing("metadatas"):
+            metadata = dict(self.data_store.get_item("metadatas", client_id, {}))
 
-        [self._update_if_present(self.data_store.metadatas[client_id], metadata_name.replace('meta_', ''),
-                                 client_metadata, metadata_name) for
-         metadata_name in client_metadata.keys()]
+            [self._update_if_present(metadata, metadata_name.replace('meta_', ''),
+                                     client_metadata, metadata_name) for
+             metadata_name in client_metadata.keys()]
+            self.data_store.set_item("metadatas", client_id, metadata)
 
 
 def _format_contact_get(contact, client):
@@ -13,6 +13,7 @@
 # limitations under the License.
 from fake_ubersmith.api.base import Base
 from fake_ubersmith.api.ubersmith import FakeUbersmithError
+from fake_ubersmith.api.utils.logs import Payload
 from fake_ubersmith.api.utils.response import response
 
 
@@ -43,15 +44,12 @@ class Order(Base):
         )
 
     def coupon_get(self, form_data):
-        coupon = next(
-            (
-                cf for cf in self.data_store.coupons
-                if cf["coupon"]["coupon_code"] == form_data["coupon_code"]
-            ),
-            None
-        )
+        with self.data_store.reading("coupons"):
+            coupon = self.data_store.lookup(
+                "coupons", "coupon_code", form_data["coupon_code"]
+            )
         if coupon is not None:
-            self.logger.info("Retrieved coupon data: {}".format(coupon))
+            self.logger.info("Retrieved coupon data: %s", Payload(coupon))
             return response(data=coupon)
         else:
             self.logger.info("Getting coupon info failed")
@@ -60,37 +58,40 @@ class Order(Base):
             )
 
     def create_order(self, form_data):
-        order = self.data_store.order.get(form_data['order_queue_id'])
+        with self.data_store.reading("order"):
+            order = self.data_store.get_item("order", form_data['order_queue_id'])
         if isinstance(order, FakeUbersmithError):
             self.logger.info("Creating order failed")
             return response(
                 error_code=order.code, message=order.message
             )
-        self.logger.info("Creating order: {}".format(order))
+        self.logger.info("Creating order: %s", Payload(order))
         return response(data=order)
 
     def order_respond(self, form_data):
         data = 8
-        self.logger.info("order response: {}".format(data))
+        self.logger.info("order response: %s", data)
         return response(data=data)
 
     def submit_order(self, form_data):
-        order_submit = self.data_store.order_submit.get(form_data['order_id'])
+        with self.data_store.reading("order_submit"):
+            order_submit = self.data_store.get_item("order_submit", form_data['order_id'])
 
         if isinstance(order_submit, FakeUbersmithError):
             self.logger.error("Order submitted failed.")
             return response(
                 error_code=order_submit.code, message=order_submit.message
             )
-        self.logger.info("Order submitted info: {}".format(order_submit))
+        self.logger.info("Order submitted info: %s", Payload(order_submit))
         return response(data=order_submit)
 
     def cancel_order(self, form_data):
-        order_cancel = self.data_store.order_cancel.get(form_data['order_id'])
+        with self.data_store.reading("order_cancel"):
+            order_cancel = self.data_store.get_item("order_cancel", form_data['order_id'])
         if isinstance(order_cancel, FakeUbersmithError):
             self.logger.error("Cancel order failed.")
             return response(
                 error_code=order_cancel.code, message=order_cancel.message
             )
-        self.logger.info("Cancelling order info: {}".format(order_cancel))
+        self.logger.info("Cancelling order info: %s", Payload(order_cancel))
         return response(data=order_cancel)
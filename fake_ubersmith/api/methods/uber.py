@@ -13,7 +13,9 @@
 # limitations under the License.
 from fake_ubersmith.api.base import Base
 from fake_ubersmith.api.ubersmith import FakeUbersmithError
-from fake_ubersmith.api.utils.response import response
+from fake_ubersmith.api.utils.logs import Payload
+from fake_ubersmith.api.utils.paging import Page, PagingError
+from fake_ubersmith.api.utils.response import encode, encoded_response, payload, response
 
 
 class Uber(Base):
@@ -24,11 +26,14 @@ class Uber(Base):
     def hook_to(self, entity):
         entity.register_endpoints(
             ubersmith_method='uber.service_plan_get',
-            function=self.service_plan_get
+            function=self.service_plan_get,
+            reads=("service_plans",),
+            varies=self._service_plan_error_state
         )
         entity.register_endpoints(
             ubersmith_method='uber.service_plan_list',
-            function=self.service_plan_list
+            function=self.service_plan_list,
+            reads=("service_plans_list",)
         )
         entity.register_endpoints(
             ubersmith_method='uber.check_login',
@@ -44,15 +49,17 @@ class Uber(Base):
         )
         entity.register_endpoints(
             ubersmith_method='uber.acl_resource_list',
-            function=self.acl_resource_list
+            function=self.acl_resource_list,
+            reads=("acl_resources",)
         )
 
     def check_login(self, form_data):
-        data = self._get_login_info(form_data['login'], form_data['pass'])
+        with self.data_store.reading("clients", "contacts"):
+            data = self._get_login_info(form_data['login'], form_data['pass'])
 
         if data:
 
-            self.logger.info("Login successful. Client info: {}".format(data))
+            self.logger.info("Login successful. Client info: %s", Payload(data))
             return response(data=data)
 
         self.logger.error("Login failed")
@@ -69,16 +76,13 @@ class Uber(Base):
                 message=self.service_plan_error.message
             )
 
-        service_plan = next(
-            (
-                plan for plan in self.data_store.service_plans
-                if plan["plan_id"] == form_data["plan_id"]
-            ),
-            None
-        )
+        with self.data_store.reading("service_plans"):
+            service_plan = self.data_store.lookup(
+                "service_plans", "plan_id", form_data["plan_id"]
+            )
 
         if service_plan is not None:
-            self.logger.info("Service plan found: {}".format(service_plan))
+            self.logger.info("Service plan found: %s", Payload(service_plan))
             return response(data=service_plan)
         else:
             self.logger.error("Service plan not found.")
@@ -87,21 +91,35 @@ class Uber(Base):
                 message="No Service Plan found"
             )
 
+    def _service_plan_error_state(self):
+        error = self.service_plan_error
+        if not isinstance(error, FakeUbersmithError):
+            return None
+        return error.code, error.message
+
     def service_plan_list(self, form_data):
+        try:
+            page = Page.from_form(form_data)
+        except PagingError as e:
+            return response(error_code=1, message=str(e))
+
         if 'code' in form_data:
             plan_code = form_data['code']
-            self.logger.info("Getting service plans for code: {}".format(
-                plan_code
-            ))
-            return response(
-                data={
-                    plan['plan_id']: plan
-                    for plan in self.data_store.service_plans_list.values()
-                    if plan['code'] == plan_code
-                }
-            )
+            self.logger.info("Getting service plans for code: %s", plan_code)
+            with self.data_store.reading("service_plans_list"):
+                return response(
+                    data=page.apply(
+                        (plan['plan_id'], plan)
+                        for plan in self.data_store.items("service_plans_list").values()
+                        if plan['code'] == plan_code
+                    )
+                )
         self.logger.info("Plan not found by code. Listing all plans")
-        return response(data=self.data_store.service_plans_list)
+        with self.data_store.reading("service_plans_list"):
+            service_plans = self.data_store.items("service_plans_list")
+            if service_plans is None or page.everything:
+                return response(data=service_plans)
+            return response(data=page.apply(service_plans.items()))
 
     def acl_admin_role_get(self, form_data):
         user_id = form_data.get('userid')
@@ -113,31 +131,28 @@ class Uber(Base):
                 message="role_id parameter not specified"
             )
 
-        if user_id:
-            self.logger.info(user_id)
-            self.logger.info(self.data_store.user_mapping)
-            self.logger.info(self.data_store.roles)
-            self.logger.info(self.data_store.user_mapping.get(user_id, {}))
-            role_ids = self.data_store.user_mapping.get(user_id, {}).get(
-                'roles'
-            )
+        with self.data_store.reading("roles", "user_mapping"):
+            if user_id:
+                role_ids = self.data_store.get_item("user_mapping", user_id, {}).get(
+                    'roles'
+                )
 
-            self.logger.info(role_ids)
+                self.logger.info("Roles of user %s: %s", user_id, Payload(role_ids))
 
-            if not role_ids:
-                return response(error_code=1, message="No User Roles found")
+                if not role_ids:
+                    return response(error_code=1, message="No User Roles found")
 
-            return response(data={
-                role_id: self.data_store.roles.get(role_id)
-                for role_id in role_ids
-            })
+                return response(data={
+                    role_id: self.data_store.get_item("roles", role_id)
+                    for role_id in role_ids
+                })
 
-        role_data = self.data_store.roles.get(role_id)
+            role_data = self.data_store.get_item("roles", role_id)
 
-        if not role_data:
-            return response(error_code=1, message="No User Roles found")
+            if not role_data:
+                return response(error_code=1, message="No User Roles found")
 
-        return response(data=role_data)
+            return response(data=role_data)
 
     def acl_resource_add(self, form_data):
         parent_resource_name = form_data.get('parent_resource_name', '')
@@ -145,38 +160,56 @@ class Uber(Base):
         label = form_data.get('label', '')
         actions = form_data.get('actions', 'create,read,update,delete')
 
-        self.logger.info("Adding role {}; {}; {}; {}".format(parent_resource_name, resource_name, label, actions))
-
-        if not parent_resource_name:
-            parent_resource_id = "0"
-            target_resource_dict = self.data_store.acl_resources
-        else:
-            parent_resource = self._find_acl_parent(self.data_store.acl_resources, parent_resource_name)
-
-            if parent_resource is None:
-                return response(error_code=1, message="Resource [{}] not found".format(parent_resource_name))
-
-            parent_resource_id = parent_resource["resource_id"]
-            target_resource_dict = parent_resource["children"]
+        self.logger.info("Adding role %s; %s; %s; %s", parent_resource_name, resource_name, label, actions)
+
+        with self.data_store.writing("acl_resources"):
+            if not parent_resource_name:
+                parent_resource_id = "0"
+            else:
+                parent_resource = self.data_store.acl_tree().find(parent_resource_name)
+
+                if parent_resource is None:
+                    return response(error_code=1, message="Resource [{}] not found".format(parent_resource_name))
+
+                parent_resource_id = parent_resource["resource_id"]
+
+            self.data_store.add_acl_resource({
+                "resource_id": None,
+                "name": resource_name,
+                "parent_id": parent_resource_id,
+                "lft": "0",
+                "rgt": "0",
+                "active": "1",
+                "label": label,
+                "actions": self._to_acl_actions(actions),
+                "children": {}
+            })
 
-        self.data_store.acl_resources_inc_id += 1
+        return response(data="")
 
-        target_resource_dict[str(self.data_store.acl_resources_inc_id)] = {
-            "resource_id": str(self.data_store.acl_resources_inc_id),
-            "name": resource_name,
-            "parent_id": parent_resource_id,
-            "lft": "0",
-            "rgt": "0",
-            "active": "1",
-            "label": label,
-            "actions": self._to_acl_actions(actions),
-            "children": {}
-        }
+    def acl_resource_list(self, form_data):
+        try:
+            page = Page.from_form(form_data)
+        except PagingError as e:
+            return response(error_code=1, message=str(e))
+
+        with self.data_store.reading("acl_resources"):
+            resources = self.data_store.acl_tree()
+            if page.everything:
+                return encoded_response(
+                    resources.cached("acl_resource_list", lambda: encode(payload(data=resources)))
+                )
 
-        return response(data="")
+            def project(resource):
+                projected = page.project(resource)
+                if "children" in projected:
+                    projected["children"] = {
+                        resource_id: project(child) for resource_id, child in resource["children"].items()
+                    }
+                return projected
 
-    def acl_resource_list(self, _):
-        return response(data=self.data_store.acl_resources)
+            # Pages are made of root resources, each with its whole subtree
+            return response(data=page.apply(resources.items(), project=project if page.fields else None))
 
     def _get_login_info(self, username, password):
         def _build_payload(id, client_id, contact_id, login, full_name, email, type):
@@ -193,27 +226,11 @@ class Uber(Base):
                 'password_timeout': '0',
             }
 
-        def _get_contact():
-            return next(
-                (
-                    _build_payload(
-                        id="{}-{}".format(c["client_id"], c["contact_id"]),
-                        client_id=c["client_id"],
-                        contact_id=c["contact_id"],
-                        login=c["login"],
-                        full_name=c.get("real_name", ""),
-                        email=c.get("email") or "@",
-                        type="contact"
-                    )
-                    for c in self.data_store.contacts
-                    if c['login'] == username and c['password'] == password
-                ),
-                None
-            )
-
-        return next(
-            (
-                _build_payload(
+        # Clients and contacts are indexed by login, so only the few records
+        # sharing the login are compared, and contacts only when no client matched.
+        for c in self.data_store.lookup_all("clients", "login", username):
+            if c.get('uber_pass') == password:
+                return _build_payload(
                     id=c['clientid'],
                     client_id=c['clientid'],
                     contact_id=0,
@@ -222,20 +239,18 @@ class Uber(Base):
                     email=c.get("email", ""),
                     type="client"
                 )
-                for c in self.data_store.clients
-                if c['login'] == username and c['uber_pass'] == password
-            ),
-            _get_contact()
-        )
 
-    def _find_acl_parent(self, resources, name):
-        for resource in resources.values():
-            if resource["name"] == name:
-                return resource
-
-            in_children = self._find_acl_parent(resource["children"], name)
-            if in_children:
-                return in_children
+        for c in self.data_store.lookup_all("contacts", "login", username):
+            if c.get('password') == password:
+                return _build_payload(
+                    id="{}-{}".format(c["client_id"], c["contact_id"]),
+                    client_id=c["client_id"],
+                    contact_id=c["contact_id"],
+                    login=c["login"],
+                    full_name=c.get("real_name", ""),
+                    email=c.get("email") or "@",
+                    type="contact"
+                )
 
         return None
 
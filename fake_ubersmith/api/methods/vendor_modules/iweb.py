@@ -17,7 +17,8 @@ import collections
 
 from fake_ubersmith.api.base import Base
 from fake_ubersmith.api.utils.response import response
-from fake_ubersmith.api.utils.utils import a_random_id
+
+MAX_EVENTS_PER_PAGE = 1000
 
 
 class IWeb(Base):
@@ -29,6 +30,10 @@ class IWeb(Base):
             ubersmith_method='iweb.log_event',
             function=self.log_event
         )
+        entity.register_endpoints(
+            ubersmith_method='iweb.event_log_list',
+            function=self.event_log_list
+        )
         entity.register_endpoints(
             ubersmith_method='iweb.acl_admin_role_add',
             function=self.acl_admin_role_add
@@ -39,17 +44,27 @@ class IWeb(Base):
         )
 
     def log_event(self, form_data):
-        self.data_store.event_log.append(form_data.to_dict())
+        with self.data_store.writing("event_log"):
+            self.data_store.append_event(form_data.to_dict())
         return response(data="1")
 
-    def acl_admin_role_add(self, form_data):
-        if self._does_role_name_exist(form_data.get('name')):
-            return response(
-                error_code=1,
-                message="The specified Role Name is already in use"
-            )
+    def event_log_list(self, form_data):
+        try:
+            cursor = int(form_data.get('cursor', 0))
+            limit = min(int(form_data.get('limit', 100)), MAX_EVENTS_PER_PAGE)
+        except ValueError:
+            return response(error_code=1, message="Invalid cursor or limit specified")
 
-        role_id = str(a_random_id())
+        with self.data_store.reading("event_log"):
+            events, next_cursor, first_cursor = self.data_store.read_events(cursor, max(limit, 0))
+            return response(data={
+                "events": events,
+                "next_cursor": next_cursor,
+                "first_cursor": first_cursor
+            })
+
+    def acl_admin_role_add(self, form_data):
+        role_id = str(self.data_store.ids.next_id("roles"))
         role_data = {}
         acls = collections.defaultdict(dict)
         for key, value in form_data.to_dict().items():
@@ -58,26 +73,35 @@ class IWeb(Base):
                 acls[rule][level] = value
             else:
                 role_data[key] = value
-        role_data.update({'role_id': role_id, 'acls': acls})
+        role_data.update({'role_id': role_id, 'acls': dict(acls)})
+
+        with self.data_store.writing("roles"):
+            if self._does_role_name_exist(form_data.get('name')):
+                return response(
+                    error_code=1,
+                    message="The specified Role Name is already in use"
+                )
 
-        self.data_store.roles[role_id] = role_data
+            self.data_store.set_item("roles", role_id, role_data)
         return response(data=role_id)
 
     def _does_role_name_exist(self, role_name):
         return any(
             role_name == data['name']
-            for _, data in self.data_store.roles.items()
+            for data in self.data_store.items("roles").values()
         )
 
     def user_role_assign(self, form_data):
         user_id = form_data.get('user_id')
         role_id = str(form_data.get('role_id'))
-        roles = self.data_store.user_mapping.get(user_id, {}).get('roles', {})
-        if role_id in roles:
-            return response(
-                error_code=1,
-                message="Can't assign role with id '{}' "
-                        "to user with id '{}'".format(role_id, user_id)
-            )
-        self.data_store.user_mapping[user_id]['roles'].add(role_id)
+        with self.data_store.writing("user_mapping"):
+            mapping = self.data_store.get_item("user_mapping", user_id, {})
+            roles = mapping.get('roles', set())
+            if role_id in roles:
+                return response(
+                    error_code=1,
+                    message="Can't assign role with id '{}' "
+                            "to user with id '{}'".format(role_id, user_id)
+                )
+            self.data_store.set_item("user_mapping", user_id, dict(mapping, roles=roles | {role_id}))
         return response(data=1)
@@ -0,0 +1,128 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import bisect
+import threading
+from collections import defaultdict
+
+from flask import make_response
+
+from fake_ubersmith.api.base import Base
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+SUCCESS = "success"
+ERROR = "error"
+EXCEPTION = "exception"
+
+
+class Metrics(Base):
+    """Per-method request metrics exposed in the Prometheus text format.
+
+    Recording a call takes a single lock and a few dict updates; everything
+    else is computed when /metrics is scraped.
+    """
+
+    def __init__(self, data_store, namespaces=None):
+        super().__init__(data_store)
+        self.namespaces = namespaces
+
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._latency_buckets = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+        self._latency_sums = defaultdict(float)
+        self._in_flight = defaultdict(int)
+
+    def hook_to(self, server):
+        self.app = server
+        self.app.add_url_rule('/metrics', view_func=self.expose)
+
+    def start(self, method):
+        with self._lock:
+            self._in_flight[method] += 1
+
+    def observe(self, method, outcome, code, seconds):
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            self._in_flight[method] -= 1
+            self._requests[(method, outcome, code)] += 1
+            self._latency_buckets[method][bucket] += 1
+            self._latency_sums[method] += seconds
+
+    def expose(self):
+        return make_response((
+            self.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+        ))
+
+    def render(self):
+        with self._lock:
+            requests = dict(self._requests)
+            buckets = {method: list(counts) for method, counts in self._latency_buckets.items()}
+            sums = dict(self._latency_sums)
+            in_flight = dict(self._in_flight)
+
+        lines = [
+            "# HELP fake_ubersmith_requests_total Ubersmith method calls by outcome.",
+            "# TYPE fake_ubersmith_requests_total counter",
+        ]
+        for (method, outcome, code), count in sorted(requests.items()):
+            lines.append('fake_ubersmith_requests_total{{method="{}",outcome="{}",code="{}"}} {}'.format(
+                _escape(method), outcome, _escape(code), count
+            ))
+
+        lines += [
+            "# HELP fake_ubersmith_request_duration_seconds Ubersmith method call latency.",
+            "# TYPE fake_ubersmith_request_duration_seconds histogram",
+        ]
+        for method, counts in sorted(buckets.items()):
+            cumulative = 0
+            for upper_bound, count in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append('fake_ubersmith_request_duration_seconds_bucket{{method="{}",le="{}"}} {}'.format(
+                    _escape(method), upper_bound, cumulative
+                ))
+            lines.append('fake_ubersmith_request_duration_seconds_sum{{method="{}"}} {}'.format(
+                _escape(method), sums[method]
+            ))
+            lines.append('fake_ubersmith_request_duration_seconds_count{{method="{}"}} {}'.format(
+                _escape(method), cumulative
+            ))
+
+        lines += [
+            "# HELP fake_ubersmith_requests_in_flight Ubersmith method calls being processed.",
+            "# TYPE fake_ubersmith_requests_in_flight gauge",
+        ]
+        for method, count in sorted(in_flight.items()):
+            lines.append('fake_ubersmith_requests_in_flight{{method="{}"}} {}'.format(_escape(method), count))
+
+        namespaces = self.namespaces.apis() if self.namespaces is not None else []
+        lines += [
+            "# HELP fake_ubersmith_namespaces Namespaces created besides the default one.",
+            "# TYPE fake_ubersmith_namespaces gauge",
+            "fake_ubersmith_namespaces {}".format(len(namespaces)),
+            "# HELP fake_ubersmith_store_records Records held by each data store collection, by namespace.",
+            "# TYPE fake_ubersmith_store_records gauge",
+        ]
+        for collection, size in sorted(self.data_store.collection_sizes().items()):
+            lines.append('fake_ubersmith_store_records{{collection="{}"}} {}'.format(collection, size))
+        for name, api in namespaces:
+            for collection, size in sorted(api.data_store.collection_sizes().items()):
+                lines.append('fake_ubersmith_store_records{{namespace="{}",collection="{}"}} {}'.format(
+                    _escape(name), collection, size
+                ))
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,82 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import re
+import threading
+
+from flask import request
+
+HEADER = 'X-Fake-Ubersmith-Namespace'
+URL_PREFIX = '/ns/<namespace>'
+
+# Names are also file and directory names: no leading dot, for . and .. not
+# to name the directory of another namespace
+_VALID_NAME = re.compile(r'(?!\.)[A-Za-z0-9_.-]{1,128}')
+
+
+class InvalidNamespace(ValueError):
+    pass
+
+
+class Namespaces:
+    """Isolated Ubersmith APIs, created on first use of their name.
+
+    Each namespace is built by ``factory(name)`` and so has its own data
+    store, crash mode and fault settings.  Requests without a namespace go
+    to ``default``.  A dropped namespace is handed to ``release(api)``, its
+    name being free for a new one.
+    """
+
+    def __init__(self, factory, default, release=None):
+        self.factory = factory
+        self.default = default
+        self.release = release
+        self._apis = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        if not name:
+            return self.default
+
+        api = self._apis.get(name)
+        if api is None:
+            if not _VALID_NAME.fullmatch(name):
+                raise InvalidNamespace("Invalid namespace '{}'".format(name))
+            with self._lock:
+                api = self._apis.get(name)
+                if api is None:
+                    api = self._apis[name] = self.factory(name)
+        return api
+
+    def drop(self, name):
+        with self._lock:
+            api = self._apis.pop(name, None)
+        if api is None:
+            raise InvalidNamespace("Unknown namespace '{}'".format(name))
+        if self.release is not None:
+            self.release(api)
+
+    def names(self):
+        return sorted(self._apis)
+
+    def apis(self):
+        """Returns the (name, api) of the namespaces created, by name."""
+        with self._lock:
+            return sorted(self._apis.items(), key=lambda item: item[0])
+
+
+def requested_data_store(namespaces, default, namespace=None):
+    """Returns the data store of the namespace the current request is for."""
+    if namespaces is None:
+        return default
+    return namespaces.get(namespace or request.headers.get(HEADER)).data_store
@@ -0,0 +1,84 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Method modules, discovered from entry points and imported on first use.
+
+A method module is a Base subclass hooking the methods of an Ubersmith
+module, named after the prefix of those methods: the ``client`` module
+serves the ``client.*`` methods.  Modules other than the built-in ones are
+declared in the ``fake_ubersmith.methods`` entry point group:
+
+    [entry_points]
+    fake_ubersmith.methods =
+        acme = acme_ubersmith.methods:Acme
+"""
+from importlib import import_module
+
+GROUP = 'fake_ubersmith.methods'
+
+BUILTIN_MODULES = {
+    'client': 'fake_ubersmith.api.methods.client:Client',
+    'iweb': 'fake_ubersmith.api.methods.vendor_modules.iweb:IWeb',
+    'order': 'fake_ubersmith.api.methods.order:Order',
+    'uber': 'fake_ubersmith.api.methods.uber:Uber',
+}
+
+
+class UnknownModule(ValueError):
+    pass
+
+
+class MethodModule:
+    """A method module given as ``package.module:Class``, imported on ``load()``."""
+
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+
+    def load(self):
+        module_name, _, class_name = self.target.partition(':')
+        return getattr(import_module(module_name), class_name)
+
+    def __repr__(self):
+        return 'MethodModule({!r}, {!r})'.format(self.name, self.target)
+
+
+def discover():
+    """Returns the method modules by name, installed ones overriding built-ins."""
+    modules = {name: MethodModule(name, target) for name, target in BUILTIN_MODULES.items()}
+    for entry_point in _entry_points(GROUP):
+        modules[entry_point.name] = MethodModule(entry_point.name, entry_point.value)
+    return modules
+
+
+def select(modules, names):
+    """Returns the ``modules`` named in ``names``, all of them when it is None."""
+    if names is None:
+        return modules
+    unknown = sorted(set(names) - set(modules))
+    if unknown:
+        raise UnknownModule("Unknown method module(s) {}, available modules are {}".format(
+            ', '.join(unknown), ', '.join(sorted(modules))
+        ))
+    return {name: modules[name] for name in names}
+
+
+def _entry_points(group):
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:  # Python < 3.8
+        return []
+    found = entry_points()
+    if hasattr(found, 'select'):
+        return found.select(group=group)
+    return found.get(group, [])
@@ -0,0 +1,94 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Cache of the responses of the methods only reading the data store.
+
+A method registered with the collections it ``reads`` has its encoded
+responses kept by parameters, along with the versions of these
+collections, and served again for as long as none of them is written.
+Each cached response carries an ETag, for a caller sending it back in
+If-None-Match to be answered 304 Not Modified, without a body.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import make_response
+from werkzeug.http import generate_etag, parse_etags
+
+from fake_ubersmith.api.utils.concurrency import AtomicCounter
+from fake_ubersmith.api.utils.response import encoded_response
+
+DEFAULT_SIZE = 10000
+
+_Entry = namedtuple('_Entry', 'versions body error_code etag')
+
+
+class ResponseCache:
+    """Keeps up to ``size`` responses, the least recently served being dropped first."""
+
+    def __init__(self, data_store, size=DEFAULT_SIZE):
+        self.data_store = data_store
+        self.size = size
+        self.hits = AtomicCounter()
+        self.misses = AtomicCounter()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def call(self, method, collections, function, data, varies=None):
+        """Returns the response of ``function(data)``, cached until one of ``collections`` is written.
+
+        Responses are cached by parameters and, when given, by what ``varies()`` returns.
+        """
+        key = (
+            method, tuple(sorted((name, tuple(values)) for name, values in data.lists())),
+            None if varies is None else varies()
+        )
+        # Taken before calling the method: a write racing with the call may
+        # leave its response under outdated versions, never the reverse.
+        versions = self.data_store.versions(*collections)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.versions == versions:
+                self._entries.move_to_end(key)
+            else:
+                entry = None
+
+        if entry is not None:
+            self.hits.increment()
+            resp = encoded_response(entry.body, entry.error_code)
+            resp.set_etag(entry.etag)
+            return resp
+
+        self.misses.increment()
+        resp = function(data)
+        if resp.status_code == 200:
+            body = resp.get_data()
+            entry = _Entry(versions, body, getattr(resp, 'ubersmith_error_code', None), generate_etag(body))
+            resp.set_etag(entry.etag)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return resp
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def not_modified(resp, if_none_match):
+    """Returns a 304 response when ``if_none_match`` holds the ETag of ``resp``, ``resp`` otherwise."""
+    etag, _ = resp.get_etag()
+    if etag is None or not if_none_match or not parse_etags(if_none_match).contains(etag):
+        return resp
+    return make_response(('', 304, {'ETag': resp.headers['ETag']}))
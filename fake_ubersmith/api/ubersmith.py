@@ -1,22 +1,35 @@
-from flask import request
+import threading
+import time
+from contextlib import contextmanager
 
+from flask import make_response, request
+from werkzeug.datastructures import MultiDict
+
+from fake_ubersmith.api import namespaces
 from fake_ubersmith.api.base import Base
+from fake_ubersmith.api.capture import form_params
+from fake_ubersmith.api.metrics import ERROR, EXCEPTION, SUCCESS
+from fake_ubersmith.api.response_cache import not_modified
+from fake_ubersmith.api.utils.concurrency import AtomicCounter
+from fake_ubersmith.api.utils.logs import Payload
 from fake_ubersmith.api.utils.response import response
 
 
 class UbersmithBase(Base):
-    def __init__(self, data_store):
+    def __init__(self, data_store, metrics=None):
         super().__init__(data_store)
 
         self.crash_mode = False
-
-    def hook_to(self, server):
-        self.app = server
-        self.app.add_url_rule(
-            '/api/2.0/',
-            view_func=self._route_method,
-            methods=["POST"]
-        )
+        self.metrics = metrics
+        self.capture = None
+        self.response_cache = None
+        self.cacheable = {}
+        self.delay_hooks = []
+        self.error_hooks = []
+        self.in_flight = AtomicCounter()
+        self.namespaces = None
+        self.lazy_modules = {}
+        self._loading = threading.Lock()
 
         self.register_endpoints(
             ubersmith_method='hidden.enable_crash_mode',
@@ -26,6 +39,54 @@ class UbersmithBase(Base):
             ubersmith_method='hidden.disable_crash_mode',
             function=self.disable_crash_mode
         )
+        self.register_endpoints(
+            ubersmith_method='hidden.flush',
+            function=self.flush
+        )
+
+    def hook_to(self, server):
+        self.app = server
+        prefixes = [''] if self.namespaces is None else ['', namespaces.URL_PREFIX]
+        for prefix in prefixes:
+            self.app.add_url_rule(
+                prefix + '/api/2.0/',
+                view_func=self._route_method,
+                methods=["POST"]
+            )
+            self.app.add_url_rule(
+                prefix + '/api/2.0/batch',
+                view_func=self._route_batch,
+                methods=["POST"]
+            )
+        if self.namespaces is not None:
+            self.app.add_url_rule(
+                namespaces.URL_PREFIX,
+                view_func=self._drop_namespace,
+                methods=["DELETE"]
+            )
+
+    def serve_namespaces(self, factory, release=None):
+        """Routes requests naming a namespace to the API ``factory(name)`` builds.
+
+        A namespace is named by the X-Fake-Ubersmith-Namespace header or an
+        /ns/<namespace> URL prefix; other requests are served by this API.
+        ``DELETE /ns/<namespace>`` drops one, handing its API to
+        ``release(api)``.
+        """
+        self.namespaces = namespaces.Namespaces(factory, default=self, release=release)
+
+    def api_for(self, namespace):
+        if self.namespaces is None:
+            return self
+        return self.namespaces.get(namespace)
+
+    def _drop_namespace(self, namespace):
+        try:
+            self.namespaces.drop(namespace)
+        except namespaces.InvalidNamespace as e:
+            return response(error_code=1, message=str(e))
+        self.logger.info("Namespace %s dropped", namespace)
+        return response(data="Namespace dropped")
 
     def enable_crash_mode(self, form_data):
         self.logger.info("Enabling crash-mode")
@@ -37,34 +98,242 @@ class UbersmithBase(Base):
         self.crash_mode = False
         return response(data="Crash Mode Disabled")
 
-    def register_endpoints(self, ubersmith_method, function):
+    def flush(self, form_data):
+        self.logger.info("Flushing the data store")
+        self.data_store.flush()
+        return response(data="Data store flushed")
+
+    def register_endpoints(self, ubersmith_method, function, reads=None, varies=None):
+        """Serves ``ubersmith_method`` with ``function(form_data)``.
+
+        A method only reading the data store names the collections it
+        ``reads``, for its responses to be cached when ``response_cache`` is
+        set.  When they also depend on state kept outside the store,
+        ``varies()`` returns it, hashable, to be part of the cache key.
+        """
         self.methods[ubersmith_method] = function
+        if reads:
+            self.cacheable[ubersmith_method] = (tuple(reads), varies)
+
+    def register_lazy_module(self, name, loader):
+        """Defers hooking the ``name.*`` methods until one of them is called.
+
+        ``loader()`` returns the Base subclass serving them, which is then
+        built with the data store of this API and hooked to it.
+        """
+        self.lazy_modules[name] = loader
+
+    def has_method(self, method):
+        return method in self.methods or self._load_module_of(method)
+
+    def _load_module_of(self, method):
+        name = method.partition('.')[0] if isinstance(method, str) else None
+        if name not in self.lazy_modules:
+            return False
+        with self._loading:
+            loader = self.lazy_modules.get(name)
+            if loader is not None:
+                loader()(self.data_store).hook_to(self)
+                # Only forgotten once hooked, for concurrent callers not to
+                # see the module neither pending nor loaded
+                del self.lazy_modules[name]
+        return method in self.methods
+
+    def register_delay_hook(self, hook):
+        """Adds a function returning the seconds a call to a method must wait.
+
+        The wait happens before the call is dispatched, in a way that suits
+        the front-end: the WSGI one sleeps, the ASGI one awaits.
+        """
+        self.delay_hooks.append(hook)
+
+    def delay_for(self, method):
+        return sum(hook(method) or 0 for hook in self.delay_hooks)
+
+    def register_error_hook(self, hook):
+        """Adds a function returning the FakeUbersmithError a call must fail with.
+
+        The first error returned is sent back instead of calling the method.
+        """
+        self.error_hooks.append(hook)
+
+    @contextmanager
+    def serving(self):
+        """Counts a request in ``in_flight`` for as long as it is served."""
+        self.in_flight.increment()
+        try:
+            yield
+        finally:
+            self.in_flight.decrement()
 
     def _should_crash(self, method):
-        return method not in [
-            'hidden.enable_crash_mode',
-            'hidden.disable_crash_mode'
-        ] and self.crash_mode
+        return not method.startswith('hidden.') and self.crash_mode
+
+    def _route_method(self, namespace=None):
+        namespace = namespace or request.headers.get(namespaces.HEADER)
+        try:
+            api = self.api_for(namespace)
+        except namespaces.InvalidNamespace as e:
+            return response(error_code=1, message=str(e))
 
-    def _route_method(self):
         data = request.form.copy()
         method = data.pop("method")
+        capture = self.capture
+        params = None if capture is None else form_params(data)
 
-        self.logger.info(
-            "Will call method '{}' with params '{}'".format(method, data)
-        )
+        with api.serving():
+            start = time.perf_counter()
+            resp = None
+            try:
+                _sleep(api.delay_for(method))
+                resp = api.dispatch(method, data, start=start)
+                return not_modified(resp, request.headers.get('If-None-Match'))
+            finally:
+                if capture is not None:
+                    capture.record_call(namespace, method, params, start, resp)
+
+    def _route_batch(self, namespace=None):
+        namespace = namespace or request.headers.get(namespaces.HEADER)
+        try:
+            api = self.api_for(namespace)
+        except namespaces.InvalidNamespace as e:
+            return response(error_code=1, message=str(e))
+
+        calls, stop_on_error = self.parse_batch(request.get_json(force=True, silent=True))
+        if calls is None:
+            return response(error_code=1, message="Expected a JSON list of calls")
+
+        results = []
+        with api.serving():
+            batch_start = time.perf_counter()
+            for call in calls:
+                start = time.perf_counter()
+                _sleep(api.batch_call_delay(call))
+                resp = api.batch_call(call, start=start)
+                results.append(resp.get_data())
+                if stop_on_error and getattr(resp, 'ubersmith_error_code', None):
+                    break
+
+        resp = batch_response(results)
+        if self.capture is not None:
+            self.capture.record_batch(namespace, calls, stop_on_error, batch_start, resp)
+        return resp
+
+    @staticmethod
+    def parse_batch(body):
+        """Returns the calls of a batch and whether to stop on the first error.
+
+        The body is either a JSON list of {"method": ..., "params": {...}}
+        calls or an object holding that list under "calls" along with an
+        optional "stop_on_error" flag.
+        """
+        if isinstance(body, list):
+            body = {"calls": body}
+        if not isinstance(body, dict) or not isinstance(body.get("calls"), list):
+            return None, False
+        return body["calls"], bool(body.get("stop_on_error", False))
+
+    def batch_call_delay(self, call):
+        method = _batch_call_method(call)
+        return self.delay_for(method) if self.has_method(method) else 0
+
+    def batch_call(self, call, start=None):
+        if not isinstance(call, dict) or not isinstance(call.get("params", {}), dict):
+            return response(error_code=1, message="Invalid call, expected {\"method\": ..., \"params\": {...}}")
+
+        method = _batch_call_method(call)
+        if not self.has_method(method):
+            return response(error_code=1, message="Unknown method '{}'".format(method))
+
+        try:
+            return self.dispatch(method, _to_form_data(call.get("params", {})), start=start)
+        except FakeUbersmithError as e:
+            return response(error_code=e.code or 500, message=e.message)
+        except Exception as e:
+            return response(error_code=500, message="{}: {}".format(type(e).__name__, e))
+
+    def dispatch(self, method, data, start=None):
+        """Calls a method, recording it in the metrics when enabled.
+
+        ``start`` is when the call was received, so that the latency
+        recorded includes any injected delay.
+        """
+        self.logger.info("Will call method '%s' with params '%s'", method, Payload(data))
 
+        if self.metrics is None:
+            return self._call(method, data)
+
+        self.metrics.start(method)
+        start = time.perf_counter() if start is None else start
+        outcome, code = EXCEPTION, ""
+        try:
+            resp = self._call(method, data)
+            error_code = getattr(resp, 'ubersmith_error_code', None)
+            outcome, code = (ERROR, error_code) if error_code else (SUCCESS, "")
+            return resp
+        except Exception as e:
+            code = type(e).__name__
+            raise
+        finally:
+            self.metrics.observe(method, outcome, code, time.perf_counter() - start)
+
+    def _call(self, method, data):
         if self._should_crash(method):
             self.logger.info("Will raise because crash-mode is enable")
             raise FakeUbersmithError(message="Crash mode was enabled")
 
+        for hook in self.error_hooks:
+            error = hook(method)
+            if error is not None:
+                self.logger.info("Injecting error %s in %s", error.code, method)
+                return response(error_code=error.code, message=error.message)
+
+        function = self.methods.get(method)
+        if function is None:
+            self._load_module_of(method)
+            function = self.methods[method]
+
         try:
-            return self.methods[method](data)
+            cacheable = self.cacheable.get(method)
+            if cacheable is not None and self.response_cache is not None:
+                reads, varies = cacheable
+                return self.response_cache.call(method, reads, function, data, varies=varies)
+            return function(data)
         except Exception:
             self.logger.debug("Endpoint raised error", exc_info=True)
             raise
 
 
+def batch_response(results):
+    """Joins the encoded results of batch calls in a JSON list."""
+    return make_response((
+        b'[' + b','.join(results) + b']', 200, {'Content-Type': 'application/json'}
+    ))
+
+
+def _batch_call_method(call):
+    method = call.get("method") if isinstance(call, dict) else None
+    return method if isinstance(method, str) else None
+
+
+def _sleep(seconds):
+    if seconds > 0:
+        time.sleep(seconds)
+
+
+def _to_form_data(params):
+    # Handlers expect the strings a form-encoded request would have carried
+    data = MultiDict()
+    for key, values in params.items():
+        for value in values if isinstance(values, list) else [values]:
+            if isinstance(value, bool):
+                value = "1" if value else "0"
+            elif value is None:
+                value = ""
+            data.add(key, value if isinstance(value, str) else str(value))
+    return data
+
+
 class FakeUbersmithError(Exception):
     def __init__(self, code=None, message=None):
         self.code = code
@@ -0,0 +1,82 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """Shared for readers, exclusive for writers.
+
+    Waiting writers block new readers so writes can't be starved.  The lock
+    is not reentrant: a thread must not acquire it again while holding it.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def reading(self):
+        with self._condition:
+            while self._writing or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def writing(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class AtomicCounter:
+    def __init__(self, value=0):
+        self._lock = threading.Lock()
+        self._value = value
+
+    @property
+    def value(self):
+        return self._value
+
+    def increment(self):
+        with self._lock:
+            self._value += 1
+            return self._value
+
+    def decrement(self):
+        with self._lock:
+            self._value -= 1
+            return self._value
+
+    def advance_to(self, value):
+        with self._lock:
+            self._value = max(self._value, value)
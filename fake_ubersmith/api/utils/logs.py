@@ -0,0 +1,75 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import reprlib
+from itertools import islice
+
+DEFAULT_MAX_PAYLOAD_LENGTH = 1024
+
+
+class _BoundedRepr(reprlib.Repr):
+    def __init__(self):
+        super().__init__()
+        self.maxlevel = 4
+        self.maxdict = 32
+        self.maxlist = 32
+        self.maxstring = 256
+        self.maxother = 256
+        self.max_length = DEFAULT_MAX_PAYLOAD_LENGTH
+
+    def repr(self, x):
+        text = super().repr(x)
+        if len(text) > self.max_length:
+            return text[:self.max_length] + '...'
+        return text
+
+    def repr1(self, x, level):
+        # dict subclasses, like the MultiDict of form data, would otherwise
+        # be rendered through their full repr()
+        if isinstance(x, dict):
+            return self.repr_dict(x, level)
+        return super().repr1(x, level)
+
+    def repr_dict(self, x, level):
+        if not x:
+            return '{}'
+        if level <= 0:
+            return '{...}'
+        items = [
+            '{}: {}'.format(self.repr1(key, level - 1), self.repr1(value, level - 1))
+            for key, value in islice(x.items(), self.maxdict)
+        ]
+        if len(x) > self.maxdict:
+            items.append('...')
+        return '{' + ', '.join(items) + '}'
+
+
+_repr = _BoundedRepr()
+
+
+def set_max_payload_length(max_length):
+    _repr.max_length = max_length
+
+
+class Payload:
+    """Logging argument rendering a bounded representation of a value.
+
+    The value is only formatted if the record is emitted.
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __str__(self):
+        return _repr.repr(self.value)
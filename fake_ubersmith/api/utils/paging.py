@@ -0,0 +1,62 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from itertools import islice
+
+
+class PagingError(ValueError):
+    pass
+
+
+class Page:
+    """A slice of a listing, optionally trimmed to some fields of each record.
+
+    Listings are walked in insertion order, which new records never change,
+    so that walking them page by page misses nothing.
+    """
+
+    def __init__(self, offset=0, limit=None, fields=None):
+        self.offset = offset
+        self.limit = limit
+        self.fields = fields
+
+    @classmethod
+    def from_form(cls, form_data):
+        try:
+            offset = int(form_data.get('offset') or 0)
+            limit = form_data.get('limit')
+            limit = None if limit in (None, '') else int(limit)
+        except ValueError:
+            raise PagingError("offset and limit must be integers")
+        if offset < 0 or (limit is not None and limit < 0):
+            raise PagingError("offset and limit must not be negative")
+
+        fields = form_data.get('fields')
+        if fields:
+            fields = tuple(field.strip() for field in fields.split(',') if field.strip())
+        return cls(offset, limit, fields or None)
+
+    @property
+    def everything(self):
+        return self.offset == 0 and self.limit is None and self.fields is None
+
+    def apply(self, items, project=None):
+        """Returns a dict of the ``(key, record)`` items within the page."""
+        project = project or self.project
+        stop = None if self.limit is None else self.offset + self.limit
+        return {key: project(record) for key, record in islice(items, self.offset, stop)}
+
+    def project(self, record):
+        if self.fields is None:
+            return record
+        return {field: record[field] for field in self.fields if field in record}
@@ -13,26 +13,117 @@
 # limitations under the License.
 
 import json
+import re
+from collections.abc import Mapping
+from itertools import accumulate, repeat
 
 from flask import make_response
+from werkzeug.datastructures import MultiDict
+
+from fake_ubersmith.api.adapters.records import Record
+
+try:
+    import orjson
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_SUBCLASS
+except ImportError:
+    orjson = None
 
 
 def response(data="", error_code=None, message=""):
-    r = json.dumps({
+    return encoded_response(encode(payload(data, error_code, message)), error_code)
+
+
+def payload(data="", error_code=None, message=""):
+    return {
         "status": False if error_code else True,
         "error_code": error_code,
         "error_message": message,
-        "data": _phpize_empty_dict_to_arrays(data)
-    })
-    return make_response((r, 200, {'Content-Type': 'application/json'}))
-
-
-def _phpize_empty_dict_to_arrays(data):
-    if isinstance(data, dict):
-        if len(data) == 0:
-            return []
-        return {k: _phpize_empty_dict_to_arrays(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [_phpize_empty_dict_to_arrays(v) for v in data]
+        "data": data
+    }
+
+
+def encoded_response(body, error_code=None):
+    """Returns a response of an already encoded ``payload()``."""
+    resp = make_response((body, 200, {'Content-Type': 'application/json'}))
+    resp.ubersmith_error_code = error_code
+    return resp
+
+
+def encode(payload):
+    """Serializes to JSON, PHP style: empty dicts are rendered as arrays.
+
+    The payload is serialized as is by the C encoder (orjson when installed)
+    and every empty object of the output is then swapped for an empty array.
+    Neither encoder hands dicts to ``default``, so converting them while
+    encoding would take a walk of the whole payload in Python, which costs
+    more than this second pass: a substring test when there is no empty
+    object, a ``replace`` when none is quoted, and a scan of the string
+    literals only when one of them holds a "{}".
+    """
+    if orjson is not None:
+        body = orjson.dumps(payload, default=_to_builtin, option=_ORJSON_OPTIONS)
     else:
-        return data
+        body = json.dumps(payload, default=_to_builtin)
+    return _phpize_empty_objects(body)
+
+
+def _phpize_empty_objects(body):
+    tokens = _TOKENS[type(body)]
+    if tokens.empty_object not in body:
+        return body
+    if _is_in_a_string_literal(body, tokens.empty_object, tokens):
+        return tokens.empty_object_or_string.sub(_phpize, body)
+    return body.replace(tokens.empty_object, tokens.empty_array)
+
+
+def _is_in_a_string_literal(body, token, tokens):
+    # Once escape sequences are dropped, a token is within a string literal
+    # when an odd number of quotes precede it.
+    if tokens.backslash in body:
+        body = body.replace(tokens.escaped_backslash, tokens.nothing).replace(tokens.escaped_quote, tokens.nothing)
+    quotes_before_each_token = accumulate(map(type(body).count, body.split(token)[:-1], repeat(tokens.quote)))
+    return any(map((1).__and__, quotes_before_each_token))
+
+
+def _phpize(match):
+    token = match.group()
+    tokens = _TOKENS[type(token)]
+    return tokens.empty_array if token == tokens.empty_object else token
+
+
+def _to_builtin(value):
+    if type(value) is Record:
+        return value.to_dict()
+    # orjson reads dict subclasses storage directly, which for a MultiDict
+    # holds a list of values per key
+    if isinstance(value, MultiDict):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    for builtin in (str, int, float):
+        if isinstance(value, builtin):
+            return builtin(value)
+    raise TypeError("Object of type {} is not JSON serializable".format(type(value).__name__))
+
+
+class _Tokens:
+    def __init__(self, to_type):
+        self.empty_object = to_type("{}")
+        self.empty_array = to_type("[]")
+        self.quote = to_type('"')
+        self.backslash = to_type("\\")
+        self.escaped_backslash = to_type("\\\\")
+        self.escaped_quote = to_type('\\"')
+        self.nothing = to_type("")
+        # string literals are matched whole, leaving the "{}" they contain
+        self.empty_object_or_string = re.compile(to_type(r'"[^"\\]*(?:\\.[^"\\]*)*"|\{\}'))
+
+
+_TOKENS = {
+    str: _Tokens(str),
+    bytes: _Tokens(str.encode)
+}
@@ -0,0 +1,144 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+
+_WHITESPACE = ' \t\r\n'
+_NUMBER_CHARACTERS = '0123456789+-.eE'
+
+
+class StreamFormatError(ValueError):
+    pass
+
+
+def iter_records(stream, chunk_size=CHUNK_SIZE, max_record_size=MAX_RECORD_SIZE):
+    """Yields the records of a JSON array or of NDJSON read from a stream.
+
+    The stream is consumed chunk by chunk so only the record being parsed
+    is held in memory, whatever the size of the whole document.
+    """
+    chunks = iter(lambda: stream.read(chunk_size), b'')
+    decoder = codecs.getincrementaldecoder('utf-8')()
+
+    buffer = ''
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        if buffer.lstrip(_WHITESPACE):
+            break
+
+    if buffer.lstrip(_WHITESPACE).startswith('['):
+        records = _iter_array(buffer, chunks, decoder, max_record_size)
+    else:
+        records = _iter_lines(buffer, chunks, decoder, max_record_size)
+    for record in records:
+        yield record
+
+
+def _iter_lines(buffer, chunks, decoder, max_record_size):
+    line_number = 0
+    while True:
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            line_number += 1
+            if line.strip(_WHITESPACE):
+                yield _loads(line, line_number)
+
+        if len(buffer) > max_record_size:
+            raise StreamFormatError("Line {} is longer than {} characters".format(line_number + 1, max_record_size))
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            break
+        buffer += decoder.decode(chunk)
+
+    buffer += decoder.decode(b'', final=True)
+    if buffer.strip(_WHITESPACE):
+        yield _loads(buffer, line_number + 1)
+
+
+def _iter_array(buffer, chunks, decoder, max_record_size):
+    json_decoder = json.JSONDecoder()
+    position = buffer.index('[') + 1
+    state = _FIRST_RECORD
+    exhausted = False
+
+    while True:
+        position = _skip_whitespace(buffer, position)
+        if position == len(buffer):
+            if exhausted:
+                raise StreamFormatError("Unterminated JSON array")
+            buffer, position, exhausted = _refill(buffer, position, chunks, decoder)
+            continue
+
+        char = buffer[position]
+        if char == ']' and state != _RECORD:
+            if buffer[position + 1:].strip(_WHITESPACE) or _has_more(chunks, decoder):
+                raise StreamFormatError("Unexpected data after the JSON array")
+            return
+
+        if state == _SEPARATOR:
+            if char != ',':
+                raise StreamFormatError("Expected ',' or ']' in the JSON array")
+            position += 1
+            state = _RECORD
+            continue
+
+        try:
+            record, end = json_decoder.raw_decode(buffer, position)
+        except ValueError:
+            end = None
+        # a number cut by the end of a chunk, "12." for instance, could continue
+        # in the next one
+        if end is None or not exhausted and buffer[end:].lstrip(_NUMBER_CHARACTERS) == '':
+            if exhausted:
+                raise StreamFormatError("Invalid JSON record in the JSON array")
+            if len(buffer) - position > max_record_size:
+                raise StreamFormatError("Record is longer than {} characters".format(max_record_size))
+            buffer, position, exhausted = _refill(buffer, position, chunks, decoder)
+            continue
+
+        yield record
+        position = end
+        state = _SEPARATOR
+
+
+_FIRST_RECORD, _RECORD, _SEPARATOR = range(3)
+
+
+def _refill(buffer, position, chunks, decoder):
+    chunk = next(chunks, None)
+    buffer = buffer[position:]
+    if chunk is None:
+        return buffer + decoder.decode(b'', final=True), 0, True
+    return buffer + decoder.decode(chunk), 0, False
+
+
+def _has_more(chunks, decoder):
+    return any(decoder.decode(chunk).strip(_WHITESPACE) for chunk in chunks)
+
+
+def _skip_whitespace(buffer, position):
+    while position < len(buffer) and buffer[position] in _WHITESPACE:
+        position += 1
+    return position
+
+
+def _loads(line, line_number):
+    try:
+        return json.loads(line)
+    except ValueError:
+        raise StreamFormatError("Invalid JSON on line {}".format(line_number))
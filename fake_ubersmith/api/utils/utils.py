@@ -1,5 +0,0 @@
-from random import randint
-
-
-def a_random_id():
-    return randint(100000, 999999)
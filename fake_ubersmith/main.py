@@ -12,61 +12,464 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import argparse
+import atexit
 import logging
+import os
+import queue
+import signal
+import socket
+import sys
+from logging.handlers import QueueHandler, QueueListener
 
 from flask.app import Flask
 
+from fake_ubersmith.api import plugins, response_cache
+from fake_ubersmith.api.adapters import event_log, ids
 from fake_ubersmith.api.adapters.data_store import DataStore
 from fake_ubersmith.api.administrative_local import AdministrativeLocal
-from fake_ubersmith.api.methods.client import Client
-from fake_ubersmith.api.methods.order import Order
-from fake_ubersmith.api.methods.uber import Uber
-from fake_ubersmith.api.methods.vendor_modules.iweb import IWeb
+from fake_ubersmith.api.administrative_store import AdministrativeStore
+from fake_ubersmith.api.bulk_load import BulkLoad, BulkLoadError
+from fake_ubersmith.api.capture import TrafficCapture
+from fake_ubersmith.api.faults import Faults
+from fake_ubersmith.api.metrics import Metrics
 from fake_ubersmith.api.ubersmith import UbersmithBase
+from fake_ubersmith.api.utils.logs import DEFAULT_MAX_PAYLOAD_LENGTH, set_max_payload_length
+from fake_ubersmith.api.utils.streaming import StreamFormatError
+
+ENVIRONMENT_PREFIX = 'FAKE_UBERSMITH_'
+_TRUE = ('1', 'true', 'yes', 'on')
+STORAGES = ('memory', 'sqlite')
 
 
 class HealthCheckFilter(logging.Filter):
 
     def filter(self, record):
-        return 'GET /status ' not in record.msg
+        return 'GET /status ' not in record.getMessage()
 
 
-def setup_logging():
+def setup_logging(level=logging.INFO, max_payload_length=DEFAULT_MAX_PAYLOAD_LENGTH):
     root_logger = logging.getLogger()
 
     handler = logging.StreamHandler()
     handler.setFormatter(logging.Formatter(
         '[%(asctime)s] %(levelname)s in %(module)s: %(message)s', "%Y-%m-%d %H:%M:%S")
     )
-    handler.addFilter(HealthCheckFilter())
 
-    root_logger.addHandler(handler)
-    root_logger.setLevel(logging.DEBUG)
+    # Records are written by the listener thread, off the request threads
+    log_queue = queue.Queue()
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(HealthCheckFilter())
+    listener = QueueListener(log_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root_logger.addHandler(queue_handler)
+    root_logger.setLevel(level)
+    set_max_payload_length(max_payload_length)
 
     root_logger.debug("LOGGING IS OPERATIONAL")
 
+    return listener
+
+
+def parse_args(argv=None, environ=None):
+    parser = argparse.ArgumentParser(
+        prog='fake-ubersmith',
+        epilog="Every option can also be set with a {}<OPTION> environment variable, e.g. {}PORT=9132 or "
+               "{}REUSE_PORT=1; the command line takes precedence.".format(*[ENVIRONMENT_PREFIX] * 3)
+    )
+    parser.add_argument(
+        '--host', default='0.0.0.0',
+        help="address to listen on"
+    )
+    parser.add_argument(
+        '--port', type=int, default=9131,
+        help="port to listen on"
+    )
+    parser.add_argument(
+        '--reuse-port', action='store_true',
+        help="listen with SO_REUSEPORT so that several servers can share the port, each one with its own data store"
+    )
+    parser.add_argument(
+        '--server', choices=('werkzeug', 'waitress', 'asgi'), default='werkzeug',
+        help="server to use; 'waitress' requires the waitress extra, 'asgi' serves the API on an "
+             "asyncio event loop and requires the asgi extra"
+    )
+    parser.add_argument(
+        '--threads', type=int, default=8,
+        help="number of worker threads (waitress only)"
+    )
+    parser.add_argument(
+        '--backlog', type=int, default=1024,
+        help="listen backlog of the server socket (waitress and asgi only)"
+    )
+    parser.add_argument(
+        '--keep-alive', type=int, default=120,
+        help="seconds an idle keep-alive connection is kept open (waitress and asgi only)"
+    )
+    parser.add_argument(
+        '--log-level', choices=('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'), default='INFO',
+        help="level of the root logger"
+    )
+    parser.add_argument(
+        '--log-payload-size', type=int, default=DEFAULT_MAX_PAYLOAD_LENGTH,
+        help="maximum number of characters of a payload written to the logs"
+    )
+    parser.add_argument(
+        '--metrics', action='store_true',
+        help="record per-method metrics and expose them on /metrics"
+    )
+    parser.add_argument(
+        '--response-cache', action='store_true',
+        help="cache the responses of the methods only reading the data store until it changes, with ETags"
+    )
+    parser.add_argument(
+        '--response-cache-size', type=int, default=response_cache.DEFAULT_SIZE,
+        help="number of responses kept in the cache of each namespace"
+    )
+    parser.add_argument(
+        '--fixtures', type=_fixtures, metavar='COLLECTION=PATH[,...]',
+        help="bulk load these NDJSON or JSON array files at startup, e.g. clients=clients.ndjson"
+    )
+    parser.add_argument(
+        '--snapshot', metavar='PATH',
+        help="load the data store from this snapshot file at startup, when it exists"
+    )
+    parser.add_argument(
+        '--save-snapshot', metavar='PATH',
+        help="write a snapshot of the data store to this file on exit"
+    )
+    parser.add_argument(
+        '--storage', choices=STORAGES, default='memory',
+        help="where the data store is kept: in 'memory', or in a 'sqlite' database that several server "
+             "processes can share"
+    )
+    parser.add_argument(
+        '--sqlite-path', metavar='PATH',
+        help="database of the sqlite storage; each namespace gets its own database next to it"
+    )
+    parser.add_argument(
+        '--capture', metavar='PATH',
+        help="write each call served to this NDJSON file, for fake-ubersmith-replay to re-issue them"
+    )
+    parser.add_argument(
+        '--journal', metavar='DIR',
+        help="journal the changes made to the memory storage in this directory, and restore them at startup"
+    )
+    parser.add_argument(
+        '--journal-fsync-interval', type=float, metavar='SECONDS',
+        help="how often journaled changes are synced to disk, at most as many being lost on a system crash"
+    )
+    parser.add_argument(
+        '--journal-compact-size', type=int, metavar='BYTES',
+        help="size of journaled changes past which they are compacted into a snapshot"
+    )
+    parser.add_argument(
+        '--event-log-size', type=int, default=event_log.DEFAULT_CAPACITY,
+        help="number of events logged with iweb.log_event kept in memory"
+    )
+    parser.add_argument(
+        '--event-log-spill-dir', metavar='DIR',
+        help="spill the events overflowing the event log to compressed segment files in this "
+             "directory instead of dropping them"
+    )
+    parser.add_argument(
+        '--id-strategy', choices=ids.STRATEGIES, default='random',
+        help="how ids of new records are allocated: 'random' looking 6 digit ids, 'sequential' ids or "
+             "'sharded' sequential ids, that never collide with the other shards"
+    )
+    parser.add_argument(
+        '--id-seed', type=int,
+        help="seed of the random ids, for them to be the same from one run to another"
+    )
+    parser.add_argument(
+        '--id-shard', type=_shard, metavar='INDEX/COUNT',
+        help="shard of the ids of this server, out of COUNT servers, for the sharded strategy"
+    )
+    parser.add_argument(
+        '--modules', type=_names, metavar='NAME[,NAME...]',
+        help="method modules to serve, all the installed ones by default; each module is imported on the "
+             "first call of one of its methods"
+    )
+    if environ is None:
+        environ = os.environ
+    args = parser.parse_args(_environment_args(parser, environ) + (sys.argv[1:] if argv is None else argv))
+    if args.id_strategy == 'sharded' and args.id_shard is None:
+        parser.error("--id-strategy sharded requires --id-shard")
+    if args.storage == 'sqlite' and args.sqlite_path is None:
+        parser.error("--storage sqlite requires --sqlite-path")
+    if args.storage == 'sqlite' and args.journal is not None:
+        parser.error("--journal only applies to the memory storage, the sqlite one being already durable")
+    if args.modules is not None:
+        try:
+            plugins.select(plugins.discover(), args.modules)
+        except plugins.UnknownModule as e:
+            parser.error(str(e))
+    return args
+
+
+def _environment_args(parser, environ):
+    # Variables are turned into arguments given before the command line
+    # ones, so that they are validated the same way and overridden by them.
+    args = []
+    for action in parser._actions:
+        options = [option for option in action.option_strings if option.startswith('--')]
+        value = environ.get(ENVIRONMENT_PREFIX + action.dest.upper())
+        if not options or action.dest == 'help' or value is None:
+            continue
+        if action.nargs == 0:
+            if value.strip().lower() in _TRUE:
+                args.append(options[0])
+        else:
+            args.append('{}={}'.format(options[0], value))
+    return args
+
+
+def _names(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def _fixtures(value):
+    fixtures = []
+    for fixture in _names(value):
+        collection, _, path = fixture.partition('=')
+        if not collection or not path:
+            raise argparse.ArgumentTypeError("fixtures must be given as COLLECTION=PATH, e.g. clients=clients.ndjson")
+        fixtures.append((collection.strip(), path.strip()))
+    return fixtures
 
-def run():
-    # TODO (wajdi) Make configurable passed parameter
-    port = 9131
 
+def _shard(value):
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("shard must be given as INDEX/COUNT, e.g. 0/4")
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError("shard index must be between 0 and COUNT - 1")
+    return index, count
+
+
+def reuse_port_socket(host, port, backlog):
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+        sock.listen(backlog)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def serve(app, host, port, args):
+    sock = reuse_port_socket(host, port, args.backlog) if args.reuse_port else None
+
+    if args.server == 'waitress':
+        try:
+            import waitress
+        except ImportError:
+            raise RuntimeError(
+                "The waitress server requires the 'waitress' package, "
+                "install it with 'pip install fake-ubersmith[waitress]'"
+            )
+
+        # Worker threads share the in-process data store, which is why no
+        # multi-process mode is offered.
+        listen = {'sockets': [sock]} if sock is not None else {'host': host, 'port': port}
+        waitress.serve(
+            app,
+            threads=args.threads,
+            backlog=args.backlog,
+            channel_timeout=args.keep_alive,
+            ident='fake-ubersmith',
+            **listen
+        )
+    elif args.server == 'asgi':
+        try:
+            import uvicorn
+        except ImportError:
+            raise RuntimeError(
+                "The asgi server requires the 'uvicorn' package, "
+                "install it with 'pip install fake-ubersmith[asgi]'"
+            )
+        # Only imported here, asyncio weighing on the startup of the other modes
+        from fake_ubersmith.api.asgi import AsgiApp
+
+        options = dict(
+            host=host,
+            port=port,
+            backlog=args.backlog,
+            timeout_keep_alive=args.keep_alive,
+            log_config=None,
+            access_log=False,
+            lifespan='on'
+        )
+        asgi_app = AsgiApp(app, app.extensions['ubersmith_base'])
+        if sock is not None:
+            uvicorn.Server(uvicorn.Config(asgi_app, **options)).run(sockets=[sock])
+        else:
+            uvicorn.run(asgi_app, **options)
+    elif sock is not None:
+        from werkzeug.serving import make_server
+
+        make_server(host, port, app, threaded=True, fd=sock.fileno()).serve_forever()
+    else:
+        app.run(host=host, port=port)
+
+
+def build_api(data_store, metrics=None, modules=None, response_cache_size=None, worker_threads=None):
+    base_uber_api = UbersmithBase(data_store, metrics=metrics)
+    if response_cache_size is not None:
+        base_uber_api.response_cache = response_cache.ResponseCache(data_store, size=response_cache_size)
+
+    if modules is None:
+        modules = plugins.discover()
+    for name, module in modules.items():
+        base_uber_api.register_lazy_module(name, module.load)
+    Faults(worker_threads=worker_threads).hook_to(base_uber_api)
+
+    return base_uber_api
+
+
+def create_app(with_metrics=False, snapshot_path=None, save_snapshot_path=None,
+               event_log_size=event_log.DEFAULT_CAPACITY, event_log_spill_dir=None,
+               id_strategy='random', id_seed=None, id_shard=None, modules=None, fixtures=(),
+               storage='memory', sqlite_path=None, journal_dir=None,
+               journal_fsync_interval=None, journal_compact_size=None, capture_path=None,
+               with_response_cache=False, response_cache_size=response_cache.DEFAULT_SIZE, worker_threads=None):
     app = Flask('fake_ubersmith')
+    modules = plugins.select(plugins.discover(), modules)
+
+    # The storage backends are only imported when used, sqlite3 and pickle
+    # weighing on the startup
+    def new_data_store(namespace=None):
+        allocator = ids.id_allocator(id_strategy, seed=id_seed, shard=id_shard)
+        if storage == 'sqlite':
+            from fake_ubersmith.api.adapters.sqlite_store import SqliteStore
+
+            return SqliteStore(namespace_path(sqlite_path, namespace), ids=allocator)
+        data_store = DataStore(
+            event_log_size=event_log_size,
+            event_log_spill_dir=event_log_spill_dir,
+            ids=allocator
+        )
+        if journal_dir is not None:
+            from fake_ubersmith.api.adapters.journal import Journal, JournaledStore
+
+            options = dict(fsync_interval=journal_fsync_interval, compact_size=journal_compact_size)
+            data_store = JournaledStore(data_store, Journal(
+                namespace_directory(journal_dir, namespace),
+                **{name: value for name, value in options.items() if value is not None}
+            ))
+            data_store.restore()
+        if journal_dir is not None or event_log_spill_dir is not None:
+            atexit.register(data_store.close)
+        return data_store
+
+    data_store = new_data_store()
+    # A restored journal already holds what was loaded at the first startup
+    restored = journal_dir is not None and storage != 'sqlite' and data_store.restored
+    if snapshot_path and os.path.exists(snapshot_path) and not restored:
+        from fake_ubersmith.api.adapters import snapshot
 
-    data_store = DataStore()
-    base_uber_api = UbersmithBase(data_store)
+        snapshot.load(data_store, snapshot_path)
+    if save_snapshot_path:
+        from fake_ubersmith.api.adapters import snapshot
+
+        atexit.register(snapshot.save, data_store, save_snapshot_path)
+
+    metrics = Metrics(data_store) if with_metrics else None
+    cache_size = response_cache_size if with_response_cache else None
+    base_uber_api = build_api(
+        data_store, metrics=metrics, modules=modules, response_cache_size=cache_size, worker_threads=worker_threads
+    )
+    base_uber_api.serve_namespaces(lambda name: build_api(
+        new_data_store(name), metrics=metrics, modules=modules, response_cache_size=cache_size,
+        worker_threads=worker_threads
+    ), release=release_namespace)
 
     AdministrativeLocal().hook_to(app)
+    AdministrativeStore(data_store, namespaces=base_uber_api.namespaces).hook_to(app)
+    bulk_load = BulkLoad(data_store, namespaces=base_uber_api.namespaces)
+    bulk_load.hook_to(app)
+    if not restored:
+        for collection, path in fixtures or ():
+            preload(bulk_load, collection, path)
+    if metrics is not None:
+        metrics.namespaces = base_uber_api.namespaces
+        metrics.hook_to(app)
 
-    Uber(data_store).hook_to(base_uber_api)
-    Order(data_store).hook_to(base_uber_api)
-    Client(data_store).hook_to(base_uber_api)
-    IWeb(data_store).hook_to(base_uber_api)
+    if capture_path:
+        base_uber_api.capture = TrafficCapture(capture_path)
+        atexit.register(base_uber_api.capture.close)
 
     base_uber_api.hook_to(app)
+    app.extensions['ubersmith_base'] = base_uber_api
+
+    return app
+
+
+def release_namespace(api):
+    # Flushed first, for a namespace used again not to restore its journal
+    # or database
+    api.data_store.flush()
+    atexit.unregister(api.data_store.close)
+    api.data_store.close()
+
+
+def namespace_path(path, namespace):
+    """Returns the database path of a namespace, next to the one of the default namespace."""
+    if namespace is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return "{}.{}{}".format(root, namespace, extension)
+
+
+def namespace_directory(directory, namespace):
+    """Returns the journal directory of a namespace, within the one of the default namespace."""
+    if namespace is None:
+        return directory
+    return os.path.join(directory, 'namespaces', namespace)
+
+
+def preload(bulk_load, collection, path):
+    try:
+        with open(path, 'rb') as stream:
+            return bulk_load.load(collection, stream)
+    except (OSError, StreamFormatError, BulkLoadError) as e:
+        raise RuntimeError("Could not load the {} fixtures of {}: {}".format(collection, path, e))
+
+
+def exit_on_sigterm(signum, frame):
+    # Exiting, rather than being killed, runs the atexit hooks that save the
+    # snapshot, close the journals and flush the capture, e.g. on docker stop
+    raise SystemExit(128 + signum)
+
+
+def run(argv=None, environ=None):
+    args = parse_args(argv, environ)
+
+    app = create_app(
+        with_metrics=args.metrics, snapshot_path=args.snapshot, save_snapshot_path=args.save_snapshot,
+        event_log_size=args.event_log_size, event_log_spill_dir=args.event_log_spill_dir,
+        id_strategy=args.id_strategy, id_seed=args.id_seed, id_shard=args.id_shard, modules=args.modules,
+        fixtures=args.fixtures, storage=args.storage, sqlite_path=args.sqlite_path,
+        journal_dir=args.journal, journal_fsync_interval=args.journal_fsync_interval,
+        journal_compact_size=args.journal_compact_size, capture_path=args.capture,
+        with_response_cache=args.response_cache, response_cache_size=args.response_cache_size,
+        # Delays hold a thread of the fixed waitress pool, not of the other servers
+        worker_threads=args.threads if args.server == 'waitress' else None
+    )
 
-    setup_logging()
+    setup_logging(level=args.log_level, max_payload_length=args.log_payload_size)
+    signal.signal(signal.SIGTERM, exit_on_sigterm)
 
-    app.run(host="0.0.0.0", port=port)
+    serve(app, host=args.host, port=args.port, args=args)
 
 
 if __name__ == '__main__':
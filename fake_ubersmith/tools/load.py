@@ -0,0 +1,322 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Load generator driving a running fake-ubersmith over HTTP.
+
+    fake-ubersmith-load --url http://127.0.0.1:9131 --concurrency 16 \
+        --duration 30 --mix client.get=4,uber.check_login=4,iweb.log_event=1
+
+The report, printed as JSON, gives the requests/sec and the latency
+percentiles overall and per method.  It can be saved as a baseline and
+later runs compared to it with --baseline.
+"""
+import argparse
+import bisect
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from itertools import accumulate
+from urllib.parse import urlencode, urlsplit
+
+DEFAULT_MIX = 'client.get=4,uber.check_login=4,client.contact_list=2,client.contact_get=2,iweb.log_event=1'
+
+
+def _client_get(fixtures, rng):
+    return {'client_id': rng.choice(fixtures.client_ids)}
+
+
+def _client_contact_list(fixtures, rng):
+    return {'client_id': rng.choice(fixtures.client_ids)}
+
+
+def _client_contact_get(fixtures, rng):
+    return {'user_login': rng.choice(fixtures.contact_logins)}
+
+
+def _client_cc_info(fixtures, rng):
+    return {'client_id': rng.choice(fixtures.client_ids)}
+
+
+def _uber_check_login(fixtures, rng):
+    login = rng.choice(fixtures.client_logins)
+    return {'login': login, 'pass': fixtures.password}
+
+
+def _iweb_log_event(fixtures, rng):
+    return {
+        'event_type': 'load',
+        'reference_type': 'client',
+        'reference_id': rng.choice(fixtures.client_ids),
+        'action': 'load test event'
+    }
+
+
+def _client_add(fixtures, rng):
+    return {'first': 'Load', 'last': 'Test', 'email': 'load@test.invalid'}
+
+
+PARAMETERS = {
+    'client.get': _client_get,
+    'client.contact_list': _client_contact_list,
+    'client.contact_get': _client_contact_get,
+    'client.cc_info': _client_cc_info,
+    'uber.check_login': _uber_check_login,
+    'iweb.log_event': _iweb_log_event,
+    'client.add': _client_add,
+}
+
+
+def parse_mix(mix):
+    weights = {}
+    for entry in mix.split(','):
+        method, _, weight = entry.strip().partition('=')
+        if method not in PARAMETERS:
+            raise ValueError("Unsupported method '{}', supported methods are: {}".format(
+                method, ', '.join(sorted(PARAMETERS))
+            ))
+        weights[method] = float(weight or 1)
+    return weights
+
+
+def percentile(sorted_values, percent):
+    if not sorted_values:
+        return None
+    rank = max(int(round(percent / 100.0 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        'p50': _ms(percentile(latencies, 50)),
+        'p95': _ms(percentile(latencies, 95)),
+        'p99': _ms(percentile(latencies, 99)),
+        'max': _ms(latencies[-1] if latencies else None),
+        'mean': _ms(sum(latencies) / len(latencies) if latencies else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+class Fixtures:
+    password = 'load-test-password'
+
+    def __init__(self):
+        self.client_ids = []
+        self.client_logins = []
+        self.contact_logins = []
+
+
+class Target:
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = (parts.path.rstrip('/') or '') + '/api/2.0/'
+
+    def connect(self, timeout):
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+
+def call(connection, target, method, params):
+    body = urlencode(dict(params, method=method))
+    connection.request('POST', target.path, body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    payload = response.read()
+    if response.status != 200:
+        return False, None
+    return json.loads(payload.decode('utf-8')).get('status', False), payload
+
+
+def seed(target, clients, timeout):
+    fixtures = Fixtures()
+    connection = target.connect(timeout)
+    try:
+        for i in range(clients):
+            login = 'load-client-{}'.format(i)
+            ok, payload = call(connection, target, 'client.add', {
+                'first': 'Load', 'last': str(i), 'uber_login': login, 'uber_pass': fixtures.password
+            })
+            if not ok:
+                raise RuntimeError("Seeding failed on client {}".format(i))
+            client_id = json.loads(payload.decode('utf-8'))['data']
+
+            contact_login = 'load-contact-{}'.format(i)
+            call(connection, target, 'client.contact_add', {
+                'client_id': client_id, 'login': contact_login, 'password': fixtures.password
+            })
+
+            fixtures.client_ids.append(client_id)
+            fixtures.client_logins.append(login)
+            fixtures.contact_logins.append(contact_login)
+    finally:
+        connection.close()
+    return fixtures
+
+
+class _Worker(threading.Thread):
+    def __init__(self, target, fixtures, weights, deadline, requests, timeout, seed_value):
+        super().__init__(daemon=True)
+        self.target = target
+        self.fixtures = fixtures
+        self.methods = list(weights)
+        self.cumulative_weights = list(accumulate(weights[m] for m in self.methods))
+        self.deadline = deadline
+        self.requests = requests
+        self.timeout = timeout
+        self.rng = random.Random(seed_value)
+        self.latencies = {m: [] for m in self.methods}
+        self.errors = {m: 0 for m in self.methods}
+
+    def run(self):
+        connection = self.target.connect(self.timeout)
+        done = 0
+        while time.time() < self.deadline and (self.requests is None or done < self.requests):
+            method = self._pick_method()
+            params = PARAMETERS[method](self.fixtures, self.rng)
+            start = time.perf_counter()
+            try:
+                ok, _ = call(connection, self.target, method, params)
+            except (OSError, http.client.HTTPException, ValueError):
+                ok = False
+                connection.close()
+                connection = self.target.connect(self.timeout)
+            self.latencies[method].append(time.perf_counter() - start)
+            if not ok:
+                self.errors[method] += 1
+            done += 1
+        connection.close()
+
+    def _pick_method(self):
+        position = self.rng.random() * self.cumulative_weights[-1]
+        return self.methods[bisect.bisect(self.cumulative_weights, position)]
+
+
+def run_load(url, weights, concurrency=8, duration=10.0, requests=None, clients=100, timeout=10.0, seed_value=0):
+    target = Target(url)
+    fixtures = seed(target, clients, timeout)
+
+    per_worker = None if requests is None else -(-requests // concurrency)
+    deadline = time.time() + duration
+    workers = [
+        _Worker(target, fixtures, weights, deadline, per_worker, timeout, seed_value + i)
+        for i in range(concurrency)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    methods = {}
+    all_latencies = []
+    errors = 0
+    for method in weights:
+        latencies = [latency for worker in workers for latency in worker.latencies[method]]
+        method_errors = sum(worker.errors[method] for worker in workers)
+        all_latencies.extend(latencies)
+        errors += method_errors
+        methods[method] = dict(
+            requests=len(latencies), errors=method_errors,
+            requests_per_second=round(len(latencies) / elapsed, 2), latency_ms=summarize(latencies)
+        )
+
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'duration': round(elapsed, 3),
+        'requests': len(all_latencies),
+        'errors': errors,
+        'requests_per_second': round(len(all_latencies) / elapsed, 2),
+        'latency_ms': summarize(all_latencies),
+        'methods': methods,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Lists the regressions of a report against a saved baseline."""
+    regressions = []
+
+    def check(name, current, reference):
+        if not current or not reference:
+            return
+        if current['requests_per_second'] < reference['requests_per_second'] * (1 - tolerance):
+            regressions.append("{}: requests/sec {} < baseline {}".format(
+                name, current['requests_per_second'], reference['requests_per_second']
+            ))
+        current_p99, reference_p99 = current['latency_ms']['p99'], reference['latency_ms']['p99']
+        if current_p99 is not None and reference_p99 is not None and current_p99 > reference_p99 * (1 + tolerance):
+            regressions.append("{}: p99 {}ms > baseline {}ms".format(name, current_p99, reference_p99))
+
+    check('overall', report, baseline)
+    for method, stats in report['methods'].items():
+        check(method, stats, baseline.get('methods', {}).get(method))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='fake-ubersmith-load', description=__doc__.split('\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:9131')
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help="comma separated method=weight pairs, supported methods: {}".format(
+                            ', '.join(sorted(PARAMETERS))))
+    parser.add_argument('--concurrency', type=int, default=8, help="number of concurrent connections")
+    parser.add_argument('--duration', type=float, default=10.0, help="maximum duration of the run, in seconds")
+    parser.add_argument('--requests', type=int, help="stop after this number of requests")
+    parser.add_argument('--clients', type=int, default=100, help="number of clients seeded before the run")
+    parser.add_argument('--timeout', type=float, default=10.0, help="timeout of each request, in seconds")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the method and parameter choices")
+    parser.add_argument('--output', help="also write the report to this file")
+    parser.add_argument('--save-baseline', help="write the report to this file as the new baseline")
+    parser.add_argument('--baseline', help="compare the report to this baseline, exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="relative slowdown accepted when comparing to the baseline")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+
+    report = run_load(
+        args.url, parse_mix(args.mix), concurrency=args.concurrency, duration=args.duration,
+        requests=args.requests, clients=args.clients, timeout=args.timeout, seed_value=args.seed
+    )
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report['regressions'] = regressions
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+    return 1 if regressions else 0
+
+
+def main():
+    sys.exit(run())
+
+
+if __name__ == '__main__':
+    main()
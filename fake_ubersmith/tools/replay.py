@@ -0,0 +1,246 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Replay of the traffic captured by fake-ubersmith --capture.
+
+    fake-ubersmith-replay traffic.ndjson --url http://127.0.0.1:9131 \
+        --speed 2 --concurrency 16
+
+Calls are issued in their captured order, at their captured pace sped up
+by --speed, or as fast as possible with --speed max, over --concurrency
+connections.  With --ordered, the calls of a namespace are all issued in
+turn on the same connection, so that none overtakes a call it depends on.
+The report, printed as JSON, gives the latency percentiles of the replay
+next to the captured ones, overall and per method, and the calls whose
+response differed from the captured one.
+"""
+import argparse
+import http.client
+import json
+import queue
+import sys
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+from fake_ubersmith.api import namespaces
+from fake_ubersmith.tools.load import Target, summarize
+
+BATCH = 'batch'
+
+
+def parse_speed(value):
+    if value == 'max':
+        return None
+    speed = float(value)
+    if speed <= 0:
+        raise ValueError("The speed must be positive")
+    return speed
+
+
+def read_capture(stream):
+    """Returns the calls of a capture, in the order they arrived."""
+    calls = []
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            call = json.loads(line)
+        except ValueError as e:
+            raise ValueError("Invalid call on line {}: {}".format(number, e))
+        if not isinstance(call, dict) or not isinstance(call.get("method", BATCH), str):
+            raise ValueError("Invalid call on line {}".format(number))
+        call["line"] = number
+        calls.append(call)
+    calls.sort(key=lambda call: call.get("t", 0))
+    return calls
+
+
+def send(connection, target, call):
+    """Issues a captured call, returning the HTTP status and decoded response."""
+    headers = {}
+    if call.get("namespace"):
+        headers[namespaces.HEADER] = call["namespace"]
+    if "batch" in call:
+        path, body = target.path + 'batch', json.dumps(call["batch"])
+        headers['Content-Type'] = 'application/json'
+    else:
+        path, body = target.path, urlencode(dict(call.get("params") or {}, method=call["method"]), doseq=True)
+        headers['Content-Type'] = 'application/x-www-form-urlencoded'
+
+    connection.request('POST', path, body, headers)
+    response = connection.getresponse()
+    payload = response.read()
+    try:
+        return response.status, json.loads(payload.decode('utf-8'))
+    except ValueError:
+        return response.status, None
+
+
+class _Worker(threading.Thread):
+    def __init__(self, target, calls, started, speed, timeout):
+        super().__init__(daemon=True)
+        self.target = target
+        self.calls = calls
+        self.started = started
+        self.speed = speed
+        self.timeout = timeout
+        self.latencies = {}
+        self.errors = {}
+        self.differences = []
+        self.lag = 0.0
+
+    def run(self):
+        connection = self.target.connect(self.timeout)
+        while True:
+            call = self.calls.get()
+            if call is None:
+                break
+            if self.speed is not None:
+                wait = self.started + call.get("t", 0) / self.speed - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                else:
+                    self.lag = max(self.lag, -wait)
+
+            method = call.get("method", BATCH)
+            start = time.perf_counter()
+            try:
+                status, payload = send(connection, self.target, call)
+            except (OSError, http.client.HTTPException):
+                status, payload = None, None
+                connection.close()
+                connection = self.target.connect(self.timeout)
+            self.latencies.setdefault(method, []).append(time.perf_counter() - start)
+            self.errors.setdefault(method, 0)
+            if status is None:
+                self.errors[method] += 1
+            elif (status, payload) != (call.get("status"), call.get("response")):
+                self.differences.append(dict(
+                    line=call["line"], method=method,
+                    expected=dict(status=call.get("status"), response=call.get("response")),
+                    actual=dict(status=status, response=payload)
+                ))
+        connection.close()
+
+
+def connection_of(call, concurrency):
+    """Returns the index of the connection issuing a call, the same for all the calls of its namespace."""
+    return zlib.crc32((call.get("namespace") or "").encode('utf-8')) % concurrency
+
+
+def replay(url, calls, speed=1.0, concurrency=8, timeout=10.0, max_differences=20, ordered=False):
+    target = Target(url)
+    if ordered:
+        pending = [queue.SimpleQueue() for _ in range(concurrency)]
+        for call in calls:
+            pending[connection_of(call, concurrency)].put(call)
+        for calls_of_connection in pending:
+            calls_of_connection.put(None)
+    else:
+        # Every connection takes the next call as soon as it is free
+        shared = queue.SimpleQueue()
+        for call in calls:
+            shared.put(call)
+        for _ in range(concurrency):
+            shared.put(None)
+        pending = [shared] * concurrency
+
+    started = time.perf_counter()
+    workers = [_Worker(target, calls_of_connection, started, speed, timeout) for calls_of_connection in pending]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    captured = {}
+    for call in calls:
+        captured.setdefault(call.get("method", BATCH), []).append(call.get("duration", 0))
+    differences = sorted((d for worker in workers for d in worker.differences), key=lambda d: d["line"])
+
+    methods = {}
+    all_latencies = []
+    errors = 0
+    for method, durations in captured.items():
+        latencies = [latency for worker in workers for latency in worker.latencies.get(method, ())]
+        method_errors = sum(worker.errors.get(method, 0) for worker in workers)
+        all_latencies.extend(latencies)
+        errors += method_errors
+        methods[method] = dict(
+            requests=len(latencies), errors=method_errors,
+            differences=sum(1 for d in differences if d["method"] == method),
+            latency_ms=summarize(latencies), captured_latency_ms=summarize(durations)
+        )
+
+    return {
+        'url': url,
+        'speed': 'max' if speed is None else speed,
+        'concurrency': concurrency,
+        'ordered': ordered,
+        'duration': round(elapsed, 3),
+        'requests': len(all_latencies),
+        'errors': errors,
+        'differences': len(differences),
+        'requests_per_second': round(len(all_latencies) / elapsed, 2) if elapsed else None,
+        'latency_ms': summarize(all_latencies),
+        'captured_latency_ms': summarize([d for durations in captured.values() for d in durations]),
+        'max_lag_ms': round(max((worker.lag for worker in workers), default=0) * 1000, 3),
+        'methods': methods,
+        'different_responses': differences[:max_differences],
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='fake-ubersmith-replay', description=__doc__.split('\n')[0])
+    parser.add_argument('capture', help="NDJSON file written by fake-ubersmith --capture")
+    parser.add_argument('--url', default='http://127.0.0.1:9131')
+    parser.add_argument('--speed', type=parse_speed, default=1.0,
+                        help="how many times faster than captured the calls are issued, or 'max'")
+    parser.add_argument('--concurrency', type=int, default=8, help="number of concurrent connections")
+    parser.add_argument('--ordered', action='store_true',
+                        help="issue the calls of a namespace in turn on the same connection")
+    parser.add_argument('--timeout', type=float, default=10.0, help="timeout of each request, in seconds")
+    parser.add_argument('--max-differences', type=int, default=20,
+                        help="number of different responses listed in the report")
+    parser.add_argument('--output', help="also write the report to this file")
+    return parser.parse_args(argv)
+
+
+def run(argv=None):
+    args = parse_args(argv)
+
+    with open(args.capture, encoding='utf-8') as f:
+        calls = read_capture(f)
+    report = replay(
+        args.url, calls, speed=args.speed, concurrency=args.concurrency, timeout=args.timeout,
+        max_differences=args.max_differences, ordered=args.ordered
+    )
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    sys.stdout.write('\n')
+
+    return 1 if report['differences'] else 0
+
+
+def main():
+    sys.exit(run())
+
+
+if __name__ == '__main__':
+    main()
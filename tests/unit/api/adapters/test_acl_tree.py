@@ -0,0 +1,106 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import random
+import unittest
+
+from fake_ubersmith.api.adapters.acl_tree import AclTree, AclTreeError, walk
+
+
+def a_resource(resource_id, name=None, parent_id="0"):
+    return {
+        "resource_id": str(resource_id),
+        "name": name or "resource-{}".format(resource_id),
+        "parent_id": str(parent_id),
+        "lft": "0",
+        "rgt": "0",
+        "children": {}
+    }
+
+
+def numbering(tree):
+    return {resource["resource_id"]: (int(resource["lft"]), int(resource["rgt"])) for resource in walk(tree)}
+
+
+class TestAclTree(unittest.TestCase):
+    def test_resources_added_at_the_end_are_numbered_as_they_are_added(self):
+        tree = AclTree()
+        tree.add(a_resource(1))
+        tree.add(a_resource(2, parent_id=1))
+        tree.add(a_resource(3, parent_id=2))
+        tree.add(a_resource(4))
+
+        self.assertEqual(numbering(tree), {"1": (1, 6), "2": (2, 5), "3": (3, 4), "4": (7, 8)})
+
+    def test_adds_anywhere_in_the_tree_are_renumbered_on_read(self):
+        rng = random.Random(1)
+        tree = AclTree()
+        for resource_id in range(1, 200):
+            tree.add(a_resource(resource_id, parent_id=rng.randrange(resource_id)))
+        incremental = numbering(tree.numbered())
+
+        tree._renumber()
+
+        self.assertEqual(incremental, numbering(tree))
+        self.assertEqual(sorted(n for bounds in incremental.values() for n in bounds), list(range(1, 399)))
+
+    def test_find_returns_the_first_resource_of_a_name_depth_first(self):
+        tree = AclTree()
+        tree.add(a_resource(1))
+        tree.add(a_resource(2, name="shared"))
+        tree.add(a_resource(3, name="shared", parent_id=1))
+
+        self.assertEqual(tree.find("shared")["resource_id"], "3")
+        self.assertIsNone(tree.find("unknown"))
+
+    def test_is_built_from_a_nested_dict(self):
+        root = a_resource(1)
+        root["children"]["2"] = a_resource(2, name="child", parent_id=1)
+
+        tree = AclTree({"1": root})
+
+        self.assertIs(tree.find("child"), root["children"]["2"])
+        self.assertEqual(numbering(tree.numbered()), {"1": (1, 4), "2": (2, 3)})
+
+    def test_load_attaches_children_listed_before_their_parents(self):
+        tree = AclTree()
+        tree.add(a_resource(1))
+
+        tree.load([a_resource(3, parent_id=2), a_resource(2, parent_id=1)])
+
+        self.assertIn("3", tree["1"]["children"]["2"]["children"])
+        self.assertEqual(tree.get_resource("3")["name"], "resource-3")
+
+    def test_load_of_invalid_resources_adds_nothing(self):
+        tree = AclTree()
+        tree.add(a_resource(1))
+
+        for resources, message in (
+                ([a_resource(1)], "Resource id 1 already exists"),
+                ([a_resource(2, parent_id=9)], "Parent resource 9 of resource 2 not found"),
+                ([a_resource(2, parent_id=3), a_resource(3, parent_id=2)], "Resources 2, 3 are their own ancestors"),
+        ):
+            with self.assertRaises(AclTreeError) as context:
+                tree.load(resources)
+            self.assertEqual(str(context.exception), message)
+
+        self.assertEqual(list(walk(tree)), [tree["1"]])
+
+    def test_cached_values_are_dropped_when_the_tree_changes(self):
+        tree = AclTree()
+        self.assertEqual(tree.cached("key", lambda: 1), 1)
+        self.assertEqual(tree.cached("key", lambda: 2), 1)
+
+        tree.add(a_resource(1))
+
+        self.assertEqual(tree.cached("key", lambda: 3), 3)
@@ -0,0 +1,210 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import threading
+import unittest
+
+from flask import Flask
+
+from fake_ubersmith.api.adapters.data_store import DataStore, IndexedList
+from fake_ubersmith.api.adapters.records import Record
+from fake_ubersmith.api.methods.client import Client
+from fake_ubersmith.api.methods.uber import Uber
+from fake_ubersmith.api.ubersmith import UbersmithBase
+
+
+class TestDataStore(unittest.TestCase):
+    def setUp(self):
+        self.data_store = DataStore()
+
+    def test_assigned_collections_are_indexed(self):
+        self.data_store.clients = [{"clientid": "1"}, {"clientid": "2"}]
+
+        self.assertIsInstance(self.data_store.clients, IndexedList)
+        self.assertEqual(self.data_store.clients.lookup("clientid", "2"), {"clientid": "2"})
+        self.assertIsNone(self.data_store.clients.lookup("clientid", "3"))
+
+    def test_appended_records_are_indexed(self):
+        self.data_store.contacts.append({"contact_id": "1", "client_id": "100", "login": "john"})
+        self.data_store.contacts.extend([
+            {"contact_id": "2", "client_id": "100", "login": "jane"},
+            {"contact_id": "3", "client_id": "101", "login": "joe"}
+        ])
+
+        self.assertEqual(self.data_store.contacts.lookup("login", "jane")["contact_id"], "2")
+        self.assertEqual(
+            [c["contact_id"] for c in self.data_store.contacts.lookup_all("client_id", "100")],
+            ["1", "2"]
+        )
+
+    def test_records_missing_the_indexed_field_are_skipped(self):
+        self.data_store.credit_cards = [{"billing_info_id": "123"}]
+
+        self.assertEqual(self.data_store.credit_cards.lookup_all("clientid", "1"), [])
+        self.assertEqual(
+            self.data_store.credit_cards.lookup("billing_info_id", "123"),
+            {"billing_info_id": "123"}
+        )
+
+    def test_nested_keys_are_indexed(self):
+        self.data_store.coupons = [{"coupon": {"coupon_code": "1"}}]
+
+        self.assertEqual(
+            self.data_store.coupons.lookup("coupon_code", "1"),
+            {"coupon": {"coupon_code": "1"}}
+        )
+
+    def test_updating_a_record_moves_it_in_the_index(self):
+        client = {"clientid": "1", "login": "john"}
+        self.data_store.clients.append(client)
+
+        with self.data_store.clients.updating(client):
+            client["login"] = "jane"
+
+        self.assertIsNone(self.data_store.clients.lookup("login", "john"))
+        self.assertIs(self.data_store.clients.lookup("login", "jane"), client)
+
+    def test_removed_records_are_unindexed(self):
+        client = {"clientid": "1"}
+        self.data_store.clients.append(client)
+
+        self.data_store.clients.remove(client)
+        self.assertIsNone(self.data_store.clients.lookup("clientid", "1"))
+
+        self.data_store.clients.append(client)
+        del self.data_store.clients[0]
+        self.assertIsNone(self.data_store.clients.lookup("clientid", "1"))
+
+    def test_records_sharing_a_key_are_unindexed_one_by_one(self):
+        john = {"contact_id": "1", "client_id": "100"}
+        jane = {"contact_id": "2", "client_id": "100"}
+        self.data_store.contacts.extend([john, jane])
+
+        self.data_store.contacts.remove(john)
+        self.assertEqual(self.data_store.contacts.lookup_all("client_id", "100"), [jane])
+
+        self.data_store.contacts.remove(jane)
+        self.assertEqual(self.data_store.contacts.lookup_all("client_id", "100"), [])
+
+    def test_assigned_clients_and_contacts_are_compacted(self):
+        self.data_store.clients = [{"clientid": "1"}]
+        self.data_store.contacts = [{"contact_id": "1"}]
+
+        self.assertIsInstance(self.data_store.clients[0], Record)
+        self.assertIsInstance(self.data_store.contacts[0], Record)
+
+    def test_flush_resets_indexes(self):
+        self.data_store.service_plans = [{"plan_id": "1"}]
+
+        self.data_store.flush()
+
+        self.assertIsNone(self.data_store.service_plans.lookup("plan_id", "1"))
+
+    def test_versions_grow_with_the_writes_of_their_collection(self):
+        versions = self.data_store.versions("clients", "contacts")
+
+        with self.data_store.writing("clients"):
+            self.data_store.insert("clients", {"clientid": "1"})
+        with self.data_store.reading("contacts"):
+            pass
+
+        self.assertEqual(self.data_store.versions("clients", "contacts"), (versions[0] + 1, versions[1]))
+
+        versions = self.data_store.versions("clients", "contacts")
+        self.data_store.flush()
+        self.data_store.contacts = []
+
+        flushed_versions = self.data_store.versions("clients", "contacts")
+        self.assertGreater(flushed_versions[0], versions[0])
+        self.assertGreater(flushed_versions[1], versions[1] + 1)
+
+
+class TestDataStoreConcurrency(unittest.TestCase):
+    threads = 16
+    iterations = 50
+
+    def setUp(self):
+        self.data_store = DataStore()
+        self.app = Flask(__name__)
+        self.base_uber_api = UbersmithBase(self.data_store)
+        Client(self.data_store).hook_to(self.base_uber_api)
+        Uber(self.data_store).hook_to(self.base_uber_api)
+        self.base_uber_api.hook_to(self.app)
+
+    def _hammer(self, worker):
+        errors = []
+
+        def run(index):
+            try:
+                with self.app.test_client() as c:
+                    for i in range(self.iterations):
+                        worker(c, index, i)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(self.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+    def test_concurrent_client_adds_and_reads_stay_consistent(self):
+        def worker(c, index, i):
+            resp = c.post('api/2.0/', data={
+                "method": "client.add", "first": "john", "uber_login": "login-{}-{}".format(index, i)
+            })
+            client_id = json.loads(resp.data.decode('utf-8'))["data"]
+
+            resp = c.post('api/2.0/', data={"method": "client.contact_list", "client_id": client_id})
+            self.assertEqual(len(json.loads(resp.data.decode('utf-8'))["data"]), 1)
+
+            c.post('api/2.0/', data={
+                "method": "client.update", "client_id": client_id, "uber_login": "renamed-{}-{}".format(index, i)
+            })
+
+        self._hammer(worker)
+
+        total = self.threads * self.iterations
+        self.assertEqual(len(self.data_store.clients), total)
+        self.assertEqual(len(self.data_store.contacts), total)
+        self.assertIsNone(self.data_store.clients.lookup("login", "login-0-0"))
+        self.assertIsNotNone(self.data_store.clients.lookup("login", "renamed-0-0"))
+
+    def test_concurrent_acl_resource_adds_get_unique_ids(self):
+        def worker(c, index, i):
+            c.post('api/2.0/', data={
+                "method": "uber.acl_resource_add", "resource_name": "resource-{}-{}".format(index, i)
+            })
+            if i % 10 == 0:
+                c.post('api/2.0/', data={"method": "uber.acl_resource_list"})
+
+        self._hammer(worker)
+
+        total = self.threads * self.iterations
+        self.assertEqual(len(self.data_store.acl_resources), total)
+        self.assertEqual(self.data_store.acl_resources_counter.value, total)
+
+    def test_flush_and_adds_are_never_seen_half_done(self):
+        def worker(c, index, i):
+            if index % 4 == 0:
+                c.post('api/2.0/', data={"method": "client.add", "first": "john"})
+                if i % 10 == 0:
+                    self.data_store.flush()
+            else:
+                with self.data_store.reading("clients", "contacts"):
+                    self.assertEqual(len(self.data_store.clients), len(self.data_store.contacts))
+
+        self._hammer(worker)
@@ -0,0 +1,115 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from fake_ubersmith.api.adapters import event_log
+from fake_ubersmith.api.adapters.data_store import DataStore
+
+
+def events(start, stop):
+    return [{"event_type": str(i)} for i in range(start, stop)]
+
+
+class TestEventLog(unittest.TestCase):
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spill_dir)
+
+    def test_keeps_the_newest_events_in_memory(self):
+        log = event_log.EventLog(capacity=3)
+        log.extend(events(0, 5))
+
+        self.assertEqual(len(log), 3)
+        self.assertEqual(log[0], {"event_type": "2"})
+        self.assertEqual(log.first_cursor, 2)
+        self.assertEqual(log.next_cursor, 5)
+
+    def test_dropped_events_are_skipped_when_reading(self):
+        log = event_log.EventLog(capacity=3)
+        log.extend(events(0, 5))
+
+        self.assertEqual(log.read(0, limit=10), (events(2, 5), 5))
+
+    def test_overflow_is_spilled_to_a_segment_file(self):
+        log = event_log.EventLog(capacity=3, spill_dir=self.spill_dir, block_size=2)
+        self.addCleanup(log.close)
+        log.extend(events(0, 10))
+
+        self.assertEqual(len(log), 3)
+        self.assertEqual(log.first_cursor, 0)
+        self.assertEqual(os.path.dirname(log.path), self.spill_dir)
+        self.assertEqual(list(event_log.read_segment(log.path)), events(0, 6))
+
+    def test_pages_through_spilled_pending_and_in_memory_events(self):
+        log = event_log.EventLog(capacity=3, spill_dir=self.spill_dir, block_size=2)
+        self.addCleanup(log.close)
+        log.extend(events(0, 10))
+
+        cursor, pages = 0, []
+        while cursor < log.next_cursor:
+            page, cursor = log.read(cursor, limit=3)
+            pages.append(page)
+
+        self.assertEqual(pages, [events(0, 3), events(3, 6), events(6, 9), events(9, 10)])
+
+    def test_reading_past_the_end_returns_nothing(self):
+        log = event_log.EventLog(capacity=3)
+        log.extend(events(0, 2))
+
+        self.assertEqual(log.read(2), ([], 2))
+        self.assertEqual(log.read(10), ([], 10))
+
+    def test_close_removes_the_segment_file(self):
+        log = event_log.EventLog(capacity=1, spill_dir=self.spill_dir, block_size=1)
+        log.extend(events(0, 2))
+        path = log.path
+
+        log.close()
+
+        self.assertFalse(os.path.exists(path))
+
+    def test_segments_of_processes_that_are_gone_are_removed(self):
+        finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+        finished.wait()
+        names = ['event-log-{}-abc.seg'.format(finished.pid), 'event-log-{}-def.seg'.format(os.getpid()),
+                 'other.seg']
+        for name in names:
+            open(os.path.join(self.spill_dir, name), 'w').close()
+
+        log = event_log.EventLog(capacity=1, spill_dir=self.spill_dir)
+        self.addCleanup(log.close)
+
+        self.assertEqual(sorted(os.listdir(self.spill_dir)), names[1:])
+
+
+class TestDataStoreEventLog(unittest.TestCase):
+    def test_event_log_is_bounded(self):
+        data_store = DataStore(event_log_size=2)
+        data_store.event_log.extend(events(0, 3))
+
+        self.assertEqual(list(data_store.event_log), events(1, 3))
+
+    def test_state_round_trips_the_readable_events(self):
+        data_store = DataStore(event_log_size=2)
+        data_store.event_log.extend(events(0, 3))
+
+        restored = DataStore(event_log_size=5)
+        restored.import_state(data_store.export_state())
+
+        self.assertEqual(list(restored.event_log), events(1, 3))
@@ -0,0 +1,97 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import unittest
+
+from fake_ubersmith.api.adapters import ids
+
+
+class TestIdAllocators(unittest.TestCase):
+    def test_sequential_ids_count_up_per_kind(self):
+        allocator = ids.SequentialIds()
+
+        self.assertEqual([allocator.next_id("clients") for _ in range(3)], [1, 2, 3])
+        self.assertEqual(allocator.next_id("contacts"), 1)
+
+    def test_reserved_ids_are_skipped(self):
+        allocator = ids.SequentialIds()
+        allocator.reserve("clients", "2")
+        allocator.reserve("clients", "not a number")
+
+        self.assertEqual([allocator.next_id("clients") for _ in range(3)], [1, 3, 4])
+
+    def test_shards_never_share_an_id(self):
+        shards = [ids.ShardedIds(shard, 3) for shard in range(3)]
+
+        allocated = [shard.next_id("clients") for _ in range(100) for shard in shards]
+
+        self.assertEqual(sorted(allocated), list(range(1, 301)))
+
+    def test_seeded_ids_are_a_permutation_of_their_range(self):
+        allocator = ids.SeededIds(seed=42, low=10, high=99)
+
+        allocated = [allocator.next_id("clients") for _ in range(92)]
+
+        self.assertEqual(sorted(allocated[:90]), list(range(10, 100)))
+        self.assertEqual(allocated[90:], [100, 101])
+
+    def test_seeded_ids_are_the_same_for_a_seed(self):
+        def allocated(seed):
+            allocator = ids.SeededIds(seed=seed)
+            return [allocator.next_id("clients") for _ in range(10)]
+
+        self.assertEqual(allocated(1), allocated(1))
+        self.assertNotEqual(allocated(1), allocated(2))
+        self.assertTrue(all(100000 <= record_id <= 999999 for record_id in allocated(1)))
+
+    def test_ids_are_unique_across_threads(self):
+        allocator = ids.SeededIds()
+        allocated = []
+
+        def allocate():
+            allocated.extend(allocator.next_id("clients") for _ in range(1000))
+
+        threads = [threading.Thread(target=allocate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(allocated)), 8000)
+
+    def test_state_round_trips(self):
+        allocator = ids.SequentialIds()
+        allocator.next_id("clients")
+        allocator.reserve("clients", 2)
+
+        restored = ids.SequentialIds()
+        restored.import_state(allocator.export_state())
+
+        self.assertEqual(restored.next_id("clients"), 3)
+
+    def test_reset_starts_over(self):
+        allocator = ids.SequentialIds()
+        allocator.next_id("clients")
+
+        allocator.reset()
+
+        self.assertEqual(allocator.next_id("clients"), 1)
+
+    def test_id_allocator_builds_a_strategy(self):
+        self.assertIsInstance(ids.id_allocator(), ids.SeededIds)
+        self.assertEqual(ids.id_allocator('sharded', shard=(1, 2)).next_id("clients"), 2)
+        with self.assertRaises(ValueError):
+            ids.id_allocator('sharded')
+        with self.assertRaises(ValueError):
+            ids.id_allocator('unknown')
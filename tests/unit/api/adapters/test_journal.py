@@ -0,0 +1,164 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from flask import Flask
+
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.adapters.ids import SequentialIds
+from fake_ubersmith.api.adapters.journal import Journal, JournaledStore, JournalError
+from fake_ubersmith.api.methods.client import Client
+from fake_ubersmith.api.methods.uber import Uber
+from fake_ubersmith.api.methods.vendor_modules.iweb import IWeb
+from fake_ubersmith.api.ubersmith import FakeUbersmithError, UbersmithBase
+
+
+class TestJournaledStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.data_store = self.open_store()
+
+    def open_store(self, **kwargs):
+        data_store = JournaledStore(DataStore(ids=SequentialIds()), Journal(self.directory, **kwargs))
+        data_store.restore()
+        self.addCleanup(data_store.close)
+        return data_store
+
+    def restart(self, **kwargs):
+        self.data_store.close()
+        self.data_store = self.open_store(**kwargs)
+        return self.data_store
+
+    def _call(self, **data):
+        app = Flask(__name__)
+        base_uber_api = UbersmithBase(self.data_store)
+        Client(self.data_store).hook_to(base_uber_api)
+        Uber(self.data_store).hook_to(base_uber_api)
+        IWeb(self.data_store).hook_to(base_uber_api)
+        base_uber_api.hook_to(app)
+        with app.test_client() as c:
+            return json.loads(c.post('api/2.0/', data=data).data.decode('utf-8'))
+
+    def _segments(self):
+        return sorted(name for name in os.listdir(self.directory) if name.startswith('journal-'))
+
+    def test_a_new_journal_restores_nothing(self):
+        self.assertFalse(self.data_store.restored)
+        self.assertEqual(self._segments(), ['journal-00000001.log'])
+
+    def test_mutations_made_through_the_api_are_restored(self):
+        client_id = self._call(method="client.add", first="John", uber_login="john", uber_pass="secret")["data"]
+        self._call(method="client.update", client_id=client_id, uber_login="jane")
+        contact_id = self._call(method="client.contact_add", client_id=client_id, login="joe")["data"]
+        self._call(method="client.contact_permission_set", contact_id=contact_id, resource_name="client.manage",
+                   action="read", type="allow")
+        self._call(method="uber.acl_resource_add", resource_name="root")
+        self._call(method="uber.acl_resource_add", resource_name="child", parent_resource_name="root")
+        role_id = self._call(method="iweb.acl_admin_role_add", name="admin", descr="Admin")["data"]
+        self._call(method="iweb.user_role_assign", user_id="42", role_id=role_id)
+        self._call(method="iweb.log_event", event_type="login")
+        state = self.data_store.export_state()
+
+        self.restart()
+
+        # Allocated ids are restored as reserved ones
+        restored_state = self.data_store.export_state()
+        self.assertEqual(restored_state.pop("ids")["clients"]["reserved"], {int(client_id)})
+        state.pop("ids")
+        self.assertTrue(self.data_store.restored)
+        self.assertEqual(restored_state, state)
+        self.assertEqual(self._call(method="client.get", client_id=client_id)["data"]["login"], "jane")
+        tree = self.data_store.acl_tree()
+        self.assertEqual(tree.find("child")["parent_id"], tree.find("root")["resource_id"])
+        self.assertNotEqual(self._call(method="client.add", first="Jack")["data"], client_id)
+
+    def test_canned_order_errors_are_restored(self):
+        with self.data_store.writing("order"):
+            self.data_store.update_items("order", [("1", FakeUbersmithError(code=999, message="epic fail"))])
+
+        self.restart()
+
+        error = self.data_store.get_item("order", "1")
+        self.assertIsInstance(error, FakeUbersmithError)
+        self.assertEqual((error.code, error.message), (999, "epic fail"))
+
+    def test_flushes_are_restored(self):
+        self._call(method="client.add", first="John")
+        self.data_store.flush()
+        self._call(method="client.add", first="Jane")
+
+        self.restart()
+
+        self.assertEqual([c["first"] for c in self.data_store.records("clients")], ["Jane"])
+
+    def test_compaction_replaces_segments_by_a_snapshot(self):
+        client_id = self._call(method="client.add", first="John")["data"]
+        self.data_store.journal.compact()
+        self._call(method="client.update", client_id=client_id, first="Jane")
+
+        self.assertEqual(self._segments(), ['journal-00000002.log'])
+        self.assertIn('snapshot-00000001', os.listdir(self.directory))
+
+        self.restart()
+
+        self.assertEqual(self.data_store.lookup("clients", "clientid", client_id)["first"], "Jane")
+        self.assertEqual(self._segments(), ['journal-00000002.log', 'journal-00000003.log'])
+
+    def test_large_segments_are_compacted_in_the_background(self):
+        self.restart(fsync_interval=0.01, compact_size=1)
+
+        self._call(method="client.add", first="John")
+
+        deadline = time.time() + 5
+        while 'snapshot-00000002' not in os.listdir(self.directory) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertIn('snapshot-00000002', os.listdir(self.directory))
+
+    def test_appends_are_synced_in_batches(self):
+        with patch('fake_ubersmith.api.adapters.journal.os.fsync') as m_fsync:
+            for _ in range(10):
+                self.data_store.append_event({"event_type": "login"})
+            self.data_store.journal.sync()
+            self.data_store.journal.sync()
+
+        m_fsync.assert_called_once_with(self.data_store.journal._segment.fileno())
+
+    def test_an_entry_cut_short_by_a_crash_is_ignored(self):
+        self.data_store.append_event({"event_type": "login"})
+        self.data_store.append_event({"event_type": "logout"})
+        self.data_store.close()
+        path = os.path.join(self.directory, 'journal-00000001.log')
+        os.truncate(path, os.path.getsize(path) - 1)
+
+        self.data_store = self.open_store()
+
+        self.assertEqual(self.data_store.read_events(0, limit=10)[0], [{"event_type": "login"}])
+
+    def test_corrupted_entries_are_refused(self):
+        self.data_store.append_event({"event_type": "login"})
+        self.data_store.append_event({"event_type": "logout"})
+        self.data_store.close()
+        with open(os.path.join(self.directory, 'journal-00000001.log'), 'r+b') as f:
+            f.seek(10)
+            f.write(b'\xff')
+
+        with self.assertRaises(JournalError):
+            self.open_store()
@@ -0,0 +1,66 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import pickle
+import unittest
+
+from werkzeug.datastructures import MultiDict
+
+from fake_ubersmith.api.adapters.records import Record
+from fake_ubersmith.api.utils.response import encode
+
+
+class TestRecord(unittest.TestCase):
+    def test_behaves_like_a_dict(self):
+        record = Record({"clientid": "1", "login": "john"})
+        record["email"] = "john@invalid.com"
+        record["login"] = "jane"
+        del record["clientid"]
+
+        self.assertEqual(record, {"login": "jane", "email": "john@invalid.com"})
+        self.assertEqual(list(record), ["login", "email"])
+        self.assertEqual(record.get("clientid", "none"), "none")
+        self.assertIn("email", record)
+        self.assertNotIn("clientid", record)
+        with self.assertRaises(KeyError):
+            record["clientid"]
+
+    def test_records_of_the_same_keys_share_their_shape(self):
+        first = Record(MultiDict([("clientid", "1"), ("login", "john"), ("login", "ignored")]))
+        second = Record([("clientid", "2"), ("login", "jane")])
+        second["email"] = "jane@invalid.com"
+        del second["email"]
+
+        self.assertEqual(first, {"clientid": "1", "login": "john"})
+        self.assertIs(first._shape, second._shape)
+
+    def test_copies_are_dicts(self):
+        record = Record({"clientid": "1"})
+        copy = record.copy()
+        copy["clientid"] = "2"
+
+        self.assertEqual(copy, {"clientid": "2"})
+        self.assertEqual(record["clientid"], "1")
+
+    def test_of_only_converts_other_mappings(self):
+        record = Record({"clientid": "1"})
+
+        self.assertIs(Record.of(record), record)
+        self.assertIsInstance(Record.of({"clientid": "1"}), Record)
+
+    def test_is_encoded_and_pickled_as_a_dict(self):
+        record = Record({"clientid": "1", "permissions": {}})
+
+        self.assertEqual(json.loads(encode({"data": record})), {"data": {"clientid": "1", "permissions": []}})
+        self.assertEqual(pickle.loads(pickle.dumps(record)), record)
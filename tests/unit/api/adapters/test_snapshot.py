@@ -0,0 +1,123 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import pickle
+import tempfile
+import unittest
+
+from flask import Flask
+from werkzeug.datastructures import MultiDict
+
+from fake_ubersmith.api.adapters import snapshot
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.methods.vendor_modules.iweb import IWeb
+from fake_ubersmith.api.ubersmith import FakeUbersmithError
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.data_store = DataStore()
+        self.data_store.clients = [MultiDict({"clientid": "1", "login": "john"})]
+        self.data_store.contacts = [{"contact_id": "2", "client_id": "1", "login": "jane"}]
+        self.data_store.coupons = [{"coupon": {"coupon_code": "ABC"}}]
+        self.data_store.roles["3"] = {"name": "admin"}
+        self.data_store.user_mapping["4"]["roles"].add("3")
+        self.data_store.acl_resources_counter.increment()
+        self.data_store.service_plans_list = {"5": {"plan_id": "5"}}
+
+    def _assert_restored(self, data_store):
+        self.assertEqual(data_store.clients.lookup("login", "john"), {"clientid": "1", "login": "john"})
+        self.assertEqual(data_store.contacts.lookup_all("client_id", "1")[0]["login"], "jane")
+        self.assertIsNotNone(data_store.coupons.lookup("coupon_code", "ABC"))
+        self.assertEqual(data_store.roles, {"3": {"name": "admin"}})
+        self.assertEqual(data_store.user_mapping["4"]["roles"], {"3"})
+        self.assertEqual(data_store.user_mapping["6"]["roles"], set())
+        self.assertEqual(data_store.acl_resources_counter.increment(), 2)
+        self.assertEqual(data_store.service_plans_list, {"5": {"plan_id": "5"}})
+
+    def test_file_round_trip(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'store.snapshot')
+        self.addCleanup(os.rmdir, directory)
+        self.addCleanup(os.remove, path)
+
+        snapshot.save(self.data_store, path)
+        restored = DataStore()
+        restored.clients = [{"clientid": "9"}]
+        snapshot.load(restored, path)
+
+        self.assertEqual(os.listdir(directory), ['store.snapshot'])
+        self.assertIsNone(restored.clients.lookup("clientid", "9"))
+        self._assert_restored(restored)
+
+    def test_bytes_round_trip(self):
+        restored = DataStore()
+        snapshot.loads(restored, snapshot.dumps(self.data_store))
+
+        self._assert_restored(restored)
+
+    def test_roles_added_with_acls_round_trip(self):
+        with Flask(__name__).app_context():
+            role_id = IWeb(self.data_store).acl_admin_role_add(MultiDict({
+                "name": "ops", "descr": "Ops", "acls[admin.portal][read]": "1", "acls[admin.portal][update]": "1"
+            })).get_json()["data"]
+
+        restored = DataStore()
+        snapshot.loads(restored, snapshot.dumps(self.data_store))
+
+        self.assertEqual(restored.roles[role_id]["acls"], {"admin.portal": {"read": "1", "update": "1"}})
+
+    def test_canned_order_errors_round_trip(self):
+        self.data_store.order = {"1": FakeUbersmithError(code=999, message="epic fail")}
+
+        restored = DataStore()
+        snapshot.loads(restored, snapshot.dumps(self.data_store))
+
+        error = restored.order["1"]
+        self.assertIsInstance(error, FakeUbersmithError)
+        self.assertEqual((error.code, error.message), (999, "epic fail"))
+
+    def test_empty_store_round_trip(self):
+        restored = DataStore()
+        snapshot.loads(restored, snapshot.dumps(DataStore()))
+
+        self.assertEqual(restored.collection_sizes(), DataStore().collection_sizes())
+
+    def test_not_a_snapshot(self):
+        with self.assertRaisesRegex(snapshot.SnapshotError, "Not a fake-ubersmith snapshot"):
+            snapshot.loads(DataStore(), b'{"clients": []}')
+
+    def test_other_version(self):
+        with self.assertRaisesRegex(snapshot.SnapshotError, "Unsupported snapshot version"):
+            snapshot.loads(DataStore(), snapshot.MAGIC + bytes([snapshot.VERSION + 1]))
+
+    def test_truncated_snapshot_leaves_the_store_untouched(self):
+        data = snapshot.dumps(self.data_store)
+
+        with self.assertRaisesRegex(snapshot.SnapshotError, "Corrupted snapshot"):
+            snapshot.loads(self.data_store, data[:-10])
+        self.assertIsNotNone(self.data_store.clients.lookup("clientid", "1"))
+
+    def test_only_builtin_types_are_unpickled(self):
+        data = snapshot.MAGIC + bytes([snapshot.VERSION]) + pickle.dumps({"clients": os.getcwd}, protocol=4)
+
+        with self.assertRaisesRegex(snapshot.SnapshotError, "Forbidden global"):
+            snapshot.loads(DataStore(), data)
+
+    def test_values_are_pickled_like_snapshots(self):
+        value = snapshot.unpickle_value(snapshot.pickle_value(("insert", "clients", MultiDict({"clientid": "1"}))))
+
+        self.assertEqual(value, ("insert", "clients", {"clientid": "1"}))
+        with self.assertRaisesRegex(snapshot.SnapshotError, "Forbidden global"):
+            snapshot.unpickle_value(pickle.dumps(os.getcwd, protocol=4))
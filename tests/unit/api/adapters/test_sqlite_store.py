@@ -0,0 +1,264 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from flask import Flask
+
+from fake_ubersmith.api.adapters import snapshot
+from fake_ubersmith.api.adapters.acl_tree import AclTreeError
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.adapters.ids import SequentialIds
+from fake_ubersmith.api.adapters.sqlite_store import SqliteStore
+from fake_ubersmith.api.methods.client import Client
+from fake_ubersmith.api.methods.order import Order
+from fake_ubersmith.api.methods.uber import Uber
+from fake_ubersmith.api.ubersmith import FakeUbersmithError, UbersmithBase
+
+
+def _add_clients(path, count):
+    store = SqliteStore(path, ids=SequentialIds())
+    for _ in range(count):
+        with store.writing("clients"):
+            store.insert("clients", {"clientid": str(store.ids.next_id("clients"))})
+    store.close()
+
+
+class SqliteStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'store.sqlite')
+        self.store = self.open_store()
+
+    def open_store(self):
+        store = SqliteStore(self.path, ids=SequentialIds())
+        self.addCleanup(store.close)
+        return store
+
+
+class TestSqliteStore(SqliteStoreTestCase):
+    def test_records_are_looked_up_by_index(self):
+        self.store.load("contacts", [
+            {"contact_id": "1", "client_id": "100", "login": "john"},
+            {"contact_id": "2", "client_id": "100", "login": "jane"},
+            {"contact_id": "3", "client_id": "101", "login": "joe"},
+        ])
+
+        self.assertEqual(self.store.lookup("contacts", "login", "jane")["contact_id"], "2")
+        self.assertIsNone(self.store.lookup("contacts", "login", "jack"))
+        self.assertEqual(
+            [c["contact_id"] for c in self.store.lookup_all("contacts", "client_id", "100")],
+            ["1", "2"]
+        )
+        self.assertEqual([c["login"] for c in self.store.records("contacts")], ["john", "jane", "joe"])
+
+    def test_nested_keys_are_indexed(self):
+        self.store.insert("coupons", {"coupon": {"coupon_code": "1"}})
+
+        self.assertEqual(self.store.lookup("coupons", "coupon_code", "1"), {"coupon": {"coupon_code": "1"}})
+
+    def test_updating_a_record_moves_it_in_the_index(self):
+        self.store.insert("clients", {"clientid": "1", "login": "john"})
+
+        self.store.update("clients", self.store.lookup("clients", "clientid", "1"), {"login": "jane"})
+
+        self.assertIsNone(self.store.lookup("clients", "login", "john"))
+        self.assertEqual(self.store.lookup("clients", "login", "jane"), {"clientid": "1", "login": "jane"})
+
+    def test_mappings_keep_their_items(self):
+        self.assertIsNone(self.store.items("service_plans_list"))
+        self.assertEqual(self.store.items("roles"), {})
+
+        self.store.update_items("service_plans_list", [])
+        self.store.set_item("roles", "1", {"name": "admin"})
+        self.store.set_item("roles", "1", {"name": "owner"})
+
+        self.assertEqual(self.store.items("service_plans_list"), {})
+        self.assertEqual(self.store.get_item("roles", "1"), {"name": "owner"})
+        self.assertEqual(self.store.get_item("roles", "2", "missing"), "missing")
+
+    def test_updated_items_keep_their_order_and_last_value(self):
+        self.store.update_items("roles", [("1", "a"), ("2", "b")])
+        self.store.update_items("roles", [("3", "c"), ("1", "d"), ("3", "e")])
+
+        self.assertEqual(list(self.store.items("roles").items()), [("1", "d"), ("2", "b"), ("3", "e")])
+
+    def test_only_builtin_types_are_unpickled_from_the_database(self):
+        self.store.set_item("roles", "1", {"name": "admin"})
+        connection = sqlite3.connect(self.path)
+        with connection:
+            connection.execute("UPDATE items SET value = ?", (pickle.dumps(os.getcwd, protocol=4),))
+        connection.close()
+
+        with self.assertRaisesRegex(snapshot.SnapshotError, "Forbidden global"):
+            self.store.get_item("roles", "1")
+
+    def test_counters_only_ever_advance(self):
+        self.assertEqual([self.store.ids.next_id("clients") for _ in range(3)], [1, 2, 3])
+        with self.store.writing("acl_resources"):
+            self.store._advance("acl_resources", 5)
+            self.store._advance("acl_resources", 2)
+
+        self.assertEqual(self.store.add_acl_resource({"resource_id": None, "name": "root", "parent_id": "0"}), "6")
+
+    def test_events_are_paged_and_never_dropped(self):
+        for i in range(5):
+            self.store.append_event({"event": i})
+
+        events, next_cursor, first_cursor = self.store.read_events(3, limit=10)
+
+        self.assertEqual(events, [{"event": 3}, {"event": 4}])
+        self.assertEqual((next_cursor, first_cursor), (5, 0))
+
+    def test_acl_resources_form_a_tree(self):
+        root_id = self.store.add_acl_resource({"resource_id": None, "name": "root", "parent_id": "0"})
+        self.store.add_acl_resource({"resource_id": None, "name": "child", "parent_id": root_id})
+
+        tree = self.store.acl_tree()
+
+        self.assertEqual(list(tree), ["1"])
+        self.assertEqual(tree.find("child")["lft"], "2")
+
+    def test_acl_resources_that_do_not_fit_the_tree_are_not_loaded(self):
+        with self.assertRaises(AclTreeError):
+            self.store.load_acl_resources([
+                {"resource_id": None, "name": "root", "parent_id": "0"},
+                {"resource_id": None, "name": "orphan", "parent_id": "99"},
+            ])
+
+        self.assertEqual(len(self.store.acl_tree()), 0)
+        self.assertEqual(self.store.add_acl_resource({"resource_id": None, "name": "root", "parent_id": "0"}), "1")
+
+    def test_acl_resources_without_an_id_never_get_one_given_in_the_same_batch(self):
+        self.store.load_acl_resources([
+            {"resource_id": None, "name": "first root", "parent_id": "0"},
+            {"resource_id": "2", "name": "second root", "parent_id": "0"},
+        ])
+
+        tree = self.store.acl_tree()
+
+        self.assertEqual(tree["2"]["name"], "second root")
+        self.assertEqual(tree["3"]["name"], "first root")
+        self.assertEqual(self.store.add_acl_resource({"resource_id": None, "name": "next", "parent_id": "0"}), "4")
+
+    def test_failed_writes_are_rolled_back(self):
+        with self.assertRaises(RuntimeError), self.store.writing("clients"):
+            self.store.insert("clients", {"clientid": "1"})
+            raise RuntimeError()
+
+        self.assertEqual(self.store.records("clients"), [])
+
+    def test_flush_empties_the_store(self):
+        self.store.insert("clients", {"clientid": "1"})
+        self.store.set_item("roles", "1", {})
+        self.store.append_event({})
+        self.store.add_acl_resource({"resource_id": None, "name": "root", "parent_id": "0"})
+        self.store.ids.next_id("clients")
+
+        self.store.flush()
+
+        self.assertEqual(set(self.store.collection_sizes().values()), {0})
+        self.assertEqual(self.store.ids.next_id("clients"), 1)
+
+    def test_versions_grow_with_the_writes_of_their_collection_even_across_flushes(self):
+        other = self.open_store()
+        versions = self.store.versions("clients", "contacts")
+
+        with self.store.writing("clients"):
+            self.store.insert("clients", {"clientid": "1"})
+
+        self.assertEqual(other.versions("clients", "contacts"), (versions[0] + 1, versions[1]))
+
+        self.store.flush()
+
+        self.assertEqual(other.versions("clients", "contacts"), (versions[0] + 2, versions[1] + 1))
+
+    def test_stores_opening_the_same_database_share_it(self):
+        other = self.open_store()
+
+        self.store.insert("clients", {"clientid": str(self.store.ids.next_id("clients"))})
+        self.store.add_acl_resource({"resource_id": None, "name": "root", "parent_id": "0"})
+
+        self.assertEqual(other.lookup("clients", "clientid", "1"), {"clientid": "1"})
+        self.assertIsNotNone(other.acl_tree().find("root"))
+        self.assertEqual(other.ids.next_id("clients"), 2)
+
+    def test_processes_never_allocate_the_same_id(self):
+        processes = [multiprocessing.Process(target=_add_clients, args=(self.path, 25)) for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+        client_ids = [client["clientid"] for client in self.store.records("clients")]
+        self.assertEqual(len(client_ids), 100)
+        self.assertEqual(len(set(client_ids)), 100)
+
+    def test_snapshots_are_interchangeable_with_the_memory_store(self):
+        data_store = DataStore(ids=SequentialIds())
+        data_store.clients = [{"clientid": "1", "login": "john"}]
+        data_store.roles["3"] = {"name": "admin"}
+        data_store.user_mapping["4"]["roles"].add("3")
+        data_store.acl_resources_counter.increment()
+
+        snapshot.loads(self.store, snapshot.dumps(data_store))
+        restored = DataStore()
+        snapshot.loads(restored, snapshot.dumps(self.store))
+
+        self.assertEqual(self.store.lookup("clients", "login", "john"), {"clientid": "1", "login": "john"})
+        self.assertEqual(self.store.get_item("user_mapping", "4"), {"roles": {"3"}})
+        self.assertEqual(restored.roles, {"3": {"name": "admin"}})
+        self.assertEqual(restored.user_mapping["4"]["roles"], {"3"})
+        self.assertEqual(restored.acl_resources_counter.increment(), 2)
+
+
+class TestSqliteStoreHandlers(SqliteStoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.app = Flask(__name__)
+        base_uber_api = UbersmithBase(self.store)
+        Client(self.store).hook_to(base_uber_api)
+        Uber(self.store).hook_to(base_uber_api)
+        Order(self.store).hook_to(base_uber_api)
+        base_uber_api.hook_to(self.app)
+
+    def _call(self, **data):
+        with self.app.test_client() as c:
+            return json.loads(c.post('api/2.0/', data=data).data.decode('utf-8'))
+
+    def test_clients_are_served_from_the_database(self):
+        client_id = self._call(method="client.add", first="John", uber_login="john", uber_pass="secret")["data"]
+        self._call(method="client.update", client_id=client_id, uber_login="jane")
+
+        self.assertEqual(self._call(method="client.get", client_id=client_id)["data"]["login"], "jane")
+        self.assertEqual(len(self._call(method="client.contact_list", client_id=client_id)["data"]), 1)
+        self.assertEqual(
+            self._call(method="uber.check_login", login="jane", **{"pass": "secret"})["data"]["id"],
+            client_id
+        )
+
+    def test_canned_order_errors_are_served_from_the_database(self):
+        self.store.update_items("order", [("1", FakeUbersmithError(code=999, message="epic fail"))])
+
+        self.assertEqual(
+            self._call(method="order.create", order_queue_id="1"),
+            {"status": False, "error_code": 999, "error_message": "epic fail", "data": ""}
+        )
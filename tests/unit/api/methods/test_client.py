@@ -12,11 +12,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
-from unittest import mock
 
 from flask import Flask
 
 from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.adapters.ids import SequentialIds
 from fake_ubersmith.api.methods.client import Client
 from fake_ubersmith.api.ubersmith import FakeUbersmithError, UbersmithBase
 from tests.unit.api.methods import ApiTestBase
@@ -25,7 +25,7 @@ from tests.unit.api.methods import ApiTestBase
 class TestClientModule(ApiTestBase):
     def setUp(self):
         self.maxDiff = 9001
-        self.data_store = DataStore()
+        self.data_store = DataStore(ids=SequentialIds())
         self.client = Client(self.data_store)
 
         self.app = Flask(__name__)
@@ -60,9 +60,7 @@ class TestClientModule(ApiTestBase):
         self.assertEqual(self.data_store.contacts[0]["client_id"], body.get("data"))
         self.assertEqual(self.data_store.contacts[0]["description"], "Primary Contact")
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_update_a_client(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_update_a_client(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "first": "name",
@@ -92,9 +90,7 @@ class TestClientModule(ApiTestBase):
                 }
             )
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_update_a_client_metadata(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_update_a_client_metadata(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "first": "name",
@@ -124,9 +120,7 @@ class TestClientModule(ApiTestBase):
                                                           "variable": "fake_metadata2"}),
                                  content="Les Antipodes")
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_update_a_client_metadata_return_0_if_nothing_is_found(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_update_a_client_metadata_return_0_if_nothing_is_found(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "first": "name",
@@ -172,9 +166,7 @@ class TestClientModule(ApiTestBase):
             }
         )
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_get_returns_successfully_with_acls_returns_an_empty_list(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_get_returns_successfully_with_acls_returns_an_empty_list(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "first": "John"}),
@@ -189,9 +181,7 @@ class TestClientModule(ApiTestBase):
                     "listed_company": ", John"
                 })
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_get_returns_listed_company_that_is_the_company(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_get_returns_listed_company_that_is_the_company(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "company": "CompanyName"}),
@@ -205,9 +195,7 @@ class TestClientModule(ApiTestBase):
                     "listed_company": "CompanyName"
                 })
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_get_returns_listed_company_that_is_first_and_last_when_no_company(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_get_returns_listed_company_that_is_first_and_last_when_no_company(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "first": "John",
@@ -225,9 +213,7 @@ class TestClientModule(ApiTestBase):
                     "last": "Smith"
                 })
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_contact_get_returns_listed_company_that_is_the_company(self, random_id_mock):
-        random_id_mock.side_effect = [1, 2, 3]
+    def test_contact_get_returns_listed_company_that_is_the_company(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "company": "CompanyName"}),
@@ -237,12 +223,12 @@ class TestClientModule(ApiTestBase):
                                             "method": "client.contact_add",
                                             "client_id": "1"
                                         }),
-                                 content="3")
+                                 content="2")
 
             self._assert_success(
-                c.post('api/2.0/', data={"method": "client.contact_get", "contact_id": "3"}),
+                c.post('api/2.0/', data={"method": "client.contact_get", "contact_id": "2"}),
                 content={
-                    "contact_id": "3",
+                    "contact_id": "2",
                     "client_id": "1",
                     "email_name": "",
                     "email_domain": "",
@@ -254,9 +240,7 @@ class TestClientModule(ApiTestBase):
                     "listed_company": "CompanyName"
                 })
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_contact_get_returns_listed_company_that_is_first_and_last_when_no_company(self, random_id_mock):
-        random_id_mock.side_effect = [1, 2, 3]
+    def test_contact_get_returns_listed_company_that_is_first_and_last_when_no_company(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "first": "John",
@@ -268,12 +252,12 @@ class TestClientModule(ApiTestBase):
                                             "method": "client.contact_add",
                                             "client_id": "1"
                                         }),
-                                 content="3")
+                                 content="2")
 
             self._assert_success(
-                c.post('api/2.0/', data={"method": "client.contact_get", "contact_id": "3"}),
+                c.post('api/2.0/', data={"method": "client.contact_get", "contact_id": "2"}),
                 content={
-                    "contact_id": "3",
+                    "contact_id": "2",
                     "client_id": "1",
                     "email_name": "",
                     "email_domain": "",
@@ -325,9 +309,7 @@ class TestClientModule(ApiTestBase):
             }
         )
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_contact_add_creates_a_contact(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_contact_add_creates_a_contact(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/',
                                         data={
@@ -360,9 +342,7 @@ class TestClientModule(ApiTestBase):
                     "last": ""
                 })
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_contact_get_by_user_login(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_contact_get_by_user_login(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/',
                                         data={
@@ -395,9 +375,7 @@ class TestClientModule(ApiTestBase):
                     "last": ""
                 })
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_contact_update(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_contact_update(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/',
                                         data={
@@ -546,6 +524,41 @@ class TestClientModule(ApiTestBase):
             }
         )
 
+    def test_client_contact_list_pages_and_projects_contacts(self):
+        self.data_store.contacts.extend([
+            {"contact_id": str(i), "client_id": "100", "real_name": "Contact {}".format(i)}
+            for i in range(5)
+        ])
+
+        with self.app.test_client() as c:
+            resp = c.post(
+                'api/2.0/',
+                data={
+                    "method": "client.contact_list",
+                    "client_id": "100",
+                    "offset": "3",
+                    "limit": "10",
+                    "fields": "real_name"
+                }
+            )
+
+        self.assertEqual(
+            json.loads(resp.data.decode('utf-8'))["data"],
+            {"3": {"real_name": "Contact 3"}, "4": {"real_name": "Contact 4"}}
+        )
+
+    def test_client_contact_list_with_invalid_paging_returns_error(self):
+        with self.app.test_client() as c:
+            resp = c.post(
+                'api/2.0/',
+                data={"method": "client.contact_list", "client_id": "100", "limit": "many"}
+            )
+
+        self.assertEqual(
+            json.loads(resp.data.decode('utf-8'))["error_message"],
+            "offset and limit must be integers"
+        )
+
     def test_client_contact_list_with_bad_client_id_returns_error(self):
         with self.app.test_client() as c:
             resp = c.post(
@@ -687,6 +700,20 @@ class TestClientModule(ApiTestBase):
             }
         )
 
+    def test_client_cc_info_pages_credit_cards(self):
+        self.data_store.credit_cards = [{"clientid": "1", "billing_info_id": str(i)} for i in range(3)]
+
+        with self.app.test_client() as c:
+            resp = c.post(
+                'api/2.0/',
+                data={"method": "client.cc_info", "client_id": "1", "offset": "1", "limit": "1"}
+            )
+
+        self.assertEqual(
+            json.loads(resp.data.decode('utf-8'))["data"],
+            {"1": {"clientid": "1", "billing_info_id": "1"}}
+        )
+
     def test_client_cc_info_fails(self):
         self.data_store.credit_cards = [
             {
@@ -753,9 +780,7 @@ class TestClientModule(ApiTestBase):
             }
         )
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_contact_permission_set_and_list_one_negative_contact_permissions(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_contact_permission_set_and_list_one_negative_contact_permissions(self):
         with self.app.test_client() as c:
             c.post('api/2.0/',
                    data={
@@ -792,9 +817,7 @@ class TestClientModule(ApiTestBase):
                                  'resource_id': '123',
                                  'rgt': ''}})
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_contact_permission_set_and_list_one_positive_contact_permissions(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_contact_permission_set_and_list_one_positive_contact_permissions(self):
         with self.app.test_client() as c:
             c.post('api/2.0/',
                    data={
@@ -831,9 +854,7 @@ class TestClientModule(ApiTestBase):
                                  'resource_id': '123',
                                  'rgt': ''}})
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_contact_permission_set_and_list_all_negative_contact_permissions(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_contact_permission_set_and_list_all_negative_contact_permissions(self):
         with self.app.test_client() as c:
             c.post('api/2.0/',
                    data={
@@ -888,9 +909,7 @@ class TestClientModule(ApiTestBase):
                                  'resource_id': '123',
                                  'rgt': ''}})
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_contact_permission_set_and_list_all_positive_contact_permissions(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_contact_permission_set_and_list_all_positive_contact_permissions(self):
         with self.app.test_client() as c:
             c.post('api/2.0/',
                    data={
@@ -945,9 +964,7 @@ class TestClientModule(ApiTestBase):
                                  'resource_id': '123',
                                  'rgt': ''}})
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_contact_permission_set_and_list_mixed_contact_permissions(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_contact_permission_set_and_list_mixed_contact_permissions(self):
         with self.app.test_client() as c:
             c.post('api/2.0/',
                    data={
@@ -990,9 +1007,7 @@ class TestClientModule(ApiTestBase):
                                  'resource_id': '123',
                                  'rgt': ''}})
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_client_contact_permission_list_without_previous_permission_set_does_not_fail(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_client_contact_permission_list_without_previous_permission_set_does_not_fail(self):
         with self.app.test_client() as c:
             c.post('api/2.0/',
                    data={
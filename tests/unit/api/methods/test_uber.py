@@ -12,11 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
-from unittest import mock
+from unittest.mock import patch
 
 from flask import Flask
 
 from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.adapters.ids import SequentialIds
 from fake_ubersmith.api.methods.client import Client
 from fake_ubersmith.api.methods.uber import Uber
 from fake_ubersmith.api.ubersmith import FakeUbersmithError, UbersmithBase
@@ -26,7 +27,7 @@ from tests.unit.api.methods import ApiTestBase
 class TestUberModule(ApiTestBase):
 
     def setUp(self):
-        self.data_store = DataStore()
+        self.data_store = DataStore(ids=SequentialIds())
         self.uber = Uber(self.data_store)
         self.client = Client(self.data_store)
 
@@ -145,9 +146,23 @@ class TestUberModule(ApiTestBase):
             }
         )
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_check_login_succesfully_for_client(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_service_plan_list_pages_and_projects_plans(self):
+        self.data_store.service_plans_list = {
+            str(i): {"plan_id": str(i), "code": "42", "label": "Plan {}".format(i)} for i in range(4)
+        }
+
+        with self.app.test_client() as c:
+            resp = c.post(
+                'api/2.0/',
+                data={"method": "uber.service_plan_list", "offset": "2", "fields": "label"}
+            )
+
+        self.assertEqual(
+            json.loads(resp.data.decode('utf-8'))["data"],
+            {"2": {"label": "Plan 2"}, "3": {"label": "Plan 3"}}
+        )
+
+    def test_check_login_succesfully_for_client(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "first": "name",
@@ -178,9 +193,7 @@ class TestUberModule(ApiTestBase):
                 }
             )
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_check_login_succesfully_for_client_bare_info(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_check_login_succesfully_for_client_bare_info(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/', data={"method": "client.add",
                                                           "uber_login": "login",
@@ -241,9 +254,7 @@ class TestUberModule(ApiTestBase):
             }
         )
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_check_login_successfully_for_contact(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_check_login_successfully_for_contact(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/',
                                         data={
@@ -276,9 +287,7 @@ class TestUberModule(ApiTestBase):
                 }
             )
 
-    @mock.patch("fake_ubersmith.api.methods.client.a_random_id")
-    def test_check_login_successfully_for_contact_bare_info(self, random_id_mock):
-        random_id_mock.return_value = 1
+    def test_check_login_successfully_for_contact_bare_info(self):
         with self.app.test_client() as c:
             self._assert_success(c.post('api/2.0/',
                                         data={
@@ -309,6 +318,41 @@ class TestUberModule(ApiTestBase):
                 }
             )
 
+    def test_check_login_follows_credential_updates(self):
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "client.add", "uber_login": "john", "uber_pass": "smith"})
+            c.post('api/2.0/', data={"method": "client.contact_add", "client_id": "1", "login": "jane",
+                                     "password": "doe"})
+            c.post('api/2.0/', data={"method": "client.update", "client_id": "1", "uber_login": "jack"})
+            c.post('api/2.0/', data={"method": "client.contact_update", "contact_id": "2", "password": "roe"})
+
+            def check_login(login, password):
+                return json.loads(c.post('api/2.0/', data={"method": "uber.check_login", "login": login,
+                                                           "pass": password}).data.decode('utf-8'))["data"]
+
+            self.assertEqual(check_login("john", "smith"), "")
+            self.assertEqual(check_login("jack", "smith")["client_id"], "1")
+            self.assertEqual(check_login("jane", "doe"), "")
+            self.assertEqual(check_login("jane", "roe")["id"], "1-2")
+
+    def test_check_login_falls_back_to_contacts_sharing_a_client_login(self):
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "client.add", "uber_login": "john", "uber_pass": "smith"})
+            c.post('api/2.0/', data={"method": "client.contact_add", "client_id": "1", "login": "john",
+                                     "password": "doe"})
+
+            resp = c.post('api/2.0/', data={"method": "uber.check_login", "login": "john", "pass": "doe"})
+
+        self.assertEqual(json.loads(resp.data.decode('utf-8'))["data"]["type"], "contact")
+
+    def test_check_login_does_not_scan_the_records(self):
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "client.add", "uber_login": "john", "uber_pass": "smith"})
+            with patch.object(self.data_store, 'records', side_effect=AssertionError("scanned")):
+                resp = c.post('api/2.0/', data={"method": "uber.check_login", "login": "john", "pass": "smith"})
+
+        self.assertEqual(json.loads(resp.data.decode('utf-8'))["data"]["type"], "client")
+
     def test_get_admin_roles_when_passing_valid_user_id_and_role_id(self):
         role_id = "some_role_id"
         self.data_store.roles = {
@@ -506,8 +550,8 @@ class TestUberModule(ApiTestBase):
                         "resource_id": "1",
                         "name": "my.resource",
                         "parent_id": "0",
-                        "lft": "0",
-                        "rgt": "0",
+                        "lft": "1",
+                        "rgt": "6",
                         "active": "1",
                         "label": "my label",
                         "actions": {
@@ -521,8 +565,8 @@ class TestUberModule(ApiTestBase):
                                 "resource_id": "2",
                                 "name": "my.child1",
                                 "parent_id": "1",
-                                "lft": "0",
-                                "rgt": "0",
+                                "lft": "2",
+                                "rgt": "5",
                                 "active": "1",
                                 "label": "my label 2",
                                 "actions": {
@@ -533,8 +577,8 @@ class TestUberModule(ApiTestBase):
                                         "resource_id": "3",
                                         "name": "my.child2",
                                         "parent_id": "2",
-                                        "lft": "0",
-                                        "rgt": "0",
+                                        "lft": "3",
+                                        "rgt": "4",
                                         "active": "1",
                                         "label": "my label 3",
                                         "actions": {
@@ -551,6 +595,23 @@ class TestUberModule(ApiTestBase):
                     }
                 })
 
+    def test_acl_resource_list_pages_root_resources_with_their_projected_subtree(self):
+        with self.app.test_client() as c:
+            for name, parent in (("a", ""), ("b", ""), ("b.child", "b")):
+                c.post('api/2.0/', data={"method": "uber.acl_resource_add",
+                                         "parent_resource_name": parent,
+                                         "resource_name": name})
+
+            self._assert_success(
+                c.post('api/2.0/', data={"method": "uber.acl_resource_list",
+                                         "offset": "1",
+                                         "limit": "1",
+                                         "fields": "name,children"}),
+                content={"2": {"name": "b", "children": {"3": {"name": "b.child", "children": []}}}}
+            )
+
+        self.assertIn("label", self.data_store.acl_resources["2"]["children"]["3"])
+
     def test_acl_resource_add_error(self):
         with self.app.test_client() as c:
             self._assert_error(c.post('api/2.0/', data={"method": "uber.acl_resource_add",
@@ -71,6 +71,38 @@ class TestIwebModule(unittest.TestCase):
 
         )
 
+    def test_event_log_list_pages_with_a_cursor(self):
+        for i in range(3):
+            self.data_store.event_log.append({"event_type": str(i)})
+
+        with self.app.test_client() as c:
+            resp = c.post(
+                'api/2.0/',
+                data={"method": "iweb.event_log_list", "cursor": "1", "limit": "1"}
+            )
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(
+            json.loads(resp.data.decode('utf-8'))["data"],
+            {
+                "events": [{"event_type": "1"}],
+                "next_cursor": 2,
+                "first_cursor": 0
+            }
+        )
+
+    def test_event_log_list_with_an_invalid_cursor_fails(self):
+        with self.app.test_client() as c:
+            resp = c.post(
+                'api/2.0/',
+                data={"method": "iweb.event_log_list", "cursor": "abc"}
+            )
+
+        self.assertEqual(
+            json.loads(resp.data.decode('utf-8'))["error_message"],
+            "Invalid cursor or limit specified"
+        )
+
     def test_add_role_successfully(self):
         with self.app.test_client() as c:
             resp = c.post(
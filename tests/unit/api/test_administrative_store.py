@@ -0,0 +1,50 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import unittest
+
+from flask import Flask
+
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.administrative_store import AdministrativeStore
+
+
+class TestAdministrativeStore(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.data_store = DataStore()
+        AdministrativeStore(self.data_store).hook_to(self.app)
+
+    def test_snapshot_round_trip(self):
+        self.data_store.clients = [{"clientid": "1"}]
+        with self.app.test_client() as c:
+            snapshot = c.get('/__snapshot')
+        self.assertEqual(snapshot.status_code, 200)
+        self.assertEqual(snapshot.headers['Content-Type'], 'application/octet-stream')
+
+        self.data_store.flush()
+        with self.app.test_client() as c:
+            resp = c.put('/__snapshot', data=snapshot.data)
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.data.decode('utf-8'))['data']['clients'], 1)
+        self.assertEqual(self.data_store.clients.lookup("clientid", "1"), {"clientid": "1"})
+
+    def test_invalid_snapshot(self):
+        with self.app.test_client() as c:
+            resp = c.put('/__snapshot', data=b'garbage')
+
+        body = json.loads(resp.data.decode('utf-8'))
+        self.assertFalse(body['status'])
+        self.assertEqual(body['error_message'], "Not a fake-ubersmith snapshot")
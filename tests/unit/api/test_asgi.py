@@ -0,0 +1,182 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import asyncio
+import json
+import threading
+import time
+import unittest
+from urllib.parse import urlencode
+
+from flask import Flask
+
+from fake_ubersmith.api import namespaces
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.administrative_local import AdministrativeLocal
+from fake_ubersmith.api.asgi import AsgiApp
+from fake_ubersmith.api.methods.client import Client
+from fake_ubersmith.api.response_cache import ResponseCache
+from fake_ubersmith.api.ubersmith import UbersmithBase
+
+
+class TestAsgiApp(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.ubersmith_base = UbersmithBase(DataStore())
+        Client(self.ubersmith_base.data_store).hook_to(self.ubersmith_base)
+        self.ubersmith_base.hook_to(self.app)
+        AdministrativeLocal().hook_to(self.app)
+
+        self.asgi_app = AsgiApp(self.app, self.ubersmith_base)
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    async def _request(self, method, path, body=b'', content_type='application/x-www-form-urlencoded', headers=()):
+        messages = [
+            {'type': 'http.request', 'body': body[:5], 'more_body': True},
+            {'type': 'http.request', 'body': body[5:], 'more_body': False},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http', 'method': method, 'path': path, 'query_string': b'', 'root_path': '',
+            'headers': [(b'content-type', content_type.encode('latin-1'))] + list(headers),
+        }
+        await self.asgi_app(scope, receive, send)
+
+        self.assertEqual([m['type'] for m in sent], ['http.response.start', 'http.response.body'])
+        return sent[0]['status'], dict(sent[0]['headers']), sent[1]['body']
+
+    def _call(self, **form):
+        return self.loop.run_until_complete(self._request('POST', '/api/2.0/', urlencode(form).encode('utf-8')))
+
+    def test_methods_are_dispatched(self):
+        status, headers, body = self._call(method='client.add', first='John', uber_login='john')
+        client_id = json.loads(body.decode('utf-8'))['data']
+
+        status, headers, body = self._call(method='client.get', client_id=client_id)
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-type'], b'application/json')
+        self.assertEqual(json.loads(body.decode('utf-8'))['data']['login'], 'john')
+
+    def test_batch_is_dispatched(self):
+        status, _, body = self.loop.run_until_complete(self._request(
+            'POST', '/api/2.0/batch',
+            json.dumps([{"method": "client.contact_add", "params": {"client_id": 1}}]).encode('utf-8'),
+            content_type='application/json'
+        ))
+
+        self.assertEqual(status, 200)
+        self.assertTrue(json.loads(body.decode('utf-8'))[0]['status'])
+        self.assertEqual(len(self.ubersmith_base.data_store.contacts.lookup_all("client_id", "1")), 1)
+
+    def test_crash_mode_returns_a_500(self):
+        self.ubersmith_base.crash_mode = True
+
+        status, _, _ = self._call(method='client.get', client_id='1')
+
+        self.assertEqual(status, 500)
+
+    def test_missing_method_is_a_bad_request(self):
+        status, _, _ = self._call(client_id='1')
+
+        self.assertEqual(status, 400)
+
+    def test_other_routes_are_served_by_the_flask_app(self):
+        status, _, body = self.loop.run_until_complete(self._request('GET', '/status'))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body.decode('utf-8'))['data'], "Service is running")
+
+    def test_delays_are_awaited_concurrently(self):
+        self.ubersmith_base.register_delay_hook(lambda method: 0.2 if method == 'client.get' else None)
+        body = urlencode({'method': 'client.get', 'client_id': '1'}).encode('utf-8')
+
+        async def many():
+            return await asyncio.gather(*[self._request('POST', '/api/2.0/', body) for _ in range(20)])
+
+        start = time.perf_counter()
+        responses = self.loop.run_until_complete(many())
+
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual([status for status, _, _ in responses], [200] * 20)
+
+    def test_matching_if_none_match_is_answered_not_modified(self):
+        self.ubersmith_base.response_cache = ResponseCache(self.ubersmith_base.data_store)
+        _, _, body = self._call(method='client.add', first='John')
+        client_id = json.loads(body.decode('utf-8'))['data']
+        _, headers, _ = self._call(method='client.get', client_id=client_id)
+
+        status, not_modified_headers, body = self.loop.run_until_complete(self._request(
+            'POST', '/api/2.0/', urlencode({'method': 'client.get', 'client_id': client_id}).encode('utf-8'),
+            headers=[(b'if-none-match', headers[b'etag'])]
+        ))
+
+        self.assertEqual(status, 304)
+        self.assertEqual(not_modified_headers[b'etag'], headers[b'etag'])
+        self.assertEqual(body, b'')
+
+    def test_a_held_write_lock_does_not_block_other_requests(self):
+        locked, release, released = threading.Event(), threading.Event(), []
+
+        def hold():
+            with self.ubersmith_base.data_store.writing("clients"):
+                locked.set()
+                release.wait(2)
+            released.append(True)
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        self.addCleanup(holder.join)
+        self.addCleanup(release.set)
+        locked.wait()
+
+        async def scenario():
+            blocked = asyncio.ensure_future(self._request(
+                'POST', '/api/2.0/', urlencode({'method': 'client.get', 'client_id': '1'}).encode('utf-8')
+            ))
+            await asyncio.sleep(0.05)
+            status, _, _ = await self._request(
+                'POST', '/api/2.0/', urlencode({'method': 'client.contact_list', 'client_id': '1'}).encode('utf-8')
+            )
+            other_served_while_locked = not released
+            release.set()
+            await blocked
+            return status, other_served_while_locked
+
+        status, other_served_while_locked = self.loop.run_until_complete(scenario())
+
+        self.assertEqual(status, 200)
+        self.assertTrue(other_served_while_locked)
+
+    def test_namespaces_are_served(self):
+        self.ubersmith_base.serve_namespaces(lambda name: UbersmithBase(DataStore()))
+        body = urlencode({'method': 'hidden.enable_crash_mode'}).encode('utf-8')
+
+        self.loop.run_until_complete(self._request('POST', '/ns/job-1/api/2.0/', body))
+
+        self.assertTrue(self.ubersmith_base.api_for('job-1').crash_mode)
+        self.assertFalse(self.ubersmith_base.crash_mode)
+
+        status, _, _ = self.loop.run_until_complete(self._request(
+            'POST', '/api/2.0/', body, headers=[(namespaces.HEADER.lower().encode('latin-1'), b'job-2')]
+        ))
+        self.assertEqual(status, 200)
+        self.assertTrue(self.ubersmith_base.api_for('job-2').crash_mode)
@@ -0,0 +1,171 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import json
+import unittest
+
+from flask import Flask
+
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.adapters.ids import SequentialIds
+from fake_ubersmith.api.bulk_load import BulkLoad, BulkLoadError
+from fake_ubersmith.api.methods.client import Client
+from fake_ubersmith.api.methods.uber import Uber
+from fake_ubersmith.api.ubersmith import UbersmithBase
+
+
+class TestBulkLoad(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.data_store = DataStore()
+
+        base_uber_api = UbersmithBase(self.data_store)
+        Client(self.data_store).hook_to(base_uber_api)
+        Uber(self.data_store).hook_to(base_uber_api)
+        base_uber_api.hook_to(self.app)
+        BulkLoad(self.data_store).hook_to(self.app)
+
+    def _post(self, path, body):
+        with self.app.test_client() as c:
+            resp = c.post(path, data=body)
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.data.decode('utf-8'))
+
+    def _call(self, method, **params):
+        with self.app.test_client() as c:
+            resp = c.post('api/2.0/', data=dict(params, method=method))
+        return json.loads(resp.data.decode('utf-8'))
+
+    def test_ndjson_clients_are_loaded_and_indexed(self):
+        body = "\n".join(json.dumps(client) for client in [
+            {"clientid": 1, "first": "John", "uber_login": "john", "uber_pass": "secret"},
+            {"clientid": "2", "first": "Jane", "login": "jane"},
+        ]) + "\n"
+
+        payload = self._post('/__bulk/clients', body)
+
+        self.assertEqual(payload["data"], {"loaded": 2})
+        self.assertEqual(self.data_store.clients.lookup("clientid", "1")["login"], "john")
+        self.assertEqual(self._call('client.get', client_id='2')["data"]["first"], "Jane")
+        self.assertTrue(self._call('uber.check_login', login='john', **{'pass': 'secret'})["status"])
+
+    def test_json_array_of_contacts_is_loaded(self):
+        payload = self._post('/__bulk/contacts', json.dumps([
+            {"contact_id": "10", "client_id": "1", "login": "a"},
+            {"client_id": "1", "login": "b"},
+        ]))
+
+        self.assertEqual(payload["data"], {"loaded": 2})
+        self.assertEqual(len(self.data_store.contacts.lookup_all("client_id", "1")), 2)
+        self.assertIsNotNone(self.data_store.contacts.lookup("login", "b")["contact_id"])
+
+    def test_service_plans_are_also_listed(self):
+        self._post('/__bulk/service_plans', '{"plan_id": 1, "code": "abc"}\n{"plan_id": 2, "code": "def"}')
+
+        self.assertEqual(self._call('uber.service_plan_get', plan_id='1')["data"]["code"], "abc")
+        self.assertEqual(sorted(self._call('uber.service_plan_list')["data"]), ["1", "2"])
+
+    def test_coupons_roles_and_credit_cards_are_loaded(self):
+        self._post('/__bulk/coupons', '[{"coupon_code": 100}, {"coupon": {"coupon_code": "200"}}]')
+        self._post('/__bulk/roles', '{"role_id": 1, "name": "admin"}')
+        self._post('/__bulk/credit_cards', '{"billing_info_id": "5", "clientid": "1"}')
+
+        self.assertIsNotNone(self.data_store.coupons.lookup("coupon_code", "100"))
+        self.assertIsNotNone(self.data_store.coupons.lookup("coupon_code", "200"))
+        self.assertEqual(self.data_store.roles["1"]["name"], "admin")
+        self.assertEqual(len(self.data_store.credit_cards.lookup_all("clientid", "1")), 1)
+
+    def test_acl_resources_are_attached_to_their_parents(self):
+        self._call('uber.acl_resource_add', resource_name='root')
+
+        payload = self._post('/__bulk/acl_resources', "\n".join([
+            '{"resource_id": 12, "name": "grandchild", "parent_id": 11}',
+            '{"resource_id": 11, "name": "child", "parent_id": 1}',
+            '{"name": "other root"}',
+        ]))
+
+        self.assertEqual(payload["data"], {"loaded": 3})
+        resources = self.data_store.acl_resources
+        self.assertEqual(resources["1"]["children"]["11"]["children"]["12"]["name"], "grandchild")
+        self.assertEqual(resources["13"]["name"], "other root")
+
+        self._call('uber.acl_resource_add', resource_name='next')
+        self.assertIn("14", resources)
+
+    def test_acl_resources_without_an_id_never_get_one_given_in_the_same_batch(self):
+        payload = self._post('/__bulk/acl_resources', "\n".join([
+            '{"name": "first root"}',
+            '{"resource_id": 2, "name": "second root"}',
+        ]))
+
+        self.assertEqual(payload["data"], {"loaded": 2})
+        resources = self.data_store.acl_resources
+        self.assertEqual(resources["2"]["name"], "second root")
+        self.assertEqual(resources["3"]["name"], "first root")
+
+    def test_acl_resources_with_an_unknown_parent_load_nothing(self):
+        payload = self._post('/__bulk/acl_resources', '{"resource_id": 3, "name": "orphan", "parent_id": 2}')
+
+        self.assertFalse(payload["status"])
+        self.assertEqual(payload["error_message"], "Parent resource 2 of resource 3 not found")
+        self.assertEqual(self.data_store.acl_resources, {})
+
+    def test_malformed_body_loads_nothing(self):
+        payload = self._post('/__bulk/clients', '{"clientid": "1"}\n{"clientid": \n')
+
+        self.assertFalse(payload["status"])
+        self.assertEqual(payload["error_message"], "Invalid JSON on line 2")
+        self.assertEqual(len(self.data_store.clients), 0)
+
+    def test_non_object_record_loads_nothing(self):
+        payload = self._post('/__bulk/contacts', '[{"contact_id": "1"}, 2]')
+
+        self.assertFalse(payload["status"])
+        self.assertEqual(payload["error_message"], "Record 2 is not a JSON object")
+        self.assertEqual(len(self.data_store.contacts), 0)
+
+    def test_rejected_bodies_allocate_and_reserve_no_id(self):
+        data_store = DataStore(ids=SequentialIds())
+        bulk_load = BulkLoad(data_store)
+
+        for collection in ('clients', 'contacts', 'credit_cards', 'service_plans', 'roles'):
+            with self.assertRaises(BulkLoadError):
+                bulk_load.load(collection, io.BytesIO(b'{"first": "John"}\n{"clientid": 2, "contact_id": 2}\n[3]\n'))
+
+        self.assertEqual(data_store.ids.export_state(), {})
+        self.assertEqual(data_store.ids.next_id("clients"), 1)
+
+    def test_ids_given_in_a_body_are_never_allocated_to_its_other_records(self):
+        data_store = DataStore(ids=SequentialIds())
+
+        BulkLoad(data_store).load('clients', io.BytesIO(b'{"first": "John"}\n{"clientid": 1, "first": "Jane"}\n'))
+
+        self.assertEqual(data_store.clients.lookup("clientid", "1")["first"], "Jane")
+        self.assertEqual(data_store.clients.lookup("clientid", "2")["first"], "John")
+
+    def test_records_can_be_loaded_from_a_stream(self):
+        bulk_load = BulkLoad(self.data_store)
+
+        count = bulk_load.load('clients', io.BytesIO(b'{"clientid": "1"}\n{"clientid": "2"}\n'))
+
+        self.assertEqual(count, 2)
+        self.assertIsNotNone(self.data_store.clients.lookup("clientid", "2"))
+        with self.assertRaises(BulkLoadError):
+            bulk_load.load('nope', io.BytesIO(b'{}'))
+
+    def test_unknown_collection(self):
+        payload = self._post('/__bulk/nope', '{}')
+
+        self.assertFalse(payload["status"])
+        self.assertTrue(payload["error_message"].startswith("Unknown collection 'nope'"))
@@ -0,0 +1,88 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import Flask
+
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.capture import TrafficCapture
+from fake_ubersmith.api.methods.client import Client
+from fake_ubersmith.api.ubersmith import UbersmithBase
+
+
+class TestTrafficCapture(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'traffic.ndjson')
+
+        self.app = Flask(__name__)
+        data_store = DataStore()
+        self.base_uber_api = UbersmithBase(data_store)
+        self.base_uber_api.serve_namespaces(lambda name: UbersmithBase(DataStore()))
+        Client(data_store).hook_to(self.base_uber_api)
+        self.base_uber_api.hook_to(self.app)
+        self.base_uber_api.capture = TrafficCapture(self.path)
+        self.addCleanup(self.base_uber_api.capture.close)
+
+    def _captured(self):
+        self.base_uber_api.capture.close()
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_calls_are_captured_with_their_response(self):
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "client.add", "first": "John", "uber_login": "john"})
+            c.post('ns/job-42/api/2.0/', data={"method": "hidden.flush"})
+
+        added, flushed = self._captured()
+
+        self.assertEqual(added["method"], "client.add")
+        self.assertEqual(added["params"], {"first": "John", "uber_login": "john"})
+        self.assertIsNone(added["namespace"])
+        self.assertEqual(added["status"], 200)
+        self.assertTrue(added["response"]["status"])
+        self.assertGreaterEqual(added["duration"], 0)
+        self.assertEqual(flushed["namespace"], "job-42")
+        self.assertGreaterEqual(flushed["t"], added["t"])
+
+    def test_repeated_params_are_captured_as_lists(self):
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "client.get", "client_id": ["1", "2"]})
+
+        self.assertEqual(self._captured()[0]["params"], {"client_id": ["1", "2"]})
+
+    def test_failed_calls_are_captured_without_response(self):
+        self.app.testing = False
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "hidden.enable_crash_mode"})
+            c.post('api/2.0/', data={"method": "client.get", "client_id": "1"})
+
+        crashed = self._captured()[1]
+
+        self.assertEqual((crashed["status"], crashed["response"]), (500, None))
+
+    def test_batches_are_captured_whole(self):
+        calls = [{"method": "client.get", "params": {"client_id": "1"}}]
+        with self.app.test_client() as c:
+            c.post('api/2.0/batch', json={"calls": calls, "stop_on_error": True})
+
+        batch, = self._captured()
+
+        self.assertEqual(batch["batch"], {"calls": calls, "stop_on_error": True})
+        self.assertEqual(len(batch["response"]), 1)
@@ -0,0 +1,139 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import random
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.faults import Faults, Latency
+from fake_ubersmith.api.methods.client import Client
+from fake_ubersmith.api.ubersmith import UbersmithBase
+
+
+class TestFaults(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.ubersmith_base = UbersmithBase(DataStore())
+        self.faults = Faults(rng=random.Random(1))
+
+        Client(self.ubersmith_base.data_store).hook_to(self.ubersmith_base)
+        self.faults.hook_to(self.ubersmith_base)
+        self.ubersmith_base.hook_to(self.app)
+
+    def _call(self, method, **params):
+        with self.app.test_client() as c:
+            resp = c.post('api/2.0/', data=dict(params, method=method))
+        return json.loads(resp.data.decode('utf-8'))
+
+    def test_fixed_latency_applies_to_the_target_method(self):
+        self.assertTrue(self._call('hidden.set_latency', target_method='client.get', ms='250')['status'])
+
+        with mock.patch('fake_ubersmith.api.ubersmith.time.sleep') as m_sleep:
+            self._call('client.get', client_id='1')
+            self._call('client.contact_list', client_id='1')
+
+        m_sleep.assert_called_once_with(0.25)
+
+    def test_latency_set_under_a_fixed_pool_of_threads_is_warned_about(self):
+        with self.assertLogs(self.app.logger, 'INFO') as logs:
+            self._call('hidden.set_latency', target_method='client.get', ms='250')
+        self.assertFalse([r for r in logs.records if r.levelname == 'WARNING'])
+
+        self.faults.worker_threads = 8
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self._call('hidden.set_latency', target_method='client.get', ms='250')
+
+        self.assertIn("holds one of the 8 worker threads", logs.output[0])
+
+    def test_wildcard_latency_applies_to_methods_without_their_own(self):
+        self._call('hidden.set_latency', target_method='*', ms='100')
+        self._call('hidden.set_latency', target_method='client.get', ms='10')
+
+        self.assertEqual(self.faults.delay_for('client.get'), 0.01)
+        self.assertEqual(self.faults.delay_for('client.contact_list'), 0.1)
+        self.assertEqual(self.faults.delay_for('hidden.list_faults'), 0)
+
+    def test_distributions(self):
+        rng = random.Random(1)
+        uniform = Latency.from_form({'distribution': 'uniform', 'min_ms': '10', 'max_ms': '20'})
+        normal = Latency.from_form({'distribution': 'normal', 'mean_ms': '5', 'stddev_ms': '50'})
+        histogram = Latency.from_form({'distribution': 'histogram', 'buckets': '10:1,1000:0,100:1'})
+
+        self.assertTrue(all(0.01 <= uniform.sample(rng) <= 0.02 for _ in range(100)))
+        self.assertTrue(all(normal.sample(rng) >= 0 for _ in range(100)))
+        samples = [histogram.sample(rng) for _ in range(1000)]
+        self.assertTrue(all(0 <= s <= 0.1 for s in samples))
+        self.assertTrue(400 < len([s for s in samples if s <= 0.01]) < 600)
+
+    def test_slowdown_grows_with_requests_in_flight(self):
+        latency = Latency.from_form({'ms': '10', 'slowdown_ms': '5', 'slowdown_after': '2'})
+
+        self.assertEqual(latency.sample(random.Random(), in_flight=1), 0.01)
+        self.assertEqual(latency.sample(random.Random(), in_flight=2), 0.01)
+        self.assertEqual(latency.sample(random.Random(), in_flight=4), 0.02)
+
+    def test_requests_are_counted_in_flight(self):
+        self._call('hidden.set_latency', target_method='client.get', ms='0', slowdown_ms='1000', slowdown_after='0')
+
+        with mock.patch('fake_ubersmith.api.ubersmith.time.sleep') as m_sleep:
+            self._call('client.get', client_id='1')
+
+        m_sleep.assert_called_once_with(1.0)
+        self.assertEqual(self.ubersmith_base.in_flight.value, 0)
+
+    def test_invalid_latencies(self):
+        for params in ({}, {'ms': '-1'}, {'distribution': 'uniform', 'min_ms': '2', 'max_ms': '1'},
+                       {'distribution': 'histogram', 'buckets': '10:0'}, {'distribution': 'pareto'}):
+            result = self._call('hidden.set_latency', **params)
+            self.assertFalse(result['status'], params)
+            self.assertTrue(result['error_message'].startswith("Invalid latency: "))
+
+        self.assertEqual(self._call('hidden.list_faults')['data'], {"latencies": [], "errors": []})
+
+    def test_error_rate(self):
+        self._call('hidden.set_error_rate', target_method='client.get', rate='0.5', code='42', message='boom')
+
+        results = [self._call('client.get', client_id='1') for _ in range(200)]
+
+        errors = [r for r in results if r['error_code'] == 42]
+        self.assertTrue(60 < len(errors) < 140)
+        self.assertEqual(errors[0]['error_message'], 'boom')
+        self.assertEqual(self._call('client.contact_list', client_id='1')['error_code'], 1)
+
+    def test_errors_are_always_injected_at_rate_1(self):
+        self._call('hidden.set_error_rate', code='7')
+
+        self.assertEqual(self._call('client.get', client_id='1')['error_code'], 7)
+        self.assertTrue(self._call('hidden.list_faults')['status'])
+
+    def test_clear_faults(self):
+        self._call('hidden.set_error_rate', target_method='client.get')
+        self._call('hidden.set_latency', target_method='client.get', ms='1')
+        self._call('hidden.set_latency', target_method='client.contact_list', ms='1')
+
+        self._call('hidden.clear_faults', target_method='client.get')
+        faults = self._call('hidden.list_faults')['data']
+        self.assertEqual(list(faults['latencies']), ['client.contact_list'])
+        self.assertEqual(faults['errors'], [])
+
+        self._call('hidden.clear_faults')
+        self.assertEqual(self._call('hidden.list_faults')['data'], {"latencies": [], "errors": []})
+
+    def test_hidden_methods_are_spared_by_crash_mode(self):
+        self.ubersmith_base.crash_mode = True
+
+        self.assertTrue(self._call('hidden.set_latency', ms='1')['status'])
@@ -0,0 +1,98 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+from flask import Flask
+
+from fake_ubersmith.api import namespaces
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.methods.client import Client
+from fake_ubersmith.api.metrics import Metrics
+from fake_ubersmith.api.ubersmith import UbersmithBase
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.data_store = DataStore()
+        self.metrics = Metrics(self.data_store)
+
+        base_uber_api = UbersmithBase(self.data_store, metrics=self.metrics)
+        Client(self.data_store).hook_to(base_uber_api)
+        base_uber_api.hook_to(self.app)
+        self.metrics.hook_to(self.app)
+
+    def _scrape(self):
+        with self.app.test_client() as c:
+            resp = c.get('/metrics')
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers['Content-Type'].startswith('text/plain'))
+        return resp.data.decode('utf-8').splitlines()
+
+    def test_calls_are_counted_by_outcome(self):
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "client.add", "first": "John"})
+            c.post('api/2.0/', data={"method": "client.get", "client_id": "nope"})
+            c.post('api/2.0/', data={"method": "client.unknown"})
+            c.post('api/2.0/', data={"method": "hidden.enable_crash_mode"})
+            c.post('api/2.0/', data={"method": "client.add", "first": "John"})
+
+        lines = self._scrape()
+
+        self.assertIn('fake_ubersmith_requests_total{method="client.add",outcome="success",code=""} 1', lines)
+        self.assertIn('fake_ubersmith_requests_total{method="client.get",outcome="error",code="1"} 1', lines)
+        self.assertIn(
+            'fake_ubersmith_requests_total{method="client.unknown",outcome="exception",code="KeyError"} 1', lines
+        )
+        self.assertIn(
+            'fake_ubersmith_requests_total{method="client.add",outcome="exception",code="FakeUbersmithError"} 1',
+            lines
+        )
+
+    def test_latencies_are_recorded_in_histograms(self):
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "client.add", "first": "John"})
+            c.post('api/2.0/', data={"method": "client.add", "first": "Jane"})
+
+        lines = self._scrape()
+
+        self.assertIn('fake_ubersmith_request_duration_seconds_bucket{method="client.add",le="+Inf"} 2', lines)
+        self.assertIn('fake_ubersmith_request_duration_seconds_count{method="client.add"} 2', lines)
+        self.assertIn('fake_ubersmith_requests_in_flight{method="client.add"} 0', lines)
+
+    def test_store_collection_sizes_are_exposed(self):
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "client.add", "first": "John"})
+
+        lines = self._scrape()
+
+        self.assertIn('fake_ubersmith_store_records{collection="clients"} 1', lines)
+        self.assertIn('fake_ubersmith_store_records{collection="contacts"} 1', lines)
+
+    def test_store_collection_sizes_are_exposed_by_namespace(self):
+        job_store = DataStore()
+        job_store.clients = [{"clientid": "1"}, {"clientid": "2"}]
+        self.metrics.namespaces = namespaces.Namespaces(lambda name: UbersmithBase(job_store), default=None)
+        self.metrics.namespaces.get("job-1")
+
+        lines = self._scrape()
+
+        self.assertIn('fake_ubersmith_namespaces 1', lines)
+        self.assertIn('fake_ubersmith_store_records{collection="clients"} 0', lines)
+        self.assertIn('fake_ubersmith_store_records{namespace="job-1",collection="clients"} 2', lines)
+
+    def test_in_flight_calls_are_tracked(self):
+        self.metrics.start("client.get")
+
+        self.assertIn('fake_ubersmith_requests_in_flight{method="client.get"} 1', self.metrics.render().splitlines())
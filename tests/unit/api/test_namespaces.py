@@ -0,0 +1,107 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import unittest
+
+from fake_ubersmith.api import namespaces
+from fake_ubersmith.main import create_app
+
+
+class TestNamespaces(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app()
+        self.ubersmith_base = self.app.extensions['ubersmith_base']
+
+    def _call(self, path='api/2.0/', namespace=None, **data):
+        headers = {namespaces.HEADER: namespace} if namespace else {}
+        with self.app.test_client() as c:
+            resp = c.post(path, data=data, headers=headers)
+        return resp.status_code, json.loads(resp.data.decode('utf-8')) if resp.status_code == 200 else None
+
+    def _add_client(self, path='api/2.0/', namespace=None):
+        _, body = self._call(path, namespace, method='client.add', first='John')
+        return body['data']
+
+    def test_stores_are_isolated(self):
+        default_client = self._add_client()
+        header_client = self._add_client(namespace='job-1')
+        prefix_client = self._add_client(path='ns/job-2/api/2.0/')
+
+        self.assertTrue(self._call(method='client.get', client_id=default_client)[1]['status'])
+        self.assertFalse(self._call(method='client.get', client_id=header_client)[1]['status'])
+        self.assertTrue(self._call(namespace='job-1', method='client.get', client_id=header_client)[1]['status'])
+        self.assertFalse(self._call(namespace='job-1', method='client.get', client_id=prefix_client)[1]['status'])
+        self.assertTrue(self._call('ns/job-2/api/2.0/', method='client.get', client_id=prefix_client)[1]['status'])
+
+        self.assertEqual(self.ubersmith_base.namespaces.names(), ['job-1', 'job-2'])
+
+    def test_crash_mode_is_per_namespace(self):
+        self._call(namespace='job-1', method='hidden.enable_crash_mode')
+
+        self.assertEqual(self._call(namespace='job-1', method='client.get', client_id='1')[0], 500)
+        self.assertEqual(self._call(namespace='job-2', method='client.get', client_id='1')[0], 200)
+        self.assertEqual(self._call(method='client.get', client_id='1')[0], 200)
+
+    def test_fault_settings_are_per_namespace(self):
+        api = self.ubersmith_base.api_for('job-1')
+        self.assertTrue(api.has_method('client.cc_add'))
+        client_module = api.methods['client.cc_add'].__self__
+        client_module.credit_card_response = 42
+
+        self.assertEqual(self._call(namespace='job-1', method='client.cc_add')[1]['data'], 42)
+        self.assertEqual(self._call(namespace='job-2', method='client.cc_add')[1]['data'], 1)
+
+    def test_flushing_a_namespace_leaves_the_others_alone(self):
+        default_client = self._add_client()
+        job_client = self._add_client(namespace='job-1')
+
+        self.assertTrue(self._call(namespace='job-1', method='hidden.flush')[1]['status'])
+
+        self.assertFalse(self._call(namespace='job-1', method='client.get', client_id=job_client)[1]['status'])
+        self.assertTrue(self._call(method='client.get', client_id=default_client)[1]['status'])
+
+    def test_batch_and_bulk_load_follow_the_namespace(self):
+        with self.app.test_client() as c:
+            c.post('ns/job-1/__bulk/clients', data='{"clientid": "7"}\n')
+            c.post('api/2.0/batch', data=json.dumps([{"method": "client.add", "params": {"first": "Jane"}}]),
+                   headers={namespaces.HEADER: 'job-2'}, content_type='application/json')
+
+        self.assertIsNotNone(self.ubersmith_base.api_for('job-1').data_store.clients.lookup("clientid", "7"))
+        self.assertEqual(len(self.ubersmith_base.api_for('job-2').data_store.clients), 1)
+        self.assertEqual(len(self.ubersmith_base.data_store.clients), 0)
+
+    def test_dropped_namespaces_are_released_and_start_empty_when_used_again(self):
+        job_client = self._add_client(namespace='job-1')
+        self._add_client(namespace='job-2')
+
+        with self.app.test_client() as c:
+            dropped = json.loads(c.delete('ns/job-1').data.decode('utf-8'))
+            unknown = json.loads(c.delete('ns/job-1').data.decode('utf-8'))
+
+        self.assertTrue(dropped['status'])
+        self.assertEqual(unknown['error_message'], "Unknown namespace 'job-1'")
+        self.assertEqual(self.ubersmith_base.namespaces.names(), ['job-2'])
+        self.assertFalse(self._call(namespace='job-1', method='client.get', client_id=job_client)[1]['status'])
+
+    def test_invalid_namespace(self):
+        status, body = self._call(namespace='../etc', method='client.get', client_id='1')
+
+        self.assertEqual(status, 200)
+        self.assertEqual(body['error_message'], "Invalid namespace '../etc'")
+        self.assertEqual(self.ubersmith_base.namespaces.names(), [])
+
+    def test_names_of_directories_are_invalid_namespaces(self):
+        for namespace in ('.', '..', '.hidden', 'job\n'):
+            with self.assertRaises(namespaces.InvalidNamespace):
+                self.ubersmith_base.api_for(namespace)
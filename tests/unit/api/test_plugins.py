@@ -0,0 +1,45 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+from unittest import mock
+
+from fake_ubersmith.api import plugins
+from fake_ubersmith.api.methods.client import Client
+
+
+class TestPlugins(unittest.TestCase):
+    @mock.patch('fake_ubersmith.api.plugins._entry_points', return_value=[])
+    def test_builtin_modules_are_discovered(self, _):
+        modules = plugins.discover()
+
+        self.assertEqual(sorted(modules), ['client', 'iweb', 'order', 'uber'])
+        self.assertIs(modules['client'].load(), Client)
+
+    def test_installed_modules_are_discovered(self):
+        entry_point = mock.Mock(value='fake_ubersmith.api.methods.client:Client')
+        entry_point.name = 'acme'
+
+        with mock.patch('fake_ubersmith.api.plugins._entry_points', return_value=[entry_point]):
+            modules = plugins.discover()
+
+        self.assertIn('uber', modules)
+        self.assertIs(modules['acme'].load(), Client)
+
+    def test_modules_can_be_selected(self):
+        modules = plugins.discover()
+
+        self.assertIs(plugins.select(modules, None), modules)
+        self.assertEqual(list(plugins.select(modules, ['uber', 'client'])), ['uber', 'client'])
+        with self.assertRaises(plugins.UnknownModule):
+            plugins.select(modules, ['client', 'billing'])
@@ -0,0 +1,148 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import unittest
+
+from flask import Flask
+
+from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.adapters.ids import SequentialIds
+from fake_ubersmith.api.methods.client import Client
+from fake_ubersmith.api.methods.uber import Uber
+from fake_ubersmith.api.response_cache import ResponseCache
+from fake_ubersmith.api.ubersmith import FakeUbersmithError, UbersmithBase
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.data_store = DataStore(ids=SequentialIds())
+        self.base_uber_api = UbersmithBase(self.data_store)
+        Client(self.data_store).hook_to(self.base_uber_api)
+        self.uber = Uber(self.data_store)
+        self.uber.hook_to(self.base_uber_api)
+        self.base_uber_api.hook_to(self.app)
+        self.cache = ResponseCache(self.data_store, size=2)
+        self.base_uber_api.response_cache = self.cache
+
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "client.add", "first": "John", "uber_login": "john"})
+
+    def _get(self, c, headers=None, **data):
+        return c.post('api/2.0/', data=dict(data, method="client.get"), headers=headers)
+
+    def test_responses_are_served_from_the_cache_until_their_collections_are_written(self):
+        with self.app.test_client() as c:
+            first = self._get(c, client_id="1")
+            second = self._get(c, client_id="1")
+            self.assertEqual(self.cache.misses.value, 1)
+
+            c.post('api/2.0/', data={"method": "client.cc_add", "client_id": "1"})
+            self._get(c, client_id="1")
+            self.assertEqual(self.cache.misses.value, 1)
+
+            c.post('api/2.0/', data={"method": "client.update", "client_id": "1", "first": "Jane"})
+            third = self._get(c, client_id="1")
+            self.assertEqual(self.cache.misses.value, 2)
+
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(json.loads(third.data.decode('utf-8'))["data"]["first"], "Jane")
+        self.assertNotEqual(third.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(self.cache.hits.value, 2)
+
+    def test_collections_assigned_on_the_data_store_are_not_served_from_the_cache(self):
+        with self.app.test_client() as c:
+            etag = self._get(c, client_id="1").headers['ETag']
+            self.data_store.clients = [dict(self.data_store.clients[0], first="Jane")]
+            resp = self._get(c, headers={'If-None-Match': etag}, client_id="1")
+
+            self.data_store.service_plans_list = {"1": {"plan_id": "1"}}
+            c.post('api/2.0/', data={"method": "uber.service_plan_list"})
+            self.data_store.service_plans_list = {"2": {"plan_id": "2"}}
+            plans = c.post('api/2.0/', data={"method": "uber.service_plan_list"})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(json.loads(resp.data.decode('utf-8'))["data"]["first"], "Jane")
+        self.assertEqual(list(json.loads(plans.data.decode('utf-8'))["data"]), ["2"])
+
+    def test_matching_if_none_match_is_answered_not_modified(self):
+        with self.app.test_client() as c:
+            etag = self._get(c, client_id="1").headers['ETag']
+
+            not_modified = self._get(c, headers={'If-None-Match': etag}, client_id="1")
+            modified = self._get(c, headers={'If-None-Match': '"other"'}, client_id="1")
+
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.data, b'')
+        self.assertEqual(not_modified.headers['ETag'], etag)
+        self.assertEqual(modified.status_code, 200)
+        self.assertEqual(json.loads(modified.data.decode('utf-8'))["data"]["first"], "John")
+
+    def test_parameters_are_cached_separately_whatever_their_order(self):
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data="method=client.get&client_id=1&acls=1",
+                   content_type='application/x-www-form-urlencoded')
+            c.post('api/2.0/', data="acls=1&client_id=1&method=client.get",
+                   content_type='application/x-www-form-urlencoded')
+            self._get(c, client_id="1")
+
+        self.assertEqual(self.cache.misses.value, 2)
+
+    def test_least_recently_served_responses_are_dropped_first(self):
+        with self.app.test_client() as c:
+            for client_id in ("1", "2", "1", "3", "1", "2"):
+                self._get(c, client_id=client_id)
+
+        self.assertEqual(self.cache.misses.value, 4)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_faults_and_batches_go_through_the_cache(self):
+        with self.app.test_client() as c:
+            etag = self._get(c, client_id="1").headers['ETag']
+            c.post('api/2.0/', data={"method": "hidden.enable_crash_mode"})
+            crashed = self._get(c, headers={'If-None-Match': etag}, client_id="1")
+            c.post('api/2.0/', data={"method": "hidden.disable_crash_mode"})
+
+            resp = c.post('api/2.0/batch', json=[{"method": "client.get", "params": {"client_id": "1"}}])
+
+        self.assertEqual(crashed.status_code, 500)
+        self.assertEqual(json.loads(resp.data.decode('utf-8'))[0]["data"]["first"], "John")
+        self.assertEqual(self.cache.hits.value, 1)
+
+    def test_service_plan_errors_are_not_hidden_by_cached_responses(self):
+        self.data_store.service_plans = [{"plan_id": "1"}]
+
+        def service_plan_get(c):
+            resp = c.post('api/2.0/', data={"method": "uber.service_plan_get", "plan_id": "1"})
+            return json.loads(resp.data.decode('utf-8'))
+
+        with self.app.test_client() as c:
+            found = service_plan_get(c)
+            self.uber.service_plan_error = FakeUbersmithError(code=999, message="some error")
+            failed = service_plan_get(c)
+            self.uber.service_plan_error = None
+            found_again = service_plan_get(c)
+
+        self.assertTrue(found["status"])
+        self.assertEqual((failed["error_code"], failed["error_message"]), (999, "some error"))
+        self.assertEqual(found_again, found)
+        self.assertEqual(self.cache.hits.value, 1)
+
+    def test_methods_not_registered_as_reading_are_not_cached(self):
+        with self.app.test_client() as c:
+            resp = c.post('api/2.0/', data={"method": "client.contact_list", "client_id": "1"})
+
+        self.assertNotIn('ETag', resp.headers)
+        self.assertEqual(len(self.cache), 0)
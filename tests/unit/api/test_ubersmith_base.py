@@ -11,12 +11,24 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import json
 import unittest
+from unittest import mock
 
 from flask import Flask
 
 from fake_ubersmith.api.adapters.data_store import DataStore
+from fake_ubersmith.api.base import Base
 from fake_ubersmith.api.ubersmith import UbersmithBase
+from fake_ubersmith.api.utils.response import response
+
+
+class Echo(Base):
+    def hook_to(self, entity):
+        entity.register_endpoints(
+            ubersmith_method='lazy.echo',
+            function=lambda form_data: response(data=form_data.to_dict())
+        )
 
 
 class TestAdministrativeLocal(unittest.TestCase):
@@ -65,3 +77,99 @@ class TestAdministrativeLocal(unittest.TestCase):
             )
 
         self.assertEqual(resp.status_code, 500)
+
+    def _batch(self, body):
+        self.ubersmith_base.register_endpoints(
+            ubersmith_method='test.echo',
+            function=lambda form_data: response(data=form_data.to_dict(flat=False))
+        )
+        self.ubersmith_base.register_endpoints(
+            ubersmith_method='test.fail',
+            function=lambda form_data: response(error_code=3, message="failed")
+        )
+
+        with self.app.test_client() as c:
+            resp = c.post('api/2.0/batch', data=json.dumps(body), content_type='application/json')
+
+        self.assertEqual(resp.status_code, 200)
+        return json.loads(resp.data.decode('utf-8'))
+
+    def test_batch_calls_run_in_order(self):
+        results = self._batch([
+            {"method": "test.echo", "params": {"client_id": 1, "flags": [True, None], "name": "x"}},
+            {"method": "test.fail"},
+            {"method": "test.echo", "params": {}},
+        ])
+
+        self.assertEqual(results, [
+            {"status": True, "error_code": None, "error_message": "",
+             "data": {"client_id": ["1"], "flags": ["1", ""], "name": ["x"]}},
+            {"status": False, "error_code": 3, "error_message": "failed", "data": ""},
+            {"status": True, "error_code": None, "error_message": "", "data": []},
+        ])
+
+    def test_batch_can_stop_on_the_first_error(self):
+        results = self._batch({
+            "calls": [{"method": "test.echo"}, {"method": "test.fail"}, {"method": "test.echo"}],
+            "stop_on_error": True
+        })
+
+        self.assertEqual([r["status"] for r in results], [True, False])
+
+    def test_batch_goes_through_crash_mode(self):
+        results = self._batch([
+            {"method": "hidden.enable_crash_mode"},
+            {"method": "test.echo"},
+            {"method": "hidden.disable_crash_mode"},
+            {"method": "test.echo"},
+        ])
+
+        self.assertEqual([r["status"] for r in results], [True, False, True, True])
+        self.assertEqual(results[1]["error_code"], 500)
+        self.assertEqual(results[1]["error_message"], "Crash mode was enabled")
+
+    def test_batch_reports_invalid_calls(self):
+        results = self._batch([{"method": "test.unknown"}, "test.echo", {"method": "test.echo", "params": [1]}])
+
+        self.assertEqual(results[0]["error_message"], "Unknown method 'test.unknown'")
+        self.assertFalse(results[1]["status"])
+        self.assertFalse(results[2]["status"])
+
+    def test_batch_requires_a_list_of_calls(self):
+        result = self._batch({"method": "test.echo"})
+
+        self.assertFalse(result["status"])
+        self.assertEqual(result["error_message"], "Expected a JSON list of calls")
+
+    def test_delay_hooks_delay_calls(self):
+        self.ubersmith_base.register_delay_hook(lambda method: 0.25 if method == 'test.echo' else None)
+        self.ubersmith_base.register_delay_hook(lambda method: 0.5)
+
+        self.assertEqual(self.ubersmith_base.delay_for('test.echo'), 0.75)
+        with mock.patch('fake_ubersmith.api.ubersmith.time.sleep') as m_sleep:
+            self._batch([{"method": "test.echo"}, {"method": "test.unknown"}])
+            with self.app.test_client() as c:
+                c.post('api/2.0/', data={"method": "hidden.enable_crash_mode"})
+
+        self.assertEqual(m_sleep.call_args_list, [mock.call(0.75), mock.call(0.5)])
+
+    def test_lazy_modules_are_hooked_on_their_first_call(self):
+        loader = mock.Mock(return_value=Echo)
+        self.ubersmith_base.register_lazy_module('lazy', loader)
+
+        self.assertNotIn('lazy.echo', self.ubersmith_base.methods)
+        with self.app.test_client() as c:
+            c.post('api/2.0/', data={"method": "lazy.echo", "n": "1"})
+            resp = c.post('api/2.0/', data={"method": "lazy.echo", "n": "2"})
+
+        self.assertEqual(json.loads(resp.data.decode('utf-8'))["data"], {"n": "2"})
+        loader.assert_called_once_with()
+        self.assertEqual(self.ubersmith_base.lazy_modules, {})
+
+    def test_batch_calls_hook_lazy_modules(self):
+        self.ubersmith_base.register_lazy_module('lazy', lambda: Echo)
+
+        results = self._batch([{"method": "lazy.unknown"}, {"method": "lazy.echo", "params": {"n": 1}}])
+
+        self.assertEqual(results[0]["error_message"], "Unknown method 'lazy.unknown'")
+        self.assertEqual(results[1]["data"], {"n": "1"})
@@ -0,0 +1,50 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+from werkzeug.datastructures import MultiDict
+
+from fake_ubersmith.api.utils.logs import DEFAULT_MAX_PAYLOAD_LENGTH, Payload, set_max_payload_length
+
+
+class TestPayload(unittest.TestCase):
+    def tearDown(self):
+        set_max_payload_length(DEFAULT_MAX_PAYLOAD_LENGTH)
+
+    def test_small_payloads_are_rendered_whole(self):
+        self.assertEqual(str(Payload({"first": "John", "roles": ["1"]})), "{'first': 'John', 'roles': ['1']}")
+
+    def test_multidicts_are_rendered_as_dicts(self):
+        self.assertEqual(str(Payload(MultiDict([("first", "John")]))), "{'first': 'John'}")
+
+    def test_large_payloads_are_capped(self):
+        set_max_payload_length(50)
+
+        rendered = str(Payload({str(i): "x" * 100 for i in range(10000)}))
+
+        self.assertEqual(len(rendered), 53)
+        self.assertTrue(rendered.endswith("..."))
+
+    def test_large_dicts_are_not_walked_entirely(self):
+        walked = []
+
+        class Store(dict):
+            def items(self):
+                for item in super().items():
+                    walked.append(item)
+                    yield item
+
+        str(Payload(Store((str(i), i) for i in range(10000))))
+
+        self.assertLess(len(walked), 100)
@@ -0,0 +1,45 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import unittest
+
+from fake_ubersmith.api.utils.paging import Page, PagingError
+
+
+class TestPage(unittest.TestCase):
+    def setUp(self):
+        self.items = [(str(i), {"id": str(i), "name": "record {}".format(i)}) for i in range(5)]
+
+    def test_defaults_to_everything(self):
+        page = Page.from_form({})
+
+        self.assertTrue(page.everything)
+        self.assertEqual(page.apply(iter(self.items)), dict(self.items))
+
+    def test_slices_in_the_order_of_the_items(self):
+        page = Page.from_form({"offset": "1", "limit": "2"})
+
+        self.assertEqual(list(page.apply(iter(self.items))), ["1", "2"])
+
+    def test_offset_past_the_end_is_an_empty_page(self):
+        self.assertEqual(Page(offset=10, limit=2).apply(iter(self.items)), {})
+
+    def test_projects_the_requested_fields(self):
+        page = Page.from_form({"fields": "name, unknown"})
+
+        self.assertEqual(page.apply(iter(self.items[:1])), {"0": {"name": "record 0"}})
+
+    def test_invalid_offset_or_limit_fails(self):
+        for form in ({"offset": "a"}, {"limit": "1.5"}, {"offset": "-1"}, {"limit": "-1"}):
+            with self.assertRaises(PagingError):
+                Page.from_form(form)
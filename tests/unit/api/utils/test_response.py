@@ -0,0 +1,66 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import json
+import unittest
+from collections import defaultdict
+from unittest import mock
+
+from werkzeug.datastructures import MultiDict
+
+from fake_ubersmith.api.utils import response
+
+
+class EncodeTests:
+    def _encode(self, payload):
+        body = response.encode(payload)
+        return json.loads(body.decode('utf-8') if isinstance(body, bytes) else body)
+
+    def test_empty_dicts_are_encoded_as_arrays(self):
+        self.assertEqual(
+            self._encode({"data": {}, "nested": [{}, {"deeper": defaultdict(dict)}]}),
+            {"data": [], "nested": [[], {"deeper": []}]}
+        )
+
+    def test_empty_dicts_inside_strings_are_left_untouched(self):
+        self.assertEqual(
+            self._encode({"data": 'a {} "{}" \\{}', "{}": {}}),
+            {"data": 'a {} "{}" \\{}', "{}": []}
+        )
+
+    def test_escaped_backslashes_and_quotes_do_not_confuse_string_detection(self):
+        self.assertEqual(
+            self._encode({"a": "ends with \\", "b": {}, "c": '\\"{}'}),
+            {"a": "ends with \\", "b": [], "c": '\\"{}'}
+        )
+
+    def test_multidicts_are_encoded_with_their_first_values(self):
+        self.assertEqual(
+            self._encode({"data": MultiDict([("first", "John"), ("first", "Jack")])}),
+            {"data": {"first": "John"}}
+        )
+
+    def test_non_string_keys_are_stringified(self):
+        self.assertEqual(self._encode({1: True}), {"1": True})
+
+
+class TestEncodeWithJson(EncodeTests, unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(response, 'orjson', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+@unittest.skipIf(response.orjson is None, "orjson is not installed")
+class TestEncodeWithOrjson(EncodeTests, unittest.TestCase):
+    pass
@@ -0,0 +1,58 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import json
+import unittest
+
+from fake_ubersmith.api.utils.streaming import StreamFormatError, iter_records
+
+RECORDS = [{"id": 1, "name": "café"}, [1, 2], "text", 12.5, None, {"nested": {"a": [1, {"b": "]"}]}}]
+
+
+class TestIterRecords(unittest.TestCase):
+    def _records(self, body, chunk_size=7, **kwargs):
+        return list(iter_records(io.BytesIO(body.encode('utf-8')), chunk_size=chunk_size, **kwargs))
+
+    def test_ndjson_across_chunk_sizes(self):
+        body = "\n".join(json.dumps(r, ensure_ascii=False) for r in RECORDS) + "\n\n"
+        for chunk_size in (1, 2, 3, 7, 64, 4096):
+            self.assertEqual(self._records(body, chunk_size), RECORDS)
+
+    def test_ndjson_without_trailing_newline(self):
+        self.assertEqual(self._records('{"a": 1}\r\n{"b": 2}'), [{"a": 1}, {"b": 2}])
+
+    def test_json_array_across_chunk_sizes(self):
+        body = " \n[ " + " ,\n".join(json.dumps(r, ensure_ascii=False) for r in RECORDS) + " ]\n"
+        for chunk_size in (1, 2, 3, 7, 64, 4096):
+            self.assertEqual(self._records(body, chunk_size), RECORDS)
+
+    def test_empty_bodies(self):
+        self.assertEqual(self._records(''), [])
+        self.assertEqual(self._records('[]'), [])
+        self.assertEqual(self._records(' [ ] '), [])
+
+    def test_invalid_ndjson_line(self):
+        with self.assertRaisesRegex(StreamFormatError, "Invalid JSON on line 2"):
+            self._records('{"a": 1}\n{"a": }\n')
+
+    def test_invalid_json_array(self):
+        for body in ('[{"a": }]', '[1 2]', '[1,]', '[1', '[1] 2', '[,1]'):
+            with self.assertRaises(StreamFormatError, msg=body):
+                self._records(body)
+
+    def test_records_are_bounded(self):
+        with self.assertRaisesRegex(StreamFormatError, "longer than 10 characters"):
+            self._records('"' + 'x' * 20 + '"\n', max_record_size=10)
+        with self.assertRaisesRegex(StreamFormatError, "longer than 10 characters"):
+            self._records('["' + 'x' * 20 + '"]', max_record_size=10)
@@ -1,50 +1,428 @@
+import atexit
+import logging
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
-from unittest.mock import patch
+from logging.handlers import QueueHandler
+from unittest.mock import ANY, Mock, patch
 
 from fake_ubersmith import main
+from fake_ubersmith.api import namespaces
+from fake_ubersmith.api.adapters import event_log
+from fake_ubersmith.api.adapters.journal import JournaledStore
+
+
+def _without_fake_ubersmith_options(environ):
+    return {name: value for name, value in environ.items() if not name.startswith(main.ENVIRONMENT_PREFIX)}
 
 
 class TestMain(unittest.TestCase):
+    def setUp(self):
+        # The handler would otherwise outlive the test
+        patcher = patch('fake_ubersmith.main.signal.signal')
+        self.m_signal = patcher.start()
+        self.addCleanup(patcher.stop)
 
     @patch('fake_ubersmith.main.Flask')
     @patch('fake_ubersmith.main.DataStore')
     @patch('fake_ubersmith.main.AdministrativeLocal')
+    @patch('fake_ubersmith.main.BulkLoad')
     @patch('fake_ubersmith.main.UbersmithBase')
-    @patch('fake_ubersmith.main.Uber')
-    @patch('fake_ubersmith.main.Order')
-    @patch('fake_ubersmith.main.Client')
-    def test_app_runs(
-            self, m_client, m_order, m_uber, m_uber_base, m_admin_local,
-            m_data_store, m_flask
-    ):
-        main.run()
+    def test_app_runs(self, m_uber_base, m_bulk_load, m_admin_local, m_data_store, m_flask):
+        main.run([], environ={})
 
         m_flask.assert_called_once_with('fake_ubersmith')
 
-        m_data_store.assert_called_once_with()
+        m_data_store.assert_called_once_with(event_log_size=100000, event_log_spill_dir=None, ids=ANY)
 
-        m_uber_base.assert_called_once_with(m_data_store.return_value)
+        m_uber_base.assert_called_once_with(m_data_store.return_value, metrics=None)
 
         m_admin_local.assert_called_once_with()
         m_admin_local.return_value.hook_to.assert_called_once_with(
             m_flask.return_value
         )
 
-        m_uber.assert_called_once_with(m_data_store.return_value)
-        m_uber.return_value.hook_to.assert_called_once_with(
-            m_uber_base.return_value
+        m_bulk_load.assert_called_once_with(
+            m_data_store.return_value, namespaces=m_uber_base.return_value.namespaces
         )
-
-        m_order.assert_called_once_with(m_data_store.return_value)
-        m_order.return_value.hook_to.assert_called_once_with(
-            m_uber_base.return_value
+        m_bulk_load.return_value.hook_to.assert_called_once_with(
+            m_flask.return_value
         )
 
-        m_client.assert_called_once_with(m_data_store.return_value)
-        m_client.return_value.hook_to.assert_called_once_with(
-            m_uber_base.return_value
+        self.assertEqual(
+            sorted(c[0][0] for c in m_uber_base.return_value.register_lazy_module.call_args_list),
+            ['client', 'iweb', 'order', 'uber']
         )
 
         m_flask.return_value.run.assert_called_once_with(
             host="0.0.0.0", port=9131
         )
+
+    @patch('fake_ubersmith.main.Flask')
+    @patch('waitress.serve')
+    def test_app_runs_with_waitress(self, m_serve, m_flask):
+        main.run([
+            '--server', 'waitress', '--threads', '32', '--backlog', '2048', '--keep-alive', '30'
+        ], environ={})
+
+        m_flask.return_value.run.assert_not_called()
+        m_serve.assert_called_once_with(
+            m_flask.return_value,
+            host="0.0.0.0",
+            port=9131,
+            threads=32,
+            backlog=2048,
+            channel_timeout=30,
+            ident='fake-ubersmith'
+        )
+
+    @patch('fake_ubersmith.api.asgi.AsgiApp')
+    @patch('fake_ubersmith.main.Flask')
+    def test_app_runs_with_asgi(self, m_flask, m_asgi_app):
+        m_uvicorn = Mock()
+        with patch.dict('sys.modules', {'uvicorn': m_uvicorn}):
+            main.run(['--server', 'asgi', '--backlog', '4096', '--keep-alive', '30'], environ={})
+
+        m_flask.return_value.run.assert_not_called()
+        m_flask.return_value.extensions.__setitem__.assert_called_once_with('ubersmith_base', ANY)
+        m_asgi_app.assert_called_once_with(
+            m_flask.return_value, m_flask.return_value.extensions['ubersmith_base']
+        )
+        m_uvicorn.run.assert_called_once_with(
+            m_asgi_app.return_value,
+            host="0.0.0.0",
+            port=9131,
+            backlog=4096,
+            timeout_keep_alive=30,
+            log_config=None,
+            access_log=False,
+            lifespan='on'
+        )
+
+    @patch('fake_ubersmith.main.Flask')
+    @patch.dict('sys.modules', {'uvicorn': None})
+    def test_asgi_server_requires_uvicorn(self, m_flask):
+        with self.assertRaises(RuntimeError):
+            main.run(['--server', 'asgi'], environ={})
+
+    @patch('fake_ubersmith.main.Flask')
+    @patch.dict('sys.modules', {'waitress': None})
+    def test_waitress_server_requires_waitress(self, m_flask):
+        with self.assertRaises(RuntimeError):
+            main.run(['--server', 'waitress'], environ={})
+
+    @patch('fake_ubersmith.main.Flask')
+    @patch('fake_ubersmith.main.DataStore')
+    @patch('fake_ubersmith.main.UbersmithBase')
+    @patch('fake_ubersmith.main.Metrics')
+    def test_app_runs_with_metrics(self, m_metrics, m_uber_base, m_data_store, m_flask):
+        main.run(['--metrics'], environ={})
+
+        m_metrics.assert_called_once_with(m_data_store.return_value)
+        m_metrics.return_value.hook_to.assert_called_once_with(m_flask.return_value)
+        m_uber_base.assert_called_once_with(m_data_store.return_value, metrics=m_metrics.return_value)
+
+    @patch('fake_ubersmith.main.setup_logging')
+    @patch('fake_ubersmith.main.Flask')
+    def test_logging_is_configurable(self, m_flask, m_setup_logging):
+        main.run(['--log-level', 'WARNING', '--log-payload-size', '64'], environ={})
+
+        m_setup_logging.assert_called_once_with(level='WARNING', max_payload_length=64)
+
+    @patch('fake_ubersmith.main.setup_logging')
+    @patch('fake_ubersmith.main.atexit')
+    @patch('fake_ubersmith.api.adapters.snapshot')
+    @patch('fake_ubersmith.main.Flask')
+    @patch('fake_ubersmith.main.DataStore')
+    def test_snapshots_are_loaded_and_saved(self, m_data_store, m_flask, m_snapshot, m_atexit, m_setup_logging):
+        main.run(['--snapshot', __file__, '--save-snapshot', '/tmp/out.snapshot'], environ={})
+
+        m_snapshot.load.assert_called_once_with(m_data_store.return_value, __file__)
+        m_atexit.register.assert_called_once_with(
+            m_snapshot.save, m_data_store.return_value, '/tmp/out.snapshot'
+        )
+
+    @patch('fake_ubersmith.main.ids')
+    @patch('fake_ubersmith.main.Flask')
+    @patch('fake_ubersmith.main.DataStore')
+    def test_id_allocation_is_configurable(self, m_data_store, m_flask, m_ids):
+        m_ids.STRATEGIES = ('random', 'sequential', 'sharded')
+
+        main.run(['--id-strategy', 'sharded', '--id-shard', '1/4'], environ={})
+
+        m_ids.id_allocator.assert_called_with('sharded', seed=None, shard=(1, 4))
+        m_data_store.assert_called_once_with(
+            event_log_size=ANY, event_log_spill_dir=ANY, ids=m_ids.id_allocator.return_value
+        )
+
+    def test_sharded_ids_require_a_valid_shard(self):
+        for argv in (['--id-strategy', 'sharded'], ['--id-strategy', 'sharded', '--id-shard', '4/4']):
+            with self.assertRaises(SystemExit), patch('sys.stderr'):
+                main.parse_args(argv, environ={})
+
+    @patch('fake_ubersmith.main.Flask')
+    @patch('fake_ubersmith.api.adapters.sqlite_store.SqliteStore')
+    def test_data_store_can_be_kept_in_sqlite(self, m_sqlite_store, m_flask):
+        main.run(['--storage', 'sqlite', '--sqlite-path', '/tmp/fake-ubersmith.sqlite'], environ={})
+
+        m_sqlite_store.assert_called_once_with('/tmp/fake-ubersmith.sqlite', ids=ANY)
+
+    def test_sqlite_storage_requires_a_path(self):
+        with self.assertRaises(SystemExit), patch('sys.stderr'):
+            main.parse_args(['--storage', 'sqlite'], environ={})
+
+    @patch('fake_ubersmith.main.atexit')
+    def test_journal_is_restored_instead_of_loading_fixtures(self, m_atexit):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        fixture = os.path.join(directory, 'clients.ndjson')
+        with open(fixture, 'w') as f:
+            f.write('{"clientid": "1", "login": "john"}\n')
+
+        app = main.create_app(journal_dir=os.path.join(directory, 'journal'), fixtures=[('clients', fixture)])
+        data_store = app.extensions['ubersmith_base'].data_store
+        data_store.close()
+        app = main.create_app(journal_dir=os.path.join(directory, 'journal'), fixtures=[('clients', fixture)])
+        data_store = app.extensions['ubersmith_base'].data_store
+        data_store.close()
+
+        self.assertIsInstance(data_store, JournaledStore)
+        self.assertTrue(data_store.restored)
+        self.assertEqual(len(data_store.records("clients")), 1)
+        m_atexit.register.assert_any_call(data_store.close)
+
+    @patch('fake_ubersmith.main.atexit')
+    @patch('fake_ubersmith.main.TrafficCapture')
+    @patch('fake_ubersmith.main.Flask')
+    @patch('fake_ubersmith.main.UbersmithBase')
+    def test_traffic_can_be_captured(self, m_uber_base, m_flask, m_traffic_capture, m_atexit):
+        main.run(['--capture', '/tmp/traffic.ndjson'], environ={})
+
+        m_traffic_capture.assert_called_once_with('/tmp/traffic.ndjson')
+        self.assertIs(m_uber_base.return_value.capture, m_traffic_capture.return_value)
+        m_atexit.register.assert_any_call(m_traffic_capture.return_value.close)
+
+    @patch('fake_ubersmith.main.response_cache.ResponseCache')
+    @patch('fake_ubersmith.main.Flask')
+    @patch('fake_ubersmith.main.DataStore')
+    @patch('fake_ubersmith.main.UbersmithBase')
+    def test_responses_can_be_cached(self, m_uber_base, m_data_store, m_flask, m_response_cache):
+        main.run(['--response-cache', '--response-cache-size', '500'], environ={})
+
+        m_response_cache.assert_called_once_with(m_data_store.return_value, size=500)
+        self.assertIs(m_uber_base.return_value.response_cache, m_response_cache.return_value)
+
+    @patch('fake_ubersmith.main.atexit')
+    def test_spilled_events_are_removed_on_exit(self, m_atexit):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        app = main.create_app(event_log_size=1, event_log_spill_dir=directory)
+        data_store = app.extensions['ubersmith_base'].data_store
+        for i in range(event_log.BLOCK_SIZE + 1):
+            data_store.append_event({"event_type": str(i)})
+        self.assertEqual(len(os.listdir(directory)), 1)
+
+        m_atexit.register.assert_any_call(data_store.close)
+        data_store.close()
+        self.assertEqual(os.listdir(directory), [])
+
+    @patch('fake_ubersmith.main.atexit')
+    def test_namespaces_never_share_a_journal_directory(self, m_atexit):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        app = main.create_app(journal_dir=directory)
+        base_uber_api = app.extensions['ubersmith_base']
+        self.addCleanup(base_uber_api.data_store.close)
+
+        with app.test_client() as c:
+            for namespace in ('..', '.', 'job-1', 'job-2'):
+                c.post('/api/2.0/', data={"method": "client.add", "first": namespace},
+                       headers={namespaces.HEADER: namespace})
+        data_stores = [base_uber_api.data_store] + [base_uber_api.api_for(name).data_store
+                                                    for name in base_uber_api.namespaces.names()]
+        for data_store in data_stores[1:]:
+            self.addCleanup(data_store.close)
+
+        self.assertEqual(base_uber_api.namespaces.names(), ['job-1', 'job-2'])
+        self.assertEqual(len({os.path.realpath(d.journal.directory) for d in data_stores}), 3)
+        self.assertEqual(base_uber_api.data_store.records("clients"), [])
+
+    @patch('fake_ubersmith.main.atexit')
+    def test_dropped_namespaces_release_their_journal(self, m_atexit):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        app = main.create_app(journal_dir=directory)
+        base_uber_api = app.extensions['ubersmith_base']
+        self.addCleanup(base_uber_api.data_store.close)
+        data_store = base_uber_api.api_for('job-1').data_store
+        with app.test_client() as c:
+            c.post('/ns/job-1/api/2.0/', data={"method": "client.add", "first": "John"})
+
+            c.delete('/ns/job-1')
+
+        m_atexit.unregister.assert_called_once_with(data_store.close)
+        self.assertTrue(data_store.journal._closed.is_set())
+        restored = base_uber_api.api_for('job-1').data_store
+        self.addCleanup(restored.close)
+        self.assertEqual(restored.records("clients"), [])
+
+    @patch('fake_ubersmith.main.Flask')
+    def test_sigterm_exits_through_the_atexit_hooks(self, m_flask):
+        main.run([], environ={})
+
+        self.m_signal.assert_called_once_with(signal.SIGTERM, main.exit_on_sigterm)
+        with self.assertRaises(SystemExit):
+            main.exit_on_sigterm(signal.SIGTERM, None)
+
+    def test_snapshot_is_saved_when_the_server_is_terminated(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'store.snapshot')
+        with socket.socket() as s:
+            s.bind(('127.0.0.1', 0))
+            port = s.getsockname()[1]
+
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'fake_ubersmith.main', '--host', '127.0.0.1', '--port', str(port),
+             '--save-snapshot', path, '--log-level', 'ERROR'],
+            env=dict(_without_fake_ubersmith_options(os.environ), PYTHONPATH=os.pathsep.join(sys.path)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.addCleanup(server.kill)
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.05)
+
+        server.terminate()
+        server.wait(timeout=10)
+
+        self.assertTrue(os.path.exists(path))
+
+    def test_journal_only_applies_to_the_memory_storage(self):
+        with self.assertRaises(SystemExit), patch('sys.stderr'):
+            main.parse_args(['--storage', 'sqlite', '--sqlite-path', 'fake.sqlite', '--journal', 'journal'], environ={})
+
+    def test_namespaces_get_their_own_database(self):
+        self.assertEqual(main.namespace_path('/tmp/fake.sqlite', None), '/tmp/fake.sqlite')
+        self.assertEqual(main.namespace_path('/tmp/fake.sqlite', 'job-42'), '/tmp/fake.job-42.sqlite')
+
+    @patch('fake_ubersmith.main.Flask')
+    @patch('fake_ubersmith.main.UbersmithBase')
+    def test_a_subset_of_modules_can_be_served(self, m_uber_base, m_flask):
+        main.run(['--modules', 'client,uber'], environ={})
+
+        self.assertEqual(
+            [c[0][0] for c in m_uber_base.return_value.register_lazy_module.call_args_list],
+            ['client', 'uber']
+        )
+
+    def test_unknown_modules_are_refused(self):
+        with self.assertRaises(SystemExit), patch('sys.stderr'):
+            main.parse_args(['--modules', 'client,billing'], environ={})
+
+    @patch('fake_ubersmith.main.Flask')
+    def test_address_is_configurable(self, m_flask):
+        main.run(['--host', '127.0.0.1', '--port', '9132'], environ={})
+
+        m_flask.return_value.run.assert_called_once_with(host="127.0.0.1", port=9132)
+
+    @patch('fake_ubersmith.main.Flask')
+    def test_options_can_be_set_in_the_environment(self, m_flask):
+        args = main.parse_args(['--port', '9133'], environ={
+            'FAKE_UBERSMITH_PORT': '9132',
+            'FAKE_UBERSMITH_LOG_LEVEL': 'DEBUG',
+            'FAKE_UBERSMITH_REUSE_PORT': 'true',
+            'FAKE_UBERSMITH_METRICS': '0',
+            'FAKE_UBERSMITH_FIXTURES': 'clients=clients.ndjson,contacts=contacts.ndjson',
+        })
+
+        self.assertEqual(args.port, 9133)
+        self.assertEqual(args.log_level, 'DEBUG')
+        self.assertTrue(args.reuse_port)
+        self.assertFalse(args.metrics)
+        self.assertEqual(args.fixtures, [('clients', 'clients.ndjson'), ('contacts', 'contacts.ndjson')])
+
+    def test_invalid_environment_values_are_refused(self):
+        with self.assertRaises(SystemExit), patch('sys.stderr'):
+            main.parse_args([], environ={'FAKE_UBERSMITH_PORT': 'http'})
+
+    @patch('fake_ubersmith.main.Flask')
+    @patch('fake_ubersmith.main.BulkLoad')
+    def test_fixtures_are_bulk_loaded(self, m_bulk_load, m_flask):
+        with tempfile.NamedTemporaryFile(suffix='.ndjson') as fixture:
+            main.run(['--fixtures', 'clients={}'.format(fixture.name)], environ={})
+
+        m_bulk_load.return_value.load.assert_called_once_with('clients', ANY)
+
+    @patch('fake_ubersmith.main.Flask')
+    def test_missing_fixtures_fail_the_startup(self, m_flask):
+        with self.assertRaises(RuntimeError):
+            main.run(['--fixtures', 'clients=/nonexistent/clients.ndjson'], environ={})
+
+    @patch('fake_ubersmith.main.reuse_port_socket')
+    @patch('werkzeug.serving.make_server')
+    @patch('fake_ubersmith.main.Flask')
+    def test_port_can_be_reused(self, m_flask, m_make_server, m_reuse_port_socket):
+        main.run(['--reuse-port', '--backlog', '64'], environ={})
+
+        m_reuse_port_socket.assert_called_once_with("0.0.0.0", 9131, 64)
+        m_flask.return_value.run.assert_not_called()
+        m_make_server.assert_called_once_with(
+            "0.0.0.0", 9131, m_flask.return_value, threaded=True,
+            fd=m_reuse_port_socket.return_value.fileno.return_value
+        )
+        m_make_server.return_value.serve_forever.assert_called_once_with()
+
+    def test_reuse_port_socket_listens(self):
+        sock = main.reuse_port_socket('127.0.0.1', 0, 8)
+        other = main.reuse_port_socket('127.0.0.1', sock.getsockname()[1], 8)
+        sock.close()
+        other.close()
+
+    @patch('fake_ubersmith.api.adapters.snapshot')
+    @patch('fake_ubersmith.main.Flask')
+    def test_missing_snapshot_is_ignored(self, m_flask, m_snapshot):
+        main.run(['--snapshot', '/nonexistent/fake-ubersmith.snapshot'], environ={})
+
+        m_snapshot.load.assert_not_called()
+
+
+class TestSetupLogging(unittest.TestCase):
+    def setUp(self):
+        self.root_logger = logging.getLogger()
+        self.addCleanup(setattr, self.root_logger, 'handlers', self.root_logger.handlers[:])
+        self.addCleanup(self.root_logger.setLevel, self.root_logger.level)
+
+    def _stop(self, listener):
+        atexit.unregister(listener.stop)
+        listener.stop()
+
+    def test_records_are_handed_to_a_listener(self):
+        listener = main.setup_logging(level='WARNING')
+        self.addCleanup(self._stop, listener)
+
+        self.assertEqual(self.root_logger.level, logging.WARNING)
+        self.assertIsInstance(self.root_logger.handlers[-1], QueueHandler)
+        self.assertEqual(len(listener.handlers), 1)
+
+    def test_health_checks_are_filtered_out(self):
+        listener = main.setup_logging()
+        self.addCleanup(self._stop, listener)
+        queue_handler = self.root_logger.handlers[-1]
+
+        def record(msg, *args):
+            return logging.LogRecord('werkzeug', logging.INFO, __file__, 1, msg, args, None)
+
+        self.assertFalse(queue_handler.filter(record('"%s" %s', 'GET /status HTTP/1.1', 200)))
+        self.assertTrue(queue_handler.filter(record('"%s" %s', 'POST /api/2.0/ HTTP/1.1', 200)))
@@ -0,0 +1,76 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import threading
+import unittest
+
+from werkzeug.serving import make_server
+
+from fake_ubersmith.main import create_app
+from fake_ubersmith.tools import load
+
+
+class TestLoadHelpers(unittest.TestCase):
+    def test_parse_mix(self):
+        self.assertEqual(
+            load.parse_mix("client.get=3, uber.check_login=1.5,iweb.log_event"),
+            {"client.get": 3.0, "uber.check_login": 1.5, "iweb.log_event": 1.0}
+        )
+
+    def test_parse_mix_rejects_unknown_methods(self):
+        with self.assertRaises(ValueError):
+            load.parse_mix("client.explode=1")
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(load.percentile(values, 50), 50)
+        self.assertEqual(load.percentile(values, 99), 99)
+        self.assertEqual(load.percentile([7], 95), 7)
+        self.assertIsNone(load.percentile([], 50))
+
+    def test_compare_reports_regressions(self):
+        baseline = {
+            "requests_per_second": 1000, "latency_ms": {"p99": 10},
+            "methods": {"client.get": {"requests_per_second": 500, "latency_ms": {"p99": 10}}}
+        }
+        report = {
+            "requests_per_second": 950, "latency_ms": {"p99": 20},
+            "methods": {"client.get": {"requests_per_second": 400, "latency_ms": {"p99": 10.5}}}
+        }
+
+        self.assertEqual(
+            load.compare(report, baseline, tolerance=0.1),
+            ["overall: p99 20ms > baseline 10ms", "client.get: requests/sec 400 < baseline 500"]
+        )
+
+
+class TestRunLoad(unittest.TestCase):
+    def setUp(self):
+        self.server = make_server('127.0.0.1', 0, create_app(), threaded=True)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.shutdown)
+
+    def test_run_load_reports_throughput_and_latencies(self):
+        report = load.run_load(
+            'http://127.0.0.1:{}'.format(self.server.server_port),
+            load.parse_mix(load.DEFAULT_MIX),
+            concurrency=4, duration=30, requests=200, clients=5
+        )
+
+        self.assertEqual(report["requests"], 200)
+        self.assertEqual(report["errors"], 0)
+        self.assertGreater(report["requests_per_second"], 0)
+        self.assertEqual(set(report["latency_ms"]), {"p50", "p95", "p99", "max", "mean"})
+        self.assertEqual(sum(m["requests"] for m in report["methods"].values()), 200)
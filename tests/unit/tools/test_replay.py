@@ -0,0 +1,147 @@
+# Copyright 2017 Internap.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from werkzeug.serving import make_server
+
+from fake_ubersmith.main import create_app
+from fake_ubersmith.tools import replay
+
+
+class TestReplayHelpers(unittest.TestCase):
+    def test_parse_speed(self):
+        self.assertEqual(replay.parse_speed("2.5"), 2.5)
+        self.assertIsNone(replay.parse_speed("max"))
+        with self.assertRaises(ValueError):
+            replay.parse_speed("0")
+
+    def test_read_capture_orders_calls_by_arrival(self):
+        calls = replay.read_capture(io.StringIO(
+            '{"t": 0.2, "method": "client.get"}\n\n{"t": 0.1, "batch": {"calls": []}}\n'
+        ))
+
+        self.assertEqual([(c["line"], c["t"]) for c in calls], [(3, 0.1), (1, 0.2)])
+
+    def test_calls_of_a_namespace_share_a_connection(self):
+        calls = [{"namespace": "job-{}".format(i % 5)} for i in range(50)] + [{}, {"namespace": None}]
+
+        connections = {}
+        for call in calls:
+            connections.setdefault(call.get("namespace"), set()).add(replay.connection_of(call, 4))
+
+        self.assertEqual(set(map(len, connections.values())), {1})
+        self.assertEqual(connections[None], {replay.connection_of({"namespace": ""}, 4)})
+        self.assertTrue(all(0 <= replay.connection_of(call, 4) < 4 for call in calls))
+
+    def test_read_capture_rejects_invalid_lines(self):
+        with self.assertRaisesRegex(ValueError, "line 2"):
+            replay.read_capture(io.StringIO('{"t": 0}\n[1, 2]\n'))
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'traffic.ndjson')
+
+    def _serve(self, app=None):
+        app = app or create_app(id_strategy='sequential')
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.shutdown)
+        return 'http://127.0.0.1:{}'.format(server.server_port)
+
+    def _capture(self):
+        app = create_app(id_strategy='sequential', capture_path=self.path)
+        with app.test_client() as c:
+            client_id = c.post('api/2.0/', data={"method": "client.add", "first": "John"}).get_json()["data"]
+            time.sleep(0.05)
+            c.post('api/2.0/', data={"method": "client.get", "client_id": client_id})
+            c.post('ns/job-42/api/2.0/', data={"method": "client.add", "first": "Jane"})
+            c.post('api/2.0/batch', json=[{"method": "client.get", "params": {"client_id": client_id}}])
+        app.extensions['ubersmith_base'].capture.close()
+        with open(self.path) as f:
+            return replay.read_capture(f)
+
+    def test_replaying_on_a_fresh_server_gives_the_same_responses(self):
+        calls = self._capture()
+        url = self._serve()
+
+        report = replay.replay(url, calls, speed=1.0, concurrency=1)
+
+        self.assertEqual(report["requests"], 4)
+        self.assertEqual((report["errors"], report["differences"]), (0, 0))
+        self.assertGreaterEqual(report["duration"], 0.05)
+        self.assertEqual(set(report["methods"]), {"client.add", "client.get", "batch"})
+        self.assertEqual(report["methods"]["client.add"]["requests"], 2)
+        self.assertEqual(set(report["captured_latency_ms"]), {"p50", "p95", "p99", "max", "mean"})
+
+    def test_dependent_calls_are_replayed_in_order_on_concurrent_connections(self):
+        app = create_app(id_strategy='sequential', capture_path=self.path)
+        with app.test_client() as c:
+            for namespace in ('', 'ns/job-1/', 'ns/job-2/'):
+                for i in range(10):
+                    path = namespace + 'api/2.0/'
+                    client_id = c.post(path, data={"method": "client.add", "first": "John"}).get_json()["data"]
+                    c.post(path, data={"method": "client.update", "client_id": client_id, "first": str(i)})
+                    c.post(path, data={"method": "client.get", "client_id": client_id})
+        app.extensions['ubersmith_base'].capture.close()
+        with open(self.path) as f:
+            calls = replay.read_capture(f)
+
+        report = replay.replay(self._serve(), calls, speed=None, concurrency=8, ordered=True)
+
+        self.assertEqual(report["requests"], 90)
+        self.assertEqual((report["errors"], report["differences"]), (0, 0))
+
+    def test_calls_without_a_namespace_are_spread_over_the_connections(self):
+        app = create_app(id_strategy='sequential')
+        lock = threading.Lock()
+        in_flight = [0]
+        most_in_flight = [0]
+
+        def counting_calls_in_flight(environ, start_response):
+            with lock:
+                in_flight[0] += 1
+                most_in_flight[0] = max(most_in_flight[0], in_flight[0])
+            time.sleep(0.02)
+            with lock:
+                in_flight[0] -= 1
+            return app(environ, start_response)
+
+        calls = [{"t": 0, "line": i, "method": "uber.service_plan_list"} for i in range(16)]
+
+        report = replay.replay(self._serve(counting_calls_in_flight), calls, speed=None, concurrency=4)
+
+        self.assertEqual(report["requests"], 16)
+        self.assertGreater(most_in_flight[0], 1)
+
+    def test_different_responses_are_reported(self):
+        calls = self._capture()
+        url = self._serve()
+        replay.replay(url, calls, speed=None, concurrency=1)
+
+        report = replay.replay(url, calls, speed=None, concurrency=4, max_differences=1)
+
+        self.assertEqual(report["differences"], 2)
+        self.assertEqual(report["methods"]["client.add"]["differences"], 2)
+        self.assertEqual(len(report["different_responses"]), 1)
+        self.assertEqual(report["different_responses"][0]["expected"]["response"]["data"], "1")
+        self.assertEqual(report["different_responses"][0]["actual"]["response"]["data"], "2")